@@ -1,6 +1,9 @@
 # admin.py
 from django.contrib import admin
-from .models import SolicitudAprobacion, HistorialSolicitud, ComentarioSolicitud
+from .models import (
+    SolicitudAprobacion, HistorialSolicitud, ComentarioSolicitud, NotificacionEmail,
+    SolicitudArchivada
+)
 
 class HistorialInline(admin.TabularInline):
     model = HistorialSolicitud
@@ -119,4 +122,55 @@ class ComentarioSolicitudAdmin(admin.ModelAdmin):
     
     readonly_fields = ('fecha',)
     
-    date_hierarchy = 'fecha'
\ No newline at end of file
+    date_hierarchy = 'fecha'
+
+@admin.register(NotificacionEmail)
+class NotificacionEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        'asunto',
+        'destinatario',
+        'estado',
+        'intentos',
+        'fecha_creacion',
+        'fecha_envio'
+    )
+    
+    list_filter = (
+        'estado',
+        'fecha_creacion'
+    )
+    
+    search_fields = (
+        'destinatario',
+        'asunto'
+    )
+    
+    readonly_fields = ('fecha_creacion', 'fecha_envio', 'ultimo_error')
+    
+    raw_id_fields = ('solicitud',)
+
+@admin.register(SolicitudArchivada)
+class SolicitudArchivadaAdmin(admin.ModelAdmin):
+    list_display = (
+        'titulo',
+        'solicitante',
+        'responsable',
+        'tipo_solicitud',
+        'estado',
+        'fecha_cierre',
+        'fecha_archivo'
+    )
+    
+    list_filter = (
+        'estado',
+        'tipo_solicitud',
+        'fecha_archivo'
+    )
+    
+    search_fields = (
+        'titulo',
+        'solicitante',
+        'responsable'
+    )
+    
+    readonly_fields = ('id', 'fecha_cierre', 'fecha_archivo', 'datos')
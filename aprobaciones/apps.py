@@ -7,5 +7,7 @@ class AprobacionesConfig(AppConfig):
     verbose_name = 'Sistema de Aprobaciones'
     
     def ready(self):
-        # Aquí podemos importar señales cuando las implementemos
-        pass
\ No newline at end of file
+        # Señales: conteo de conexiones para el diagnóstico
+        from . import diagnostico  # noqa: F401
+        # Verificaciones de despliegue (manage.py check --deploy)
+        from . import checks  # noqa: F401
\ No newline at end of file
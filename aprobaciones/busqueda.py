@@ -0,0 +1,116 @@
+# busqueda.py - Índice de búsqueda de texto completo
+#
+# PostgreSQL: columna tsvector "busqueda" en la tabla de solicitudes con índice GIN.
+# SQLite: tabla virtual FTS5 aprobaciones_busqueda_fts (para desarrollo y pruebas).
+# Ambos se crean en la migración 0004 y los mantiene el servicio en cada escritura.
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from .models import SolicitudAprobacion, ComentarioSolicitud
+
+# Configuración de texto de PostgreSQL (stemming y stopwords)
+CONFIGURACION_TEXTO = getattr(settings, 'APROBACIONES_BUSQUEDA_CONFIG', 'spanish')
+
+TABLA_FTS_SQLITE = 'aprobaciones_busqueda_fts'
+
+TABLA_SOLICITUDES = SolicitudAprobacion._meta.db_table
+TABLA_COMENTARIOS = ComentarioSolicitud._meta.db_table
+
+
+def busqueda_disponible(using=DEFAULT_DB_ALIAS):
+    """Indica si el motor de base de datos tiene índice de texto completo"""
+    return connections[using].vendor in ('postgresql', 'sqlite')
+
+
+def actualizar_indice(solicitud_ids, using=DEFAULT_DB_ALIAS):
+    """Recalcular la entrada del índice para las solicitudes dadas"""
+    connection = connections[using]
+    ids = [SolicitudAprobacion._meta.pk.get_db_prep_value(i, connection) for i in solicitud_ids]
+    if not ids:
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"""
+                UPDATE {TABLA_SOLICITUDES} s SET busqueda =
+                    setweight(to_tsvector(%s::regconfig, coalesce(s.titulo, '')), 'A') ||
+                    setweight(to_tsvector(%s::regconfig, coalesce(s.descripcion, '')), 'B') ||
+                    setweight(to_tsvector(%s::regconfig, coalesce((
+                        SELECT string_agg(c.comentario, ' ')
+                        FROM {TABLA_COMENTARIOS} c WHERE c.solicitud_id = s.id
+                    ), '')), 'C')
+                WHERE s.id = ANY(%s)
+                """,
+                [CONFIGURACION_TEXTO] * 3 + [ids]
+            )
+        elif connection.vendor == 'sqlite':
+            marcadores = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f"DELETE FROM {TABLA_FTS_SQLITE} WHERE solicitud_id IN ({marcadores})", ids
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {TABLA_FTS_SQLITE} (solicitud_id, titulo, descripcion, comentarios)
+                SELECT s.id, s.titulo, s.descripcion, coalesce((
+                    SELECT group_concat(c.comentario, ' ')
+                    FROM {TABLA_COMENTARIOS} c WHERE c.solicitud_id = s.id
+                ), '')
+                FROM {TABLA_SOLICITUDES} s WHERE s.id IN ({marcadores})
+                """,
+                ids
+            )
+
+
+def buscar(texto, limite=20, using=DEFAULT_DB_ALIAS):
+    """
+    Retorna [(solicitud_id, puntaje)] ordenado por relevancia (mayor primero).
+    Título pesa más que descripción, y descripción más que comentarios.
+    """
+    connection = connections[using]
+    if not texto.strip():
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"""
+                SELECT s.id, ts_rank(s.busqueda, q) AS puntaje
+                FROM {TABLA_SOLICITUDES} s, websearch_to_tsquery(%s::regconfig, %s) q
+                WHERE s.busqueda @@ q
+                ORDER BY puntaje DESC
+                LIMIT %s
+                """,
+                [CONFIGURACION_TEXTO, texto, limite]
+            )
+            return cursor.fetchall()
+
+        # FTS5: cada término entre comillas para que no se interprete como sintaxis
+        consulta = ' '.join('"' + termino.replace('"', '""') + '"' for termino in texto.split())
+        cursor.execute(
+            f"""
+            SELECT solicitud_id, -bm25({TABLA_FTS_SQLITE}, 0.0, 10.0, 5.0, 1.0) AS puntaje
+            FROM {TABLA_FTS_SQLITE}
+            WHERE {TABLA_FTS_SQLITE} MATCH %s
+            ORDER BY puntaje DESC
+            LIMIT %s
+            """,
+            [consulta, limite]
+        )
+        return cursor.fetchall()
+
+
+def eliminar_del_indice(solicitud_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Quitar solicitudes del índice. En PostgreSQL el índice vive en la misma fila,
+    así que solo hace falta en SQLite
+    """
+    connection = connections[using]
+    ids = [SolicitudAprobacion._meta.pk.get_db_prep_value(i, connection) for i in solicitud_ids]
+    if not ids or connection.vendor != 'sqlite':
+        return
+
+    marcadores = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLA_FTS_SQLITE} WHERE solicitud_id IN ({marcadores})", ids
+        )
@@ -0,0 +1,17 @@
+# checks.py - Verificaciones de configuración para 'manage.py check --deploy'
+from django.conf import settings
+from django.core import checks
+
+
+@checks.register(checks.Tags.compatibility, deploy=True)
+def verificar_directorio_metricas(app_configs, **kwargs):
+    """Sin APROBACIONES_METRICAS_DIR cada worker expone solo sus propios contadores"""
+    if getattr(settings, 'APROBACIONES_METRICAS_DIR', None):
+        return []
+    return [checks.Warning(
+        'APROBACIONES_METRICAS_DIR no está configurado: con más de un worker cada '
+        'scrape de /metricas/ ve solo los contadores del proceso que lo atiende.',
+        hint='Definir APROBACIONES_METRICAS_DIR con un directorio compartido por los workers '
+             'y vaciarlo al reiniciar el servidor.',
+        id='aprobaciones.W001',
+    )]
@@ -78,4 +78,11 @@ TIPOS_COMENTARIO = [
     ('aprobado', 'Comentario de Aprobación'),
     ('rechazado', 'Comentario de Rechazo'),
     ('revision', 'Comentario de Revisión'),
-]
\ No newline at end of file
+]
+
+# Estados de las notificaciones en la bandeja de salida
+ESTADOS_NOTIFICACION = [
+    ('pendiente', 'Pendiente'),
+    ('enviada', 'Enviada'),
+    ('fallida', 'Fallida'),
+]
@@ -0,0 +1,148 @@
+# diagnostico.py - Estadísticas de conexiones a la base de datos por proceso
+#
+# Con el pool de psycopg (OPTIONS['pool']) se leen sus propias estadísticas.
+# Con conexiones persistentes (CONN_MAX_AGE) cada hilo tiene la suya; se cuentan
+# con la señal connection_created y se sigue cada conexión con una referencia débil.
+#
+# También mide consultas, tiempo de base de datos y de plantillas de la petición en
+# curso (ver MedicionPeticionMiddleware). Cada conexión lleva un execute_wrapper y el
+# backend de plantillas cronometra cada render; ambos solo acumulan si la petición
+# tiene una Medicion activa, así que fuera de la muestra el costo es leer una ContextVar.
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+_lock = threading.Lock()
+_creadas = Counter()
+_conexiones = weakref.WeakSet()
+
+_medicion = ContextVar('aprobaciones_medicion', default=None)
+
+
+class Medicion:
+    """Acumulado de una petición; la ContextVar la comparte con los hilos de sync_to_async"""
+    __slots__ = ('inicio', 'consultas', 'db', 'plantillas')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.db = 0.0
+        self.plantillas = 0.0
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+
+@contextmanager
+def medir():
+    """Activar la medición para lo que se ejecute dentro del bloque"""
+    medicion = Medicion()
+    token = _medicion.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion.reset(token)
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.consultas += 1
+        medicion.db += time.perf_counter() - inicio
+
+
+@receiver(connection_created)
+def registrar_conexion(sender, connection, **kwargs):
+    with _lock:
+        _creadas[connection.alias] += 1
+        _conexiones.add(connection)
+    # El wrapper queda en el objeto de conexión, que sobrevive a las reconexiones
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = _medicion.get()
+        if medicion is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """
+    Backend DjangoTemplates que cronometra cada render de nivel superior
+    (los {% include %} quedan dentro del tiempo de la plantilla que los incluye)
+    """
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return PlantillaMedida(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def estadisticas_conexiones():
+    """
+    Por alias: modo, conexiones en uso, peticiones esperando una conexión, creadas
+    y recicladas (cerradas por antigüedad, error o verificación de salud) en este proceso.
+    """
+    with _lock:
+        abiertas = Counter(
+            conexion.alias for conexion in list(_conexiones) if conexion.connection is not None
+        )
+        creadas = dict(_creadas)
+
+    resultado = []
+    for alias in connections:
+        ajustes = connections.settings[alias]
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            detalle = pool.get_stats()
+            resultado.append({
+                'alias': alias,
+                'modo': 'pool',
+                'en_uso': detalle.get('pool_size', 0) - detalle.get('pool_available', 0),
+                'esperando': detalle.get('requests_waiting', 0),
+                'creadas': detalle.get('connections_num', 0),
+                'recicladas': detalle.get('connections_num', 0) - detalle.get('pool_size', 0),
+                'detalle': detalle,
+            })
+            continue
+
+        resultado.append({
+            'alias': alias,
+            'modo': 'persistente' if ajustes.get('CONN_MAX_AGE') else 'por_peticion',
+            'en_uso': abiertas[alias],
+            # Sin pool cada hilo tiene su conexión: nunca se espera por una
+            'esperando': 0,
+            'creadas': creadas.get(alias, 0),
+            'recicladas': creadas.get(alias, 0) - abiertas[alias],
+            'detalle': {
+                'conn_max_age': ajustes.get('CONN_MAX_AGE'),
+                'conn_health_checks': ajustes.get('CONN_HEALTH_CHECKS'),
+            },
+        })
+
+    return resultado
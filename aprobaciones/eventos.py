@@ -0,0 +1,81 @@
+# eventos.py - Difusión en proceso de eventos de solicitudes (creación y cambios de estado)
+#
+# El servicio publica al confirmar cada transacción; cada conexión SSE abierta tiene
+# una cola asyncio en el event loop del servidor ASGI. Una conexión inactiva solo
+# ocupa su cola: no hace consultas ni renderiza nada hasta que llega un evento.
+# Con varios procesos ASGI cada uno tiene su propio broker, así que los eventos solo
+# llegan a los clientes conectados al proceso que hizo el cambio.
+import asyncio
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Eventos pendientes por conexión antes de empezar a descartar (cliente lento)
+TAMANO_COLA = getattr(settings, 'APROBACIONES_EVENTOS_TAMANO_COLA', 100)
+
+# Campos por los que un suscriptor puede filtrar
+FILTROS_EVENTOS = ('responsable', 'solicitante')
+
+
+class Suscripcion:
+    """Cola de eventos de una conexión, atada al event loop que la creó"""
+
+    def __init__(self, filtros):
+        self.filtros = {campo: valor for campo, valor in filtros.items() if valor}
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        self.descartados = 0
+
+    def acepta(self, evento):
+        return all(evento.get(campo) == valor for campo, valor in self.filtros.items())
+
+    def _entregar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.descartados += 1
+
+    async def siguiente(self, timeout=None):
+        """Esperar el próximo evento; None si se cumple el timeout"""
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BrokerEventos:
+    """Registro de suscripciones; publicar() se puede llamar desde cualquier hilo"""
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self, **filtros):
+        suscripcion = Suscripcion(filtros)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, evento):
+        with self._lock:
+            destinos = [s for s in self._suscripciones if s.acepta(evento)]
+        for suscripcion in destinos:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+            except RuntimeError:
+                # El loop ya se cerró: la conexión no volverá a leer
+                self.cancelar(suscripcion)
+        return len(destinos)
+
+    @property
+    def conexiones(self):
+        return len(self._suscripciones)
+
+
+broker = BrokerEventos()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from aprobaciones.services import SolicitudStorageService
+
+#actualizar_resumen_diario.py
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen diario de métricas solo para los días con cambios desde la última ejecución'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Recalcular todos los días en lugar de solo los modificados'
+        )
+    
+    def handle(self, *args, **options):
+        dias = SolicitudStorageService().actualizar_resumen_diario(completo=options['completo'])
+        
+        self.stdout.write(self.style.SUCCESS(f'{dias} días recalculados'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from aprobaciones.services import SolicitudStorageService, ARCHIVO_DIAS
+
+#archivar_solicitudes.py
+
+
+class Command(BaseCommand):
+    help = 'Mueve las solicitudes cerradas antiguas (con historial y comentarios) al archivo'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=ARCHIVO_DIAS,
+            help='Antigüedad mínima desde el cierre, en días'
+        )
+        parser.add_argument(
+            '--tamano-bloque', type=int, default=500,
+            help='Solicitudes archivadas por transacción'
+        )
+        parser.add_argument(
+            '--max-bloques', type=int,
+            help='Detenerse tras esta cantidad de bloques (por defecto, hasta terminar)'
+        )
+    
+    def handle(self, *args, **options):
+        total = SolicitudStorageService().archivar_solicitudes(
+            dias=options['dias'],
+            tamano_bloque=options['tamano_bloque'],
+            max_bloques=options['max_bloques']
+        )
+        
+        self.stdout.write(self.style.SUCCESS(f'{total} solicitudes archivadas'))
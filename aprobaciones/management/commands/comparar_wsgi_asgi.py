@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from aprobaciones.utils import percentil
+
+#comparar_wsgi_asgi.py
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la misma URL atendida por el handler WSGI (hilos) y el ASGI (event loop) '
+        'con la concurrencia indicada. Mide el handler de Django y el ORM, no el servidor HTTP'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/solicitudes/')
+        parser.add_argument('--peticiones', type=int, default=200)
+        parser.add_argument('--concurrencia', type=int, default=20)
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Cabecera Host de las peticiones (debe estar en ALLOWED_HOSTS)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1 or options['concurrencia'] < 1:
+            raise CommandError('--peticiones y --concurrencia deben ser positivos')
+        
+        for nombre, medir in (('WSGI', self._medir_wsgi), ('ASGI', self._medir_asgi)):
+            inicio = time.perf_counter()
+            tiempos, errores = medir(options)
+            total = time.perf_counter() - inicio
+            
+            tiempos.sort()
+            self.stdout.write(
+                f'{nombre}: {len(tiempos) / total:.1f} req/s, '
+                f'p50 {percentil(tiempos, 50) * 1000:.1f} ms, '
+                f'p95 {percentil(tiempos, 95) * 1000:.1f} ms, '
+                f'{errores} errores ({len(tiempos)} peticiones en {total:.2f} s)'
+            )
+    
+    def _medir_wsgi(self, options):
+        """Un cliente por hilo, como un servidor WSGI con N hilos"""
+        local = threading.local()
+        
+        def peticion(_):
+            if not hasattr(local, 'cliente'):
+                local.cliente = Client(HTTP_HOST=options['host'])
+            inicio = time.perf_counter()
+            response = local.cliente.get(options['url'])
+            return time.perf_counter() - inicio, response.status_code
+        
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            resultados = list(pool.map(peticion, range(options['peticiones'])))
+        
+        return [tiempo for tiempo, _ in resultados], sum(1 for _, estado in resultados if estado >= 400)
+    
+    def _medir_asgi(self, options):
+        """N peticiones simultáneas en un solo event loop"""
+        async def medir():
+            cliente = AsyncClient(HTTP_HOST=options['host'])
+            limite = asyncio.Semaphore(options['concurrencia'])
+            
+            async def peticion():
+                async with limite:
+                    inicio = time.perf_counter()
+                    response = await cliente.get(options['url'])
+                    return time.perf_counter() - inicio, response.status_code
+            
+            return await asyncio.gather(*(peticion() for _ in range(options['peticiones'])))
+        
+        resultados = asyncio.run(medir())
+        return [tiempo for tiempo, _ in resultados], sum(1 for _, estado in resultados if estado >= 400)
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand
+from aprobaciones.services import NotificacionService, NOTIFICACION_MAX_INTENTOS
+
+#despachar_notificaciones.py
+
+
+class Command(BaseCommand):
+    help = 'Envía en lotes las notificaciones pendientes de la bandeja de salida'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=100,
+            help='Cantidad de notificaciones por lote (una conexión SMTP por lote)'
+        )
+        parser.add_argument(
+            '--max-intentos', type=int, default=NOTIFICACION_MAX_INTENTOS,
+            help='Intentos antes de marcar una notificación como fallida'
+        )
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help='Seguir ejecutando y revisar la bandeja periódicamente'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5.0,
+            help='Segundos de espera cuando la bandeja está vacía (modo continuo)'
+        )
+    
+    def handle(self, *args, **options):
+        servicio = NotificacionService()
+        
+        while True:
+            enviadas, fallidas = servicio.despachar_lote(
+                tamano_lote=options['lote'],
+                max_intentos=options['max_intentos']
+            )
+            if enviadas or fallidas:
+                self.stdout.write(f'Lote procesado: {enviadas} enviadas, {fallidas} fallidas')
+            
+            if not options['continuo']:
+                # Sin modo continuo se drena la bandeja y se termina
+                if not (enviadas or fallidas):
+                    break
+                continue
+            
+            if not (enviadas or fallidas):
+                time.sleep(options['intervalo'])
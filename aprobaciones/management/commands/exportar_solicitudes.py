@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from aprobaciones.services import SolicitudStorageService, FORMATOS_EXPORTACION
+
+#exportar_solicitudes.py
+
+
+class Command(BaseCommand):
+    help = 'Exporta las solicitudes con historial y comentarios en CSV o JSON Lines'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=FORMATOS_EXPORTACION, default='csv')
+        parser.add_argument(
+            '--salida',
+            help='Archivo de destino (por defecto la salida estándar)'
+        )
+        parser.add_argument('--estado')
+        parser.add_argument('--tipo')
+        parser.add_argument('--solicitante')
+        parser.add_argument('--responsable')
+        parser.add_argument(
+            '--tamano-bloque', type=int, default=2000,
+            help='Filas leídas por bloque desde la base de datos'
+        )
+    
+    def handle(self, *args, **options):
+        lineas = SolicitudStorageService().exportar_solicitudes(
+            formato=options['formato'],
+            estado=options['estado'],
+            tipo=options['tipo'],
+            solicitante=options['solicitante'],
+            responsable=options['responsable'],
+            tamano_bloque=options['tamano_bloque']
+        )
+        
+        if not options['salida']:
+            for linea in lineas:
+                self.stdout.write(linea, ending='')
+            return
+        
+        try:
+            with open(options['salida'], 'w', encoding='utf-8', newline='') as archivo:
+                total = 0
+                for linea in lineas:
+                    archivo.write(linea)
+                    total += 1
+        except OSError as e:
+            raise CommandError(f'No se pudo escribir {options["salida"]}: {e}')
+        
+        self.stderr.write(self.style.SUCCESS(f'Exportación completa: {total} líneas'))
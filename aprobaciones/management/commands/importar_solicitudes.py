@@ -0,0 +1,46 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from aprobaciones.services import SolicitudStorageService, FORMATOS_EXPORTACION
+
+#importar_solicitudes.py
+
+
+class Command(BaseCommand):
+    help = 'Crea solicitudes en bloque desde un archivo CSV o JSON Lines'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo a importar')
+        parser.add_argument(
+            '--formato', choices=FORMATOS_EXPORTACION,
+            help='Formato del archivo (por defecto según la extensión)'
+        )
+        parser.add_argument(
+            '--tamano-bloque', type=int, default=500,
+            help='Solicitudes insertadas por transacción'
+        )
+    
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        formato = options['formato'] or os.path.splitext(ruta)[1].lstrip('.').lower()
+        if formato not in FORMATOS_EXPORTACION:
+            raise CommandError(f"Formato '{formato}' no soportado")
+        
+        try:
+            with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+                resultado = SolicitudStorageService().importar_solicitudes(
+                    archivo,
+                    formato=formato,
+                    tamano_bloque=options['tamano_bloque']
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo leer {ruta}: {e}')
+        
+        for error in resultado['errores']:
+            detalle = '; '.join(
+                f'{campo}: {", ".join(mensajes)}' for campo, mensajes in error['errores'].items()
+            )
+            self.stderr.write(f'Fila {error["fila"]}: {detalle}')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado["creadas"]} solicitudes importadas, {len(resultado["errores"])} filas con errores'
+        ))
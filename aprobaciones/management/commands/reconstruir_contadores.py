@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from aprobaciones.services import SolicitudStorageService
+
+#reconstruir_contadores.py
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los contadores de estadísticas de solicitudes'
+    
+    def handle(self, *args, **options):
+        storage = SolicitudStorageService()
+        cantidad = storage.reconstruir_contadores()
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores reconstruidos: {cantidad} filas'
+        ))
+        estadisticas = storage.obtener_estadisticas()
+        for clave, valor in estadisticas.items():
+            self.stdout.write(f'  {clave}: {valor}')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from aprobaciones import busqueda
+from aprobaciones.services import SolicitudStorageService
+
+#reconstruir_indice_busqueda.py
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el índice de búsqueda de texto completo de todas las solicitudes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-bloque', type=int, default=1000,
+            help='Solicitudes reindexadas por sentencia'
+        )
+    
+    def handle(self, *args, **options):
+        if not busqueda.busqueda_disponible():
+            raise CommandError('El motor de base de datos no tiene índice de búsqueda')
+        
+        total = SolicitudStorageService().reconstruir_indice_busqueda(
+            tamano_bloque=options['tamano_bloque']
+        )
+        
+        self.stdout.write(self.style.SUCCESS(f'{total} solicitudes reindexadas'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from aprobaciones.services import SolicitudStorageService
+
+#reparar_actividad.py
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las columnas de actividad (comentarios, eventos, última acción) de las solicitudes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-bloque', type=int, default=1000,
+            help='Solicitudes actualizadas por transacción'
+        )
+    
+    def handle(self, *args, **options):
+        total = SolicitudStorageService().reparar_actividad(
+            tamano_bloque=options['tamano_bloque']
+        )
+        
+        self.stdout.write(self.style.SUCCESS(f'Actividad recalculada para {total} solicitudes'))
@@ -0,0 +1,205 @@
+# metricas.py - Métricas de operación en formato de texto de Prometheus
+#
+# Cada proceso acumula sus contadores en memoria (un dict protegido por un lock) y,
+# como mucho cada INTERVALO_VOLCADO segundos, vuelca el acumulado a un archivo propio
+# en DIRECTORIO_METRICAS. El scrape suma los archivos de todos los procesos, así que
+# cualquier worker de mod_wsgi responde con el total. Sin directorio configurado solo
+# se ven las métricas del proceso que atiende el scrape.
+# Los archivos de procesos terminados se siguen sumando para que los contadores no
+# retrocedan; el directorio se vacía al reiniciar el servidor (igual que el modo
+# multiproceso de prometheus_client).
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+
+DIRECTORIO_METRICAS = getattr(settings, 'APROBACIONES_METRICAS_DIR', None)
+INTERVALO_VOLCADO = getattr(settings, 'APROBACIONES_METRICAS_INTERVALO', 5)
+
+# Límites de los buckets de latencia en segundos
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nombre: (tipo, ayuda)
+METRICAS = {
+    'aprobaciones_peticiones_total': (
+        'counter', 'Peticiones atendidas por vista, método y código de estado'
+    ),
+    'aprobaciones_peticion_duracion_segundos': (
+        'histogram', 'Tiempo de respuesta por vista'
+    ),
+    'aprobaciones_transiciones_total': (
+        'counter', 'Cambios de estado confirmados por tipo de solicitud y estado destino'
+    ),
+    'aprobaciones_notificaciones_total': (
+        'counter', 'Intentos de envío de notificaciones por resultado'
+    ),
+}
+
+
+def _etiquetas(etiquetas):
+    return tuple(sorted((clave, str(valor)) for clave, valor in etiquetas.items()))
+
+
+def _escapar(valor):
+    return valor.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _formatear_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+def formatear_muestra(serie, etiquetas, valor):
+    """Una línea de la exposición: serie{etiqueta="valor",...} valor"""
+    if not etiquetas:
+        return f'{serie} {_formatear_numero(valor)}'
+    pares = ','.join(f'{clave}="{_escapar(texto)}"' for clave, texto in etiquetas)
+    return f'{serie}{{{pares}}} {_formatear_numero(valor)}'
+
+
+def formatear_familia(nombre, tipo, ayuda, muestras):
+    """muestras: [(serie, etiquetas, valor)]"""
+    lineas = [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+    lineas.extend(formatear_muestra(serie, etiquetas, valor) for serie, etiquetas, valor in muestras)
+    return lineas
+
+
+class RegistroMetricas:
+    """
+    Contadores e histogramas del proceso. Toda muestra es acumulativa (también los
+    buckets, la suma y la cuenta de los histogramas), por eso sumar los archivos de
+    varios procesos da el total correcto.
+    """
+
+    def __init__(self, directorio=None, intervalo=INTERVALO_VOLCADO):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # Se llama también después de un fork: el hijo no hereda lo acumulado por el padre
+        self._pid = os.getpid()
+        self._valores = {}
+        self._archivo = None
+        self._proximo_volcado = time.monotonic() + self.intervalo
+
+    def _sumar(self, familia, serie, etiquetas, valor):
+        clave = (familia, serie, etiquetas)
+        self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reiniciar()
+            self._sumar(nombre, nombre, _etiquetas(etiquetas), valor)
+            volcar = self._volcado_vencido()
+        if volcar:
+            self.volcar()
+
+    def observar(self, nombre, valor, buckets=BUCKETS_LATENCIA, **etiquetas):
+        etiquetas = _etiquetas(etiquetas)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reiniciar()
+            # Los buckets en cero también se guardan para que la serie esté completa
+            for limite in (*buckets, float('inf')):
+                le = etiquetas + (('le', _formatear_numero(limite)),)
+                self._sumar(nombre, f'{nombre}_bucket', le, 1 if valor <= limite else 0)
+            self._sumar(nombre, f'{nombre}_sum', etiquetas, valor)
+            self._sumar(nombre, f'{nombre}_count', etiquetas, 1)
+            volcar = self._volcado_vencido()
+        if volcar:
+            self.volcar()
+
+    def _volcado_vencido(self):
+        """Con el lock tomado: reservar el próximo volcado para que lo haga un solo hilo"""
+        if self.directorio is None or time.monotonic() < self._proximo_volcado:
+            return False
+        self._proximo_volcado = time.monotonic() + self.intervalo
+        return True
+
+    def volcar(self):
+        """Escribir el acumulado del proceso en su archivo (reemplazo atómico)"""
+        if self.directorio is None:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reiniciar()
+            if self._archivo is None:
+                self._archivo = os.path.join(
+                    self.directorio, f'metricas-{self._pid}-{uuid.uuid4().hex[:8]}.json'
+                )
+            archivo = self._archivo
+            filas = [
+                [familia, serie, etiquetas, valor]
+                for (familia, serie, etiquetas), valor in self._valores.items()
+            ]
+
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = f'{archivo}.{threading.get_ident()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(filas, f, ensure_ascii=False)
+        os.replace(temporal, archivo)
+
+    def valores(self):
+        """{(familia, serie, etiquetas): valor} sumado entre procesos"""
+        if self.directorio is None:
+            with self._lock:
+                return dict(self._valores)
+
+        self.volcar()
+        total = {}
+        for archivo in glob.glob(os.path.join(self.directorio, 'metricas-*.json')):
+            try:
+                with open(archivo, encoding='utf-8') as f:
+                    filas = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for familia, serie, etiquetas, valor in filas:
+                clave = (familia, serie, tuple(tuple(par) for par in etiquetas))
+                total[clave] = total.get(clave, 0) + valor
+        return total
+
+    def exportar(self, adicionales=()):
+        """
+        Texto de exposición de Prometheus. adicionales: [(nombre, tipo, ayuda, muestras)]
+        para métricas calculadas al momento del scrape (por ejemplo, gauges desde la base).
+        """
+        por_familia = {}
+        for (familia, serie, etiquetas), valor in self.valores().items():
+            por_familia.setdefault(familia, []).append((serie, etiquetas, valor))
+
+        lineas = []
+        for nombre, (tipo, ayuda) in METRICAS.items():
+            muestras = sorted(por_familia.get(nombre, []), key=self._orden_muestra)
+            lineas.extend(formatear_familia(nombre, tipo, ayuda, muestras))
+        for nombre, tipo, ayuda, muestras in adicionales:
+            lineas.extend(formatear_familia(nombre, tipo, ayuda, muestras))
+        return '\n'.join(lineas) + '\n'
+
+    @staticmethod
+    def _orden_muestra(muestra):
+        serie, etiquetas, _ = muestra
+        # Buckets en orden numérico de 'le' (no alfabético)
+        sin_le = tuple(par for par in etiquetas if par[0] != 'le')
+        le = next((float(texto) for clave, texto in etiquetas if clave == 'le'), 0.0)
+        return sin_le, serie, le
+
+
+registro = RegistroMetricas(DIRECTORIO_METRICAS)
+# Lo acumulado desde el último volcado no se pierde al terminar el worker
+atexit.register(registro.volcar)
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    registro.incrementar(nombre, valor, **etiquetas)
+
+
+def observar(nombre, valor, **etiquetas):
+    registro.observar(nombre, valor, **etiquetas)
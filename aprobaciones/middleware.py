@@ -0,0 +1,178 @@
+# middleware.py - Middleware del módulo de aprobaciones
+import json
+import logging
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import metricas
+from .diagnostico import medir
+from .routers import leer_de_primaria
+
+logger = logging.getLogger(__name__)
+
+# Fracción de peticiones medidas (1.0 = todas). En producción basta una muestra
+MUESTREO_MEDICION = getattr(
+    settings, 'APROBACIONES_MUESTREO_MEDICION', 1.0 if settings.DEBUG else 0.05
+)
+# Presupuestos por petición; las que los exceden se registran como WARNING
+PRESUPUESTO_CONSULTAS = getattr(settings, 'APROBACIONES_PRESUPUESTO_CONSULTAS', 20)
+PRESUPUESTO_MS = getattr(settings, 'APROBACIONES_PRESUPUESTO_MS', 500)
+# Exponer los tiempos al navegador en la cabecera Server-Timing
+SERVER_TIMING = getattr(settings, 'APROBACIONES_SERVER_TIMING', True)
+
+# Segundos que un usuario lee de la principal después de escribir (mayor que el
+# retraso de replicación esperado)
+PIN_PRIMARIA_SEGUNDOS = getattr(settings, 'APROBACIONES_PIN_PRIMARIA_SEGUNDOS', 10)
+COOKIE_PIN_PRIMARIA = 'aprobaciones_primaria'
+
+
+class LecturaPrimariaMiddleware:
+    """
+    "Leer lo que uno escribió": las peticiones que escriben (POST, etc.) y las
+    siguientes del mismo navegador durante PIN_PRIMARIA_SEGUNDOS leen de la base
+    principal, así quien acaba de aprobar ve el cambio aunque la réplica vaya atrasada.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._fijar(request):
+            return self._marcar(request, self.get_response(request))
+        with leer_de_primaria():
+            return self._marcar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        if not self._fijar(request):
+            return self._marcar(request, await self.get_response(request))
+        with leer_de_primaria():
+            return self._marcar(request, await self.get_response(request))
+
+    def _fijar(self, request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') or COOKIE_PIN_PRIMARIA in request.COOKIES
+
+    def _marcar(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                COOKIE_PIN_PRIMARIA, '1', max_age=PIN_PRIMARIA_SEGUNDOS, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class MedicionPeticionMiddleware:
+    """
+    En una muestra de las peticiones mide consultas SQL, tiempo de base de datos,
+    de plantillas y total; los envía en la cabecera Server-Timing y en una línea de
+    log JSON. Va en MIDDLEWARE justo después de MetricasPeticionMiddleware: el total
+    incluye el resto de la cadena (sesión, autenticación, vista y plantillas) pero no
+    el registro de métricas, que no hace consultas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= MUESTREO_MEDICION:
+            return self.get_response(request)
+        with medir() as medicion:
+            response = self.get_response(request)
+        return self._reportar(request, response, medicion)
+
+    async def __acall__(self, request):
+        if random.random() >= MUESTREO_MEDICION:
+            return await self.get_response(request)
+        with medir() as medicion:
+            response = await self.get_response(request)
+        return self._reportar(request, response, medicion)
+
+    def _reportar(self, request, response, medicion):
+        total_ms = medicion.total * 1000
+        db_ms = medicion.db * 1000
+        plantillas_ms = medicion.plantillas * 1000
+
+        excede = []
+        if medicion.consultas > PRESUPUESTO_CONSULTAS:
+            excede.append('consultas')
+        if total_ms > PRESUPUESTO_MS:
+            excede.append('tiempo')
+
+        if SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={db_ms:.1f};desc="{medicion.consultas} consultas", '
+                f'tpl;dur={plantillas_ms:.1f}, total;dur={total_ms:.1f}'
+            )
+
+        coincidencia = request.resolver_match
+        datos = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': coincidencia.view_name if coincidencia else None,
+            'estado': response.status_code,
+            'consultas': medicion.consultas,
+            'db_ms': round(db_ms, 1),
+            'plantillas_ms': round(plantillas_ms, 1),
+            'total_ms': round(total_ms, 1),
+            'excede': excede,
+        }
+        logger.log(
+            logging.WARNING if excede else logging.INFO,
+            json.dumps(datos, ensure_ascii=False), extra={'medicion': datos}
+        )
+        return response
+
+
+# Métodos que se etiquetan por nombre; cualquier otro verbo cuenta como 'otro'
+METODOS_HTTP = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+class MetricasPeticionMiddleware:
+    """
+    Cuenta todas las peticiones por vista, método y estado y registra su latencia en
+    el histograma de la vista. La vista es el nombre de la URL, no la ruta, para que
+    la cantidad de series no crezca con los ids; las rutas sin vista van a 'sin_ruta'
+    y los métodos fuera de METODOS_HTTP a 'otro'.
+    En respuestas en streaming (SSE) se mide hasta que empieza la respuesta.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        self._registrar(request, response, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        self._registrar(request, response, time.perf_counter() - inicio)
+        return response
+
+    def _registrar(self, request, response, duracion):
+        coincidencia = request.resolver_match
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        metodo = request.method if request.method in METODOS_HTTP else 'otro'
+        metricas.incrementar(
+            'aprobaciones_peticiones_total', vista=vista, metodo=metodo, estado=response.status_code
+        )
+        metricas.observar('aprobaciones_peticion_duracion_segundos', duracion, vista=vista)
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:48
+
+from collections import Counter
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_contadores(apps, schema_editor):
+    """Inicializa los contadores a partir de las solicitudes existentes"""
+    SolicitudAprobacion = apps.get_model('aprobaciones', 'SolicitudAprobacion')
+    ContadorSolicitudes = apps.get_model('aprobaciones', 'ContadorSolicitudes')
+    
+    totales = Counter()
+    contadores = []
+    agrupado = SolicitudAprobacion.objects.order_by().values(
+        'estado', 'tipo_solicitud', 'responsable'
+    ).annotate(cantidad=Count('id'))
+    for fila in agrupado:
+        contadores.append(ContadorSolicitudes(**fila))
+        totales[fila['estado']] += fila['cantidad']
+    contadores.extend(
+        ContadorSolicitudes(estado=estado, cantidad=cantidad)
+        for estado, cantidad in totales.items()
+    )
+    ContadorSolicitudes.objects.bulk_create(contadores, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='solicitudaprobacion',
+            name='tipo_solicitud',
+            field=models.CharField(choices=[('despliegue', 'Despliegue a Producción'), ('acceso', 'Solicitud de Acceso'), ('cambio_tecnico', 'Cambio Técnico'), ('pipeline', 'Configuración Pipeline'), ('incorporacion', 'Incorporación Personal'), ('otro', 'Otro')], help_text='Tipo de solicitud', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ContadorSolicitudes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_revision', 'En Revisión'), ('aprobado', 'Aprobado'), ('rechazado', 'Rechazado'), ('cancelado', 'Cancelado')], help_text='Estado contado', max_length=20)),
+                ('tipo_solicitud', models.CharField(blank=True, help_text='Tipo de solicitud (vacío para el total del estado)', max_length=20)),
+                ('responsable', models.CharField(blank=True, help_text='Responsable (vacío para el total del estado)', max_length=100)),
+                ('shard', models.PositiveSmallIntegerField(default=0, help_text='Partición del contador')),
+                ('cantidad', models.IntegerField(default=0, help_text='Cantidad de solicitudes')),
+            ],
+            options={
+                'verbose_name': 'Contador de Solicitudes',
+                'verbose_name_plural': 'Contadores de Solicitudes',
+                'constraints': [models.UniqueConstraint(fields=('estado', 'tipo_solicitud', 'responsable', 'shard'), name='contador_solicitudes_clave_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0002_contadorsolicitudes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.CharField(help_text='Dirección de email del destinatario', max_length=254)),
+                ('asunto', models.CharField(help_text='Asunto del email', max_length=255)),
+                ('mensaje', models.TextField(help_text='Cuerpo del email')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviada', 'Enviada'), ('fallida', 'Fallida')], default='pendiente', help_text='Estado de entrega', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0, help_text='Intentos de envío realizados')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha a partir de la cual se puede intentar el envío')),
+                ('ultimo_error', models.TextField(blank=True, help_text='Error del último intento fallido')),
+                ('fecha_creacion', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha y hora en que se encoló la notificación')),
+                ('fecha_envio', models.DateTimeField(blank=True, help_text='Fecha y hora de entrega', null=True)),
+                ('solicitud', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificaciones', to='aprobaciones.solicitudaprobacion')),
+            ],
+            options={
+                'verbose_name': 'Notificación Email',
+                'verbose_name_plural': 'Notificaciones Email',
+                'ordering': ['fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='aprobacione_estado_aae2a1_idx')],
+            },
+        ),
+    ]
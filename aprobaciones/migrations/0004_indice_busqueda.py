@@ -0,0 +1,53 @@
+# Índice de búsqueda de texto completo (ver aprobaciones/busqueda.py)
+
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE aprobaciones_solicitudaprobacion ADD COLUMN busqueda tsvector'
+        )
+        schema_editor.execute(
+            'CREATE INDEX aprobaciones_solicitud_busqueda_gin '
+            'ON aprobaciones_solicitudaprobacion USING gin (busqueda)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE aprobaciones_busqueda_fts USING fts5('
+            'solicitud_id UNINDEXED, titulo, descripcion, comentarios, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    else:
+        return
+    
+    # Indexar las solicitudes existentes
+    from aprobaciones.busqueda import actualizar_indice
+    SolicitudAprobacion = apps.get_model('aprobaciones', 'SolicitudAprobacion')
+    ids = list(
+        SolicitudAprobacion.objects.using(schema_editor.connection.alias).values_list('id', flat=True)
+    )
+    for inicio in range(0, len(ids), 1000):
+        actualizar_indice(ids[inicio:inicio + 1000], using=schema_editor.connection.alias)
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE aprobaciones_solicitudaprobacion DROP COLUMN busqueda'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE aprobaciones_busqueda_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0003_notificacionemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0004_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='solicitudaprobacion',
+            name='aprobacione_estado_0d9171_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicitudaprobacion',
+            name='aprobacione_tipo_so_b6b174_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicitudaprobacion',
+            name='aprobacione_solicit_3fd346_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicitudaprobacion',
+            name='aprobacione_respons_cdb3a1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='solicitudaprobacion',
+            name='aprobacione_fecha_c_da430d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comentariosolicitud',
+            index=models.Index(fields=['solicitud', 'fecha'], name='aprobacione_solicit_1c922c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialsolicitud',
+            index=models.Index(fields=['solicitud', 'fecha'], name='aprobacione_solicit_81fbe3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudaprobacion',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='aprobacione_fecha_c_0860d3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudaprobacion',
+            index=models.Index(fields=['estado', 'fecha_creacion', 'id'], name='aprobacione_estado_5578b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudaprobacion',
+            index=models.Index(fields=['tipo_solicitud', 'fecha_creacion', 'id'], name='aprobacione_tipo_so_999066_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudaprobacion',
+            index=models.Index(fields=['solicitante', 'fecha_creacion', 'id'], name='aprobacione_solicit_e7590f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudaprobacion',
+            index=models.Index(fields=['responsable', 'fecha_creacion', 'id'], name='aprobacione_respons_41ecfb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudaprobacion',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['responsable', 'fecha_creacion'], name='solicitud_pendiente_resp_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def poblar_actividad(apps, schema_editor):
+    """Calcula la actividad de las solicitudes existentes desde historial y comentarios"""
+    SolicitudAprobacion = apps.get_model('aprobaciones', 'SolicitudAprobacion')
+    HistorialSolicitud = apps.get_model('aprobaciones', 'HistorialSolicitud')
+    ComentarioSolicitud = apps.get_model('aprobaciones', 'ComentarioSolicitud')
+    
+    def conteo(modelo):
+        return Coalesce(Subquery(
+            modelo.objects.filter(solicitud=OuterRef('pk')).order_by().values(
+                'solicitud'
+            ).annotate(total=Count('id')).values('total')
+        ), 0)
+    
+    ultimo = HistorialSolicitud.objects.filter(solicitud=OuterRef('pk')).order_by('-fecha', '-id')
+    SolicitudAprobacion.objects.update(
+        num_comentarios=conteo(ComentarioSolicitud),
+        num_eventos=conteo(HistorialSolicitud),
+        ultima_accion=Coalesce(Subquery(ultimo.values('accion')[:1]), Value('')),
+        ultimo_usuario=Coalesce(Subquery(ultimo.values('usuario')[:1]), Value('')),
+        fecha_ultima_accion=Subquery(ultimo.values('fecha')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0005_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitudaprobacion',
+            name='fecha_ultima_accion',
+            field=models.DateTimeField(blank=True, help_text='Fecha y hora de la última acción', null=True),
+        ),
+        migrations.AddField(
+            model_name='solicitudaprobacion',
+            name='num_comentarios',
+            field=models.PositiveIntegerField(default=0, help_text='Cantidad de comentarios'),
+        ),
+        migrations.AddField(
+            model_name='solicitudaprobacion',
+            name='num_eventos',
+            field=models.PositiveIntegerField(default=0, help_text='Cantidad de entradas en el historial'),
+        ),
+        migrations.AddField(
+            model_name='solicitudaprobacion',
+            name='ultima_accion',
+            field=models.CharField(blank=True, help_text='Última acción registrada en el historial', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='solicitudaprobacion',
+            name='ultimo_usuario',
+            field=models.CharField(blank=True, help_text='Usuario que realizó la última acción', max_length=100),
+        ),
+        migrations.RunPython(poblar_actividad, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0006_actividad_desnormalizada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudArchivada',
+            fields=[
+                ('id', models.UUIDField(editable=False, help_text='ID original de la solicitud', primary_key=True, serialize=False)),
+                ('titulo', models.CharField(help_text='Título de la solicitud', max_length=200)),
+                ('solicitante', models.CharField(help_text='Usuario de red del solicitante', max_length=100)),
+                ('responsable', models.CharField(help_text='Usuario de red del responsable de aprobar', max_length=100)),
+                ('tipo_solicitud', models.CharField(choices=[('despliegue', 'Despliegue a Producción'), ('acceso', 'Solicitud de Acceso'), ('cambio_tecnico', 'Cambio Técnico'), ('pipeline', 'Configuración Pipeline'), ('incorporacion', 'Incorporación Personal'), ('otro', 'Otro')], help_text='Tipo de solicitud', max_length=20)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_revision', 'En Revisión'), ('aprobado', 'Aprobado'), ('rechazado', 'Rechazado'), ('cancelado', 'Cancelado')], help_text='Estado final de la solicitud', max_length=20)),
+                ('fecha_creacion', models.DateTimeField(help_text='Fecha y hora de creación')),
+                ('fecha_cierre', models.DateTimeField(help_text='Última actualización antes de archivarse')),
+                ('fecha_archivo', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha y hora en que se archivó')),
+                ('datos', models.JSONField(help_text='Solicitud completa con historial y comentarios')),
+            ],
+            options={
+                'verbose_name': 'Solicitud Archivada',
+                'verbose_name_plural': 'Solicitudes Archivadas',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='solicitudaprobacion',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='aprobacione_fecha_a_2ddcf2_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0007_solicitudarchivada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaProceso',
+            fields=[
+                ('nombre', models.CharField(help_text='Nombre del proceso', max_length=50, primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField(help_text='Momento hasta el que ya se procesaron los cambios')),
+            ],
+            options={
+                'verbose_name': 'Marca de Proceso',
+                'verbose_name_plural': 'Marcas de Proceso',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día (hora local) al que corresponden las métricas')),
+                ('tipo_solicitud', models.CharField(blank=True, help_text='Tipo de solicitud (vacío en las filas por responsable)', max_length=20)),
+                ('responsable', models.CharField(blank=True, help_text='Responsable (vacío en las filas por tipo)', max_length=100)),
+                ('creadas', models.IntegerField(default=0)),
+                ('aprobadas', models.IntegerField(default=0)),
+                ('rechazadas', models.IntegerField(default=0)),
+                ('canceladas', models.IntegerField(default=0)),
+                ('tiempo_cierre_p50', models.FloatField(blank=True, help_text='Mediana en segundos desde la creación hasta el estado final', null=True)),
+                ('tiempo_cierre_p90', models.FloatField(blank=True, help_text='Percentil 90 en segundos desde la creación hasta el estado final', null=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'ordering': ['fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='historialsolicitud',
+            index=models.Index(fields=['fecha'], name='aprobacione_fecha_3d363b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumendiario',
+            constraint=models.UniqueConstraint(fields=('fecha', 'tipo_solicitud', 'responsable'), name='resumen_diario_clave_unica'),
+        ),
+    ]
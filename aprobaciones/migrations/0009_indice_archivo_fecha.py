@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0008_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solicitudarchivada',
+            index=models.Index(fields=['fecha_creacion'], name='aprobacione_fecha_c_aa16da_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprobaciones', '0009_indice_archivo_fecha'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solicitudarchivada',
+            index=models.Index(fields=['fecha_archivo'], name='aprobacione_fecha_a_ceb0f5_idx'),
+        ),
+    ]
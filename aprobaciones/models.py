@@ -2,7 +2,7 @@
 from django.db import models
 from django.utils import timezone
 import uuid
-from .constants import ESTADOS_SOLICITUD, TIPOS_SOLICITUD
+from .constants import ESTADOS_SOLICITUD, TIPOS_SOLICITUD, ESTADOS_NOTIFICACION
 
 class SolicitudAprobacion(models.Model):
     """
@@ -57,30 +57,84 @@ class SolicitudAprobacion(models.Model):
         help_text='Fecha y hora de última actualización'
     )
     
+    # Actividad desnormalizada: la mantiene SolicitudStorageService en cada escritura
+    # (reparable con el comando reparar_actividad) para que los listados no lean
+    # el historial ni los comentarios
+    num_comentarios = models.PositiveIntegerField(
+        default=0,
+        help_text='Cantidad de comentarios'
+    )
+    
+    num_eventos = models.PositiveIntegerField(
+        default=0,
+        help_text='Cantidad de entradas en el historial'
+    )
+    
+    ultima_accion = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text='Última acción registrada en el historial'
+    )
+    
+    ultimo_usuario = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Usuario que realizó la última acción'
+    )
+    
+    fecha_ultima_accion = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Fecha y hora de la última acción'
+    )
+    
     class Meta:
         verbose_name = 'Solicitud de Aprobación'
         verbose_name_plural = 'Solicitudes de Aprobación'
         ordering = ['-fecha_creacion']
+        # Índices según los patrones de consulta del servicio: filtro por igualdad
+        # seguido de (fecha_creacion, id) para leer ya ordenado y paginar por cursor
         indexes = [
-            models.Index(fields=['estado']),
-            models.Index(fields=['tipo_solicitud']),
-            models.Index(fields=['solicitante']),
-            models.Index(fields=['responsable']),
-            models.Index(fields=['fecha_creacion']),
+            models.Index(fields=['fecha_creacion', 'id']),
+            models.Index(fields=['estado', 'fecha_creacion', 'id']),
+            models.Index(fields=['tipo_solicitud', 'fecha_creacion', 'id']),
+            models.Index(fields=['solicitante', 'fecha_creacion', 'id']),
+            models.Index(fields=['responsable', 'fecha_creacion', 'id']),
+            models.Index(fields=['fecha_actualizacion', 'id']),
+            # Bandeja de pendientes por responsable, la más consultada por aprobadores
+            models.Index(
+                fields=['responsable', 'fecha_creacion'],
+                condition=models.Q(estado='pendiente'),
+                name='solicitud_pendiente_resp_idx'
+            ),
         ]
     
     def __str__(self):
         return f"{self.titulo} - {self.get_estado_display()}"
     
+    def _relacion_prefetcheada(self, nombre):
+        """Indica si la relación ya fue cargada con prefetch_related"""
+        return nombre in getattr(self, '_prefetched_objects_cache', {})
+    
     @property
     def historial_ordenado(self):
-        """Retorna el historial ordenado por fecha"""
-        return self.historial.all().order_by('fecha')
+        """
+        Retorna el historial ordenado por fecha.
+        Si fue cargado con un Prefetch ordenado se usa la caché sin consultar la BD.
+        """
+        if self._relacion_prefetcheada('historial'):
+            return self.historial.all()
+        return self.historial.order_by('fecha')
     
     @property
     def comentarios_ordenados(self):
-        """Retorna los comentarios ordenados por fecha"""
-        return self.comentarios.all().order_by('fecha')
+        """
+        Retorna los comentarios ordenados por fecha.
+        Si fueron cargados con un Prefetch ordenado se usa la caché sin consultar la BD.
+        """
+        if self._relacion_prefetcheada('comentarios'):
+            return self.comentarios.all()
+        return self.comentarios.order_by('fecha')
 
 
 class HistorialSolicitud(models.Model):
@@ -123,6 +177,10 @@ class HistorialSolicitud(models.Model):
         verbose_name = 'Entrada de Historial'
         verbose_name_plural = 'Entradas de Historial'
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['solicitud', 'fecha']),
+            models.Index(fields=['fecha']),
+        ]
     
     def __str__(self):
         return f"{self.solicitud.titulo} - {self.accion} por {self.usuario}"
@@ -168,6 +226,273 @@ class ComentarioSolicitud(models.Model):
         verbose_name = 'Comentario'
         verbose_name_plural = 'Comentarios'
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['solicitud', 'fecha']),
+        ]
+    
+    def __str__(self):
+        return f"Comentario de {self.usuario} en {self.solicitud.titulo}"
+
+class ContadorSolicitudes(models.Model):
+    """
+    Contadores de solicitudes por estado, mantenidos incrementalmente por el servicio.
+    Las filas con tipo_solicitud y responsable vacíos son los totales por estado.
+    Cada clave se reparte en varios shards para evitar contención sobre una sola fila.
+    """
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS_SOLICITUD,
+        help_text='Estado contado'
+    )
+    
+    tipo_solicitud = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text='Tipo de solicitud (vacío para el total del estado)'
+    )
+    
+    responsable = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Responsable (vacío para el total del estado)'
+    )
+    
+    shard = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Partición del contador'
+    )
+    
+    cantidad = models.IntegerField(
+        default=0,
+        help_text='Cantidad de solicitudes'
+    )
+    
+    class Meta:
+        verbose_name = 'Contador de Solicitudes'
+        verbose_name_plural = 'Contadores de Solicitudes'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['estado', 'tipo_solicitud', 'responsable', 'shard'],
+                name='contador_solicitudes_clave_unica'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.estado}/{self.tipo_solicitud or '*'}/{self.responsable or '*'}: {self.cantidad}"
+
+
+
+class NotificacionEmail(models.Model):
+    """
+    Bandeja de salida de notificaciones por email.
+    Se escribe en la misma transacción que el cambio de la solicitud y la
+    despacha en lotes el comando despachar_notificaciones.
+    """
+    solicitud = models.ForeignKey(
+        SolicitudAprobacion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notificaciones'
+    )
+    
+    destinatario = models.CharField(
+        max_length=254,
+        help_text='Dirección de email del destinatario'
+    )
+    
+    asunto = models.CharField(
+        max_length=255,
+        help_text='Asunto del email'
+    )
+    
+    mensaje = models.TextField(
+        help_text='Cuerpo del email'
+    )
+    
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS_NOTIFICACION,
+        default='pendiente',
+        help_text='Estado de entrega'
+    )
+    
+    intentos = models.PositiveIntegerField(
+        default=0,
+        help_text='Intentos de envío realizados'
+    )
+    
+    proximo_intento = models.DateTimeField(
+        default=timezone.now,
+        help_text='Fecha a partir de la cual se puede intentar el envío'
+    )
+    
+    ultimo_error = models.TextField(
+        blank=True,
+        help_text='Error del último intento fallido'
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        default=timezone.now,
+        help_text='Fecha y hora en que se encoló la notificación'
+    )
+    
+    fecha_envio = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Fecha y hora de entrega'
+    )
+    
+    class Meta:
+        verbose_name = 'Notificación Email'
+        verbose_name_plural = 'Notificaciones Email'
+        ordering = ['fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento']),
+        ]
+    
+    def __str__(self):
+        return f"{self.asunto} -> {self.destinatario} ({self.get_estado_display()})"
+
+
+class SolicitudArchivada(models.Model):
+    """
+    Solicitud en estado final movida fuera de las tablas activas.
+    Guarda la solicitud completa (con historial y comentarios) en un solo
+    documento JSON; las columnas sueltas son las que se usan para consultar.
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        editable=False,
+        help_text='ID original de la solicitud'
+    )
+    
+    titulo = models.CharField(
+        max_length=200,
+        help_text='Título de la solicitud'
+    )
+    
+    solicitante = models.CharField(
+        max_length=100,
+        help_text='Usuario de red del solicitante'
+    )
+    
+    responsable = models.CharField(
+        max_length=100,
+        help_text='Usuario de red del responsable de aprobar'
+    )
+    
+    tipo_solicitud = models.CharField(
+        max_length=20,
+        choices=TIPOS_SOLICITUD,
+        help_text='Tipo de solicitud'
+    )
+    
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS_SOLICITUD,
+        help_text='Estado final de la solicitud'
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        help_text='Fecha y hora de creación'
+    )
+    
+    fecha_cierre = models.DateTimeField(
+        help_text='Última actualización antes de archivarse'
+    )
+    
+    fecha_archivo = models.DateTimeField(
+        default=timezone.now,
+        help_text='Fecha y hora en que se archivó'
+    )
+    
+    datos = models.JSONField(
+        help_text='Solicitud completa con historial y comentarios'
+    )
+    
+    class Meta:
+        verbose_name = 'Solicitud Archivada'
+        verbose_name_plural = 'Solicitudes Archivadas'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['fecha_creacion']),
+            models.Index(fields=['fecha_archivo']),
+        ]
+    
+    def __str__(self):
+        return f"{self.titulo} - {self.get_estado_display()} (archivada)"
+
+
+class ResumenDiario(models.Model):
+    """
+    Métricas diarias precalculadas a partir del historial.
+    Las filas con responsable vacío son por tipo de solicitud; las filas con
+    tipo_solicitud vacío son por responsable.
+    """
+    fecha = models.DateField(
+        help_text='Día (hora local) al que corresponden las métricas'
+    )
+    
+    tipo_solicitud = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text='Tipo de solicitud (vacío en las filas por responsable)'
+    )
+    
+    responsable = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Responsable (vacío en las filas por tipo)'
+    )
+    
+    creadas = models.IntegerField(default=0)
+    aprobadas = models.IntegerField(default=0)
+    rechazadas = models.IntegerField(default=0)
+    canceladas = models.IntegerField(default=0)
+    
+    tiempo_cierre_p50 = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Mediana en segundos desde la creación hasta el estado final'
+    )
+    
+    tiempo_cierre_p90 = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Percentil 90 en segundos desde la creación hasta el estado final'
+    )
+    
+    class Meta:
+        verbose_name = 'Resumen Diario'
+        verbose_name_plural = 'Resúmenes Diarios'
+        ordering = ['fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'tipo_solicitud', 'responsable'],
+                name='resumen_diario_clave_unica'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} {self.tipo_solicitud or self.responsable}: {self.creadas} creadas"
+
+
+class MarcaProceso(models.Model):
+    """Última ejecución de un proceso incremental (p. ej. el resumen diario)"""
+    nombre = models.CharField(
+        max_length=50,
+        primary_key=True,
+        help_text='Nombre del proceso'
+    )
+    
+    fecha = models.DateTimeField(
+        help_text='Momento hasta el que ya se procesaron los cambios'
+    )
+    
+    class Meta:
+        verbose_name = 'Marca de Proceso'
+        verbose_name_plural = 'Marcas de Proceso'
     
     def __str__(self):
-        return f"Comentario de {self.usuario} en {self.solicitud.titulo}"
\ No newline at end of file
+        return f"{self.nombre}: {self.fecha}"
@@ -0,0 +1,63 @@
+# routers.py - Lecturas a réplicas y escrituras a la base principal
+#
+# Solo enruta los modelos de esta app; el resto (sesiones, auth, admin) sigue en 'default'.
+# Una lectura va a la principal cuando:
+#   - es parte de una escritura (select_for_update, save, update, delete),
+#   - hay una transacción abierta en 'default' (lo que se lee ahí se usa para escribir),
+#   - la petición está fijada a la principal (ver LecturaPrimariaMiddleware).
+# Las réplicas reciben el esquema por replicación; nunca se migran (allow_migrate).
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_fijado_a_primaria = ContextVar('aprobaciones_fijado_a_primaria', default=False)
+
+
+def replicas():
+    """Alias de réplicas configurados (vacío = todo va a 'default')"""
+    return getattr(settings, 'APROBACIONES_REPLICAS', [])
+
+
+@contextmanager
+def leer_de_primaria():
+    """Dentro del bloque todas las lecturas van a la base principal"""
+    token = _fijado_a_primaria.set(True)
+    try:
+        yield
+    finally:
+        _fijado_a_primaria.reset(token)
+
+
+class ReplicaRouter:
+    app_label = 'aprobaciones'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        disponibles = replicas()
+        if (
+            not disponibles
+            or _fijado_a_primaria.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(disponibles)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas y principal tienen los mismos datos
+        grupo = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in grupo and obj2._state.db in grupo:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
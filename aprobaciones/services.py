@@ -1,9 +1,181 @@
 # services.py - Versión actualizada para PostgreSQL
-from datetime import datetime
-from django.db import transaction
-from django.db.models import Q, Count
-from .models import SolicitudAprobacion, HistorialSolicitud, ComentarioSolicitud
-from .utils import enviar_notificacion_email, crear_mensaje_notificacion
+import csv
+import json
+import uuid
+import random
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from asgiref.sync import sync_to_async
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, connections, router, transaction
+from django.db.models import (
+    Q, F, Count, Max, Sum, Prefetch, OuterRef, Subquery, Value, DateField, prefetch_related_objects
+)
+from django.db.models.functions import Coalesce, Left, TruncDate, TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+from . import busqueda, eventos, metricas
+from .forms import SolicitudAprobacionForm
+from .constants import ESTADOS_FINALES
+from .models import (
+    SolicitudAprobacion, HistorialSolicitud, ComentarioSolicitud, ContadorSolicitudes,
+    NotificacionEmail, SolicitudArchivada, ResumenDiario, MarcaProceso
+)
+from .utils import (
+    crear_mensaje_notificacion, obtener_estados_origen, validar_cambio_estado,
+    codificar_cursor, decodificar_cursor, BufferLinea, validar_usuario_red,
+    obtener_color_estado, formatear_tipo_solicitud, formatear_fecha_local, percentil
+)
+
+# Caracteres de la descripción que se leen para los listados
+LONGITUD_DESCRIPCION_CORTA = 60
+
+# Particiones por clave de ContadorSolicitudes
+CONTADOR_SHARDS = getattr(settings, 'APROBACIONES_CONTADOR_SHARDS', 8)
+
+# Reintentos de la bandeja de salida de notificaciones
+NOTIFICACION_MAX_INTENTOS = getattr(settings, 'APROBACIONES_NOTIFICACION_MAX_INTENTOS', 5)
+NOTIFICACION_RETRASO_BASE = getattr(settings, 'APROBACIONES_NOTIFICACION_RETRASO_BASE', 60)
+
+# Días desde el cierre tras los cuales una solicitud final se archiva
+ARCHIVO_DIAS = getattr(settings, 'APROBACIONES_ARCHIVO_DIAS', 365)
+
+# Margen hacia atrás al buscar cambios para el resumen diario, para no perder
+# entradas de historial de transacciones que confirmaron después de la última ejecución
+RESUMEN_MARGEN = timedelta(minutes=getattr(settings, 'APROBACIONES_RESUMEN_MARGEN_MINUTOS', 10))
+AGRUPACIONES_RESUMEN = ('tipo', 'responsable')
+
+# Series de tiempo: los periodos ya cerrados se guardan en caché y solo se recalcula el actual
+INTERVALOS_SERIE = {'dia': TruncDay, 'semana': TruncWeek, 'mes': TruncMonth}
+SERIE_CACHE = getattr(settings, 'APROBACIONES_SERIE_CACHE', 'default')
+SERIE_CACHE_TIMEOUT = getattr(settings, 'APROBACIONES_SERIE_CACHE_TIMEOUT', 60 * 60 * 24)
+# Periodos por consulta (dos años de días)
+SERIE_MAX_PERIODOS = getattr(settings, 'APROBACIONES_SERIE_MAX_PERIODOS', 731)
+
+# API de lectura: campos que el cliente puede pedir con ?fields= y relaciones con ?include=
+CAMPOS_API = (
+    'id', 'titulo', 'descripcion', 'solicitante', 'responsable', 'tipo_solicitud', 'estado',
+    'fecha_creacion', 'fecha_actualizacion', 'num_comentarios', 'num_eventos',
+    'ultima_accion', 'ultimo_usuario', 'fecha_ultima_accion',
+)
+CAMPOS_API_LISTADO = (
+    'id', 'titulo', 'solicitante', 'responsable', 'tipo_solicitud', 'estado',
+    'fecha_creacion', 'fecha_actualizacion',
+)
+RELACIONES_API = {
+    'historial': (HistorialSolicitud, ('accion', 'usuario', 'fecha', 'comentario', 'estado_anterior')),
+    'comentarios': (ComentarioSolicitud, ('usuario', 'comentario', 'fecha', 'tipo')),
+}
+
+# Feed de cambios: no se entregan cambios más recientes que este margen, para que una
+# transacción que confirme tarde con una fecha anterior no quede detrás del cursor
+FEED_MARGEN = timedelta(seconds=getattr(settings, 'APROBACIONES_FEED_MARGEN_SEGUNDOS', 5))
+
+# Formatos y columnas de exportación/importación
+FORMATOS_EXPORTACION = ('csv', 'jsonl')
+COLUMNAS_EXPORTACION_CSV = [
+    'id', 'titulo', 'descripcion', 'solicitante', 'responsable', 'tipo_solicitud',
+    'estado', 'fecha_creacion', 'fecha_actualizacion', 'historial', 'comentarios',
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ResumenSolicitud:
+    """
+    Proyección liviana de una solicitud para listados y dashboard.
+    No incluye historial, comentarios ni la descripción completa; la actividad
+    sale de las columnas desnormalizadas de SolicitudAprobacion.
+    """
+    id: str
+    titulo: str
+    descripcion_corta: str
+    solicitante: str
+    responsable: str
+    tipo_solicitud: str
+    estado: str
+    fecha_creacion: datetime
+    num_comentarios: int
+    ultima_accion: str
+    ultimo_usuario: str
+    fecha_ultima_accion: datetime
+    
+    @property
+    def color_estado(self):
+        return obtener_color_estado(self.estado)
+    
+    @property
+    def tipo_formateado(self):
+        return formatear_tipo_solicitud(self.tipo_solicitud)
+    
+    @property
+    def fecha_formateada(self):
+        return formatear_fecha_local(timezone.localtime(self.fecha_creacion))
+
+
+def inicio_dia_local(dia):
+    """Inicio (aware) de un día en la zona horaria actual"""
+    return datetime.combine(dia, datetime.min.time(), tzinfo=timezone.get_current_timezone())
+
+
+def inicio_periodo(dia, intervalo):
+    """Primer día del periodo (día, semana ISO o mes) que contiene `dia`"""
+    if intervalo == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if intervalo == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+
+def siguiente_periodo(inicio, intervalo):
+    """Primer día del periodo que sigue al que empieza en `inicio`"""
+    if intervalo == 'semana':
+        return inicio + timedelta(days=7)
+    if intervalo == 'mes':
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+
+def _clave_serie(intervalo, inicio):
+    return f'aprobaciones:serie:{intervalo}:{inicio.isoformat()}'
+
+
+def _cache_series():
+    """
+    Caché de los periodos cerrados, o None si no sirve para eso. El desglose por
+    estado cambia con cada transición y la invalidación solo llega a la caché en la
+    que se hace: con una caché local (LocMemCache) los demás workers seguirían
+    sirviendo el periodo viejo. Solo se usa si es compartida (Redis, base de datos,
+    memcached) o si APROBACIONES_SERIE_CACHE_LOCAL indica un único proceso.
+    """
+    backend = caches[SERIE_CACHE]
+    if isinstance(backend, DummyCache):
+        return None
+    if isinstance(backend, LocMemCache) and not getattr(
+        settings, 'APROBACIONES_SERIE_CACHE_LOCAL', settings.DEBUG
+    ):
+        return None
+    return backend
+
+
+def prefetch_relaciones_ordenadas():
+    """
+    Prefetch de historial y comentarios ya ordenados por fecha, para que
+    historial_ordenado/comentarios_ordenados lean de la caché en vez de
+    lanzar una consulta por solicitud
+    """
+    return (
+        Prefetch('historial', queryset=HistorialSolicitud.objects.order_by('fecha')),
+        Prefetch('comentarios', queryset=ComentarioSolicitud.objects.order_by('fecha')),
+    )
+
 
 class SolicitudStorageService:
     """
@@ -13,6 +185,8 @@ class SolicitudStorageService:
     def crear_solicitud(self, form_data):
         """Crear una nueva solicitud en la base de datos"""
         with transaction.atomic():
+            ahora = timezone.now()
+            
             # Crear la solicitud
             nueva_solicitud = SolicitudAprobacion.objects.create(
                 titulo=form_data['titulo'],
@@ -20,46 +194,269 @@ class SolicitudStorageService:
                 solicitante=form_data['solicitante'],
                 responsable=form_data['responsable'],
                 tipo_solicitud=form_data['tipo_solicitud'],
-                estado='pendiente'
+                estado='pendiente',
+                fecha_creacion=ahora,
+                num_eventos=1,
+                ultima_accion='creada',
+                ultimo_usuario=form_data['solicitante'],
+                fecha_ultima_accion=ahora
             )
             
-            # Crear entrada en el historial
+            # Crear entrada en el historial (con la fecha de la escritura, ver obtener_cambios)
             HistorialSolicitud.objects.create(
                 solicitud=nueva_solicitud,
                 accion='creada',
                 usuario=form_data['solicitante'],
+                fecha=nueva_solicitud.fecha_actualizacion,
                 comentario='Solicitud creada'
             )
             
-            # Enviar notificación al responsable
-            self._enviar_notificacion_nueva_solicitud(nueva_solicitud)
+            self._ajustar_contadores(Counter({
+                ('pendiente', nueva_solicitud.tipo_solicitud, nueva_solicitud.responsable): 1
+            }))
+            busqueda.actualizar_indice([nueva_solicitud.id])
+            
+            # Encolar notificación al responsable (se envía fuera de la transacción)
+            self._encolar_notificacion_nueva_solicitud(nueva_solicitud)
+            self._publicar_eventos([
+                self._evento_solicitud('creada', nueva_solicitud, usuario=nueva_solicitud.solicitante)
+            ])
             
             return self._solicitud_to_dict(nueva_solicitud)
     
+    def importar_solicitudes(self, lineas, formato='csv', tamano_bloque=500):
+        """
+        Importar solicitudes en bloque desde un iterable de líneas de texto (CSV o JSON Lines).
+        
+        Cada fila se valida con SolicitudAprobacionForm y validar_usuario_red. Las filas
+        válidas se insertan por bloques con bulk_create (solicitudes y su entrada 'creada'
+        del historial), con una notificación por responsable en cada bloque. Las filas
+        inválidas se reportan sin abortar el resto.
+        Retorna {'creadas': n, 'errores': [{'fila': n, 'errores': {campo: [mensajes]}}]}.
+        """
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValueError(f"Formato '{formato}' no soportado")
+        
+        creadas = 0
+        errores = []
+        bloque = []
+        for numero, datos in enumerate(self._leer_filas_importacion(lineas, formato), start=1):
+            if not isinstance(datos, dict):
+                errores.append({'fila': numero, 'errores': {'__all__': [str(datos)]}})
+                continue
+            
+            form = SolicitudAprobacionForm(data=datos)
+            errores_fila = {}
+            if not form.is_valid():
+                errores_fila = {
+                    campo: [error['message'] for error in lista]
+                    for campo, lista in form.errors.get_json_data().items()
+                }
+            for campo in ('solicitante', 'responsable'):
+                valido, mensaje = validar_usuario_red(datos.get(campo))
+                if not valido:
+                    errores_fila.setdefault(campo, []).append(mensaje)
+            
+            if errores_fila:
+                errores.append({'fila': numero, 'errores': errores_fila})
+                continue
+            
+            bloque.append(form.cleaned_data)
+            if len(bloque) >= tamano_bloque:
+                creadas += self._insertar_bloque_importacion(bloque)
+                bloque = []
+        
+        if bloque:
+            creadas += self._insertar_bloque_importacion(bloque)
+        
+        return {'creadas': creadas, 'errores': errores}
+    
     def obtener_todas_solicitudes(self):
-        """Obtener todas las solicitudes con sus relaciones"""
-        solicitudes = SolicitudAprobacion.objects.prefetch_related(
-            'historial', 'comentarios'
-        ).all()
+        """Obtener el resumen de todas las solicitudes"""
+        return self._solicitudes_to_resumen(SolicitudAprobacion.objects.all())
+    
+    def obtener_solicitudes_recientes(self, limite=10):
+        """
+        Obtener el resumen de las solicitudes más recientes.
+        El orden y el límite se resuelven en SQL sobre el índice de fecha_creacion.
+        """
+        solicitudes = SolicitudAprobacion.objects.order_by('-fecha_creacion', '-id')[:limite]
         
-        return [self._solicitud_to_dict(solicitud) for solicitud in solicitudes]
+        return self._solicitudes_to_resumen(solicitudes)
     
     def obtener_solicitud_por_id(self, solicitud_id):
-        """Obtener una solicitud específica por ID"""
+        """Obtener una solicitud específica por ID (activa o archivada)"""
         try:
             solicitud = SolicitudAprobacion.objects.prefetch_related(
-                'historial', 'comentarios'
+                *prefetch_relaciones_ordenadas()
             ).get(id=solicitud_id)
             
             return self._solicitud_to_dict(solicitud)
         except SolicitudAprobacion.DoesNotExist:
+            pass
+        except ValidationError:
+            return None
+        
+        datos = SolicitudArchivada.objects.filter(id=solicitud_id).values_list(
+            'datos', flat=True
+        ).first()
+        if datos is None:
+            return None
+        
+        datos['archivada'] = True
+        return datos
+    
+    def listar_solicitudes_api(self, campos=None, incluir=(), cursor=None, tamano_pagina=50, **filtros):
+        """
+        Página de solicitudes para la API leyendo solo las columnas pedidas.
+        Cada relación incluida cuesta una consulta adicional para toda la página.
+        Retorna {'resultados': [dict], 'siguiente_cursor': str|None}.
+        """
+        campos = self._validar_campos_api(campos or CAMPOS_API_LISTADO, incluir)
+        consulta = self._consulta_listado_api(campos, cursor, tamano_pagina, **filtros)
+        
+        filas, siguiente_cursor = self._pagina_api(list(consulta), tamano_pagina)
+        return {
+            'resultados': self._filas_api(filas, campos, incluir),
+            'siguiente_cursor': siguiente_cursor,
+        }
+    
+    def obtener_solicitud_api(self, solicitud_id, campos=None, incluir=()):
+        """Una solicitud para la API (activa o archivada) con los campos pedidos. None si no existe"""
+        campos = self._validar_campos_api(campos or CAMPOS_API, incluir)
+        
+        try:
+            fila = SolicitudAprobacion.objects.filter(id=solicitud_id).values(
+                *dict.fromkeys(('id', *campos))
+            ).first()
+        except ValidationError:
             return None
+        
+        if fila:
+            return self._filas_api([fila], campos, incluir)[0]
+        
+        datos = SolicitudArchivada.objects.filter(id=solicitud_id).values_list('datos', flat=True).first()
+        return self._archivada_api(datos, campos, incluir)
+    
+    def obtener_cambios(self, cursor=None, limite=100):
+        """
+        Feed incremental: solicitudes modificadas después del cursor, en orden de
+        (fecha_actualizacion, id), con las entradas de historial nuevas de cada una.
+        
+        Toda escritura del servicio (incluido el historial) avanza fecha_actualizacion,
+        así que basta con recorrer su índice. Cada entrada de historial lleva como fecha
+        la fecha_actualizacion que dejó su escritura, de modo que su posición en el feed
+        es (fecha, solicitud_id): se entregan las posteriores al cursor, también cuando
+        un cambio masivo deja muchas filas con la misma fecha y la página corta en
+        medio. El siguiente cursor nunca retrocede: si
+        no hay cambios se devuelve el mismo. Las solicitudes archivadas no se
+        informan como borradas; siguen disponibles en la API de detalle.
+        Se lee de la base principal: el retraso de una réplica podría saltarse cambios.
+        Retorna {'cambios': [dict], 'siguiente_cursor': str|None, 'hay_mas': bool}.
+        """
+        # Con limite < 1 no habría cursor para avanzar y hay_mas quedaría en True
+        limite = max(1, limite)
+        principal = router.db_for_write(SolicitudAprobacion)
+        queryset = SolicitudAprobacion.objects.using(principal).filter(
+            fecha_actualizacion__lt=timezone.now() - FEED_MARGEN
+        )
+        posicion = decodificar_cursor(cursor)
+        if posicion:
+            desde, solicitud_id, _ = posicion
+            queryset = queryset.filter(
+                Q(fecha_actualizacion__gt=desde) | Q(fecha_actualizacion=desde, id__gt=solicitud_id)
+            )
+        
+        filas = list(
+            queryset.order_by('fecha_actualizacion', 'id').values(*CAMPOS_API)[:limite + 1]
+        )
+        hay_mas = len(filas) > limite
+        filas = filas[:limite]
+        
+        historial = {}
+        entradas = HistorialSolicitud.objects.using(principal).filter(
+            solicitud_id__in=[fila['id'] for fila in filas]
+        )
+        if posicion:
+            entradas = entradas.filter(
+                Q(fecha__gt=desde) | Q(fecha=desde, solicitud_id__gt=solicitud_id)
+            )
+        for entrada in entradas.order_by('solicitud_id', 'fecha', 'id').values(
+            'solicitud_id', *RELACIONES_API['historial'][1]
+        ):
+            historial.setdefault(entrada.pop('solicitud_id'), []).append(entrada)
+        for fila in filas:
+            fila['historial'] = historial.get(fila['id'], [])
+        
+        if filas:
+            cursor = codificar_cursor(filas[-1]['fecha_actualizacion'], filas[-1]['id'])
+        
+        return {
+            'cambios': filas,
+            'siguiente_cursor': cursor,
+            'hay_mas': hay_mas,
+        }
+    
+    def obtener_version_solicitud(self, solicitud_id):
+        """
+        Última modificación de una solicitud (datos, historial o comentarios) con una
+        sola consulta sobre la fila, sin cargar relaciones. None si no existe.
+        """
+        try:
+            fechas = SolicitudAprobacion.objects.filter(id=solicitud_id).values_list(
+                'fecha_actualizacion', 'fecha_ultima_accion'
+            ).first()
+            if fechas:
+                return max(fecha for fecha in fechas if fecha)
+            
+            return SolicitudArchivada.objects.filter(id=solicitud_id).values_list(
+                'fecha_archivo', flat=True
+            ).first()
+        except ValidationError:
+            return None
+    
+    def obtener_version_solicitudes(self):
+        """
+        Sello de versión del conjunto de solicitudes activas: (última actualización,
+        cantidad). La fecha avanza con cada escritura del servicio y la cantidad cambia
+        al borrar o archivar, que no tocan fecha_actualizacion. Una sola consulta de
+        agregación, en la misma base que las páginas que valida (réplica si hay router).
+        """
+        agregados = SolicitudAprobacion.objects.aggregate(
+            ultima=Max('fecha_actualizacion'), cantidad=Count('id')
+        )
+        return agregados['ultima'], agregados['cantidad']
+    
+    async def aobtener_version_solicitud(self, solicitud_id):
+        """Versión async de obtener_version_solicitud"""
+        try:
+            fechas = await SolicitudAprobacion.objects.filter(id=solicitud_id).values_list(
+                'fecha_actualizacion', 'fecha_ultima_accion'
+            ).afirst()
+            if fechas:
+                return max(fecha for fecha in fechas if fecha)
+            
+            return await SolicitudArchivada.objects.filter(id=solicitud_id).values_list(
+                'fecha_archivo', flat=True
+            ).afirst()
+        except ValidationError:
+            return None
+    
+    async def aobtener_version_solicitudes(self):
+        """Versión async de obtener_version_solicitudes"""
+        agregados = await SolicitudAprobacion.objects.aaggregate(
+            ultima=Max('fecha_actualizacion'), cantidad=Count('id')
+        )
+        return agregados['ultima'], agregados['cantidad']
     
     def actualizar_solicitud(self, solicitud_id, nuevos_datos):
         """Actualizar una solicitud existente"""
         try:
             with transaction.atomic():
-                solicitud = SolicitudAprobacion.objects.get(id=solicitud_id)
+                solicitud = SolicitudAprobacion.objects.select_for_update().get(id=solicitud_id)
+                tipo_anterior = solicitud.tipo_solicitud
+                usuario = nuevos_datos.get('usuario_actualizacion', solicitud.solicitante)
+                ahora = timezone.now()
                 
                 # Actualizar campos permitidos
                 campos_actualizables = ['titulo', 'descripcion', 'tipo_solicitud']
@@ -67,15 +464,30 @@ class SolicitudStorageService:
                     if campo in nuevos_datos:
                         setattr(solicitud, campo, nuevos_datos[campo])
                 
+                # Actividad desnormalizada (la fila está bloqueada)
+                solicitud.num_eventos += 1
+                solicitud.ultima_accion = 'actualizada'
+                solicitud.ultimo_usuario = usuario
+                solicitud.fecha_ultima_accion = ahora
+                
                 solicitud.save()
                 
+                if solicitud.tipo_solicitud != tipo_anterior:
+                    self._ajustar_contadores(Counter({
+                        (solicitud.estado, tipo_anterior, solicitud.responsable): -1,
+                        (solicitud.estado, solicitud.tipo_solicitud, solicitud.responsable): 1,
+                    }))
+                    self._invalidar_series([solicitud.fecha_creacion])
+                
                 # Agregar entrada al historial
                 HistorialSolicitud.objects.create(
                     solicitud=solicitud,
                     accion='actualizada',
-                    usuario=nuevos_datos.get('usuario_actualizacion', solicitud.solicitante),
+                    usuario=usuario,
+                    fecha=solicitud.fecha_actualizacion,
                     comentario='Solicitud actualizada'
                 )
+                busqueda.actualizar_indice([solicitud.id])
                 
                 return self._solicitud_to_dict(solicitud)
         except SolicitudAprobacion.DoesNotExist:
@@ -90,69 +502,1047 @@ class SolicitudStorageService:
         return self._cambiar_estado_solicitud(solicitud_id, 'rechazado', aprobador, comentario)
     
     def _cambiar_estado_solicitud(self, solicitud_id, nuevo_estado, usuario, comentario=''):
-        """Cambiar el estado de una solicitud"""
-        try:
-            with transaction.atomic():
-                solicitud = SolicitudAprobacion.objects.get(id=solicitud_id)
-                estado_anterior = solicitud.estado
-                
-                # Actualizar estado
-                solicitud.estado = nuevo_estado
-                solicitud.save()
-                
-                # Agregar entrada al historial
-                HistorialSolicitud.objects.create(
+        """
+        Cambiar el estado de una solicitud.
+        
+        El cambio se aplica sin leer antes la fila: un UPDATE condicionado a que el
+        estado actual permita la transición (según validar_cambio_estado) que devuelve
+        la fila con RETURNING (ver _actualizar_estado). Solo si no cambia ninguna fila
+        se vuelve a leer el estado para explicar el motivo.
+        Lanza ValueError si la transición no es válida.
+        """
+        with transaction.atomic():
+            ahora = timezone.now()
+            resultado = self._actualizar_estado(
+                solicitud_id, nuevo_estado, usuario, ahora, 1 if comentario else 0
+            )
+            if resultado is None:
+                estado_actual = SolicitudAprobacion.objects.using(
+                    router.db_for_write(SolicitudAprobacion)
+                ).filter(id=solicitud_id).values_list('estado', flat=True).first()
+                if estado_actual is None:
+                    return None
+                valido, mensaje = validar_cambio_estado(estado_actual, nuevo_estado)
+                if not valido:
+                    raise ValueError(mensaje)
+                raise ValueError("La solicitud fue modificada por otro usuario, intenta de nuevo")
+            solicitud, estado_anterior = resultado
+            
+            self._ajustar_contadores(Counter({
+                (estado_anterior, solicitud.tipo_solicitud, solicitud.responsable): -1,
+                (nuevo_estado, solicitud.tipo_solicitud, solicitud.responsable): 1,
+            }))
+            self._invalidar_series([solicitud.fecha_creacion])
+            
+            # Agregar entrada al historial
+            HistorialSolicitud.objects.create(
+                solicitud=solicitud,
+                accion=nuevo_estado,
+                usuario=usuario,
+                fecha=ahora,
+                comentario=comentario or f'Solicitud {nuevo_estado}',
+                estado_anterior=estado_anterior
+            )
+            
+            # Agregar comentario si existe
+            if comentario:
+                ComentarioSolicitud.objects.create(
                     solicitud=solicitud,
-                    accion=nuevo_estado,
                     usuario=usuario,
-                    comentario=comentario or f'Solicitud {nuevo_estado}',
-                    estado_anterior=estado_anterior
+                    comentario=comentario,
+                    fecha=ahora,
+                    tipo=nuevo_estado
                 )
-                
-                # Agregar comentario si existe
-                if comentario:
-                    ComentarioSolicitud.objects.create(
-                        solicitud=solicitud,
+                busqueda.actualizar_indice([solicitud.id])
+            
+            # Encolar notificación al solicitante (se envía fuera de la transacción)
+            self._encolar_notificacion_cambio_estado(solicitud, nuevo_estado)
+            self._publicar_eventos([self._evento_solicitud(
+                'cambio_estado', solicitud, usuario=usuario, estado_anterior=estado_anterior
+            )])
+            
+            return self._solicitud_to_dict(solicitud)
+    
+    def _actualizar_estado(self, solicitud_id, nuevo_estado, usuario, ahora, comentarios):
+        """
+        UPDATE condicional de estado y actividad con RETURNING de la fila.
+        Retorna (solicitud, estado_anterior) o None si ninguna fila cambió (no existe
+        o su estado no permite la transición).
+        
+        PostgreSQL: una sola sentencia; la subconsulta FOR UPDATE entrega el estado
+        anterior ya bloqueado, así que es el mismo que evalúa el WHERE.
+        Otros motores (SQLite en desarrollo): un UPDATE ... RETURNING por estado de
+        origen, en orden, hasta que uno aplique; el que aplica es el estado anterior.
+        """
+        origenes = obtener_estados_origen(nuevo_estado)
+        if not origenes:
+            return None
+        
+        alias = router.db_for_write(SolicitudAprobacion)
+        conexion = connections[alias]
+        opciones = SolicitudAprobacion._meta
+        tabla = conexion.ops.quote_name(opciones.db_table)
+        columnas = [conexion.ops.quote_name(campo.column) for campo in opciones.concrete_fields]
+        solicitud_id = opciones.pk.get_db_prep_value(solicitud_id, conexion)
+        fecha = conexion.ops.adapt_datetimefield_value(ahora)
+        asignaciones = """
+            estado = %s, fecha_actualizacion = %s, num_eventos = num_eventos + 1,
+            num_comentarios = num_comentarios + %s, ultima_accion = %s,
+            ultimo_usuario = %s, fecha_ultima_accion = %s
+        """
+        valores = [nuevo_estado, fecha, comentarios, nuevo_estado, usuario, fecha]
+        
+        if conexion.vendor == 'postgresql':
+            marcadores = ', '.join(['%s'] * len(origenes))
+            filas = list(SolicitudAprobacion.objects.raw(
+                f"""
+                UPDATE {tabla} s SET {asignaciones}
+                FROM (SELECT id, estado FROM {tabla} WHERE id = %s FOR UPDATE) anterior
+                WHERE s.id = anterior.id AND s.estado IN ({marcadores})
+                RETURNING {', '.join(f's.{columna}' for columna in columnas)},
+                    anterior.estado AS estado_anterior
+                """,
+                valores + [solicitud_id, *origenes], using=alias
+            ))
+            return (filas[0], filas[0].estado_anterior) if filas else None
+        
+        for origen in origenes:
+            filas = list(SolicitudAprobacion.objects.raw(
+                f"""
+                UPDATE {tabla} SET {asignaciones}
+                WHERE id = %s AND estado = %s
+                RETURNING {', '.join(columnas)}
+                """,
+                valores + [solicitud_id, origen], using=alias
+            ))
+            if filas:
+                return filas[0], origen
+        return None
+    
+    def cambiar_estado_masivo(self, ids, estado, usuario, comentario=''):
+        """
+        Cambiar el estado de varias solicitudes con un número fijo de consultas.
+        
+        Las transiciones se validan con validar_cambio_estado: solo se actualizan las
+        solicitudes cuyo estado actual permite pasar a `estado`. Se aplica un único
+        UPDATE condicional, el historial y los comentarios se insertan con bulk_create
+        y se encola una notificación por solicitante afectado.
+        Retorna {'actualizadas': [ids], 'rechazadas': {id: motivo}}.
+        """
+        rechazadas = {}
+        ids_validos = []
+        for solicitud_id in dict.fromkeys(str(i) for i in ids):
+            try:
+                ids_validos.append(uuid.UUID(solicitud_id))
+            except ValueError:
+                rechazadas[solicitud_id] = 'ID inválido'
+        
+        origenes = obtener_estados_origen(estado)
+        if not origenes:
+            for solicitud_id in ids_validos:
+                rechazadas[str(solicitud_id)] = f"Estado '{estado}' no es válido"
+            return {'actualizadas': [], 'rechazadas': rechazadas}
+        
+        with transaction.atomic():
+            filas = list(
+                SolicitudAprobacion.objects.select_for_update().filter(
+                    id__in=ids_validos
+                ).order_by().values_list(
+                    'id', 'estado', 'titulo', 'solicitante', 'responsable', 'tipo_solicitud',
+                    'fecha_creacion'
+                )
+            )
+            encontradas = {fila[0] for fila in filas}
+            for solicitud_id in ids_validos:
+                if solicitud_id not in encontradas:
+                    rechazadas[str(solicitud_id)] = 'Solicitud no encontrada'
+            
+            aplicables = []
+            for fila in filas:
+                if fila[1] in origenes:
+                    aplicables.append(fila)
+                else:
+                    rechazadas[str(fila[0])] = f"No se puede cambiar de '{fila[1]}' a '{estado}'"
+            
+            if not aplicables:
+                return {'actualizadas': [], 'rechazadas': rechazadas}
+            
+            ahora = timezone.now()
+            SolicitudAprobacion.objects.filter(
+                id__in=[fila[0] for fila in aplicables], estado__in=origenes
+            ).update(
+                estado=estado,
+                fecha_actualizacion=ahora,
+                num_eventos=F('num_eventos') + 1,
+                num_comentarios=F('num_comentarios') + (1 if comentario else 0),
+                ultima_accion=estado,
+                ultimo_usuario=usuario,
+                fecha_ultima_accion=ahora
+            )
+            
+            HistorialSolicitud.objects.bulk_create([
+                HistorialSolicitud(
+                    solicitud_id=fila[0],
+                    accion=estado,
+                    usuario=usuario,
+                    fecha=ahora,
+                    comentario=comentario or f'Solicitud {estado}',
+                    estado_anterior=fila[1]
+                )
+                for fila in aplicables
+            ])
+            
+            if comentario:
+                ComentarioSolicitud.objects.bulk_create([
+                    ComentarioSolicitud(
+                        solicitud_id=fila[0],
                         usuario=usuario,
                         comentario=comentario,
-                        tipo=nuevo_estado
+                        fecha=ahora,
+                        tipo=estado
                     )
-                
-                # Enviar notificación al solicitante
-                self._enviar_notificacion_cambio_estado(solicitud, nuevo_estado)
-                
-                return self._solicitud_to_dict(solicitud)
-        except SolicitudAprobacion.DoesNotExist:
-            return None
+                    for fila in aplicables
+                ])
+                busqueda.actualizar_indice([fila[0] for fila in aplicables])
+            
+            cambios = Counter()
+            for _, estado_anterior, _, _, responsable, tipo, _ in aplicables:
+                cambios[(estado_anterior, tipo, responsable)] -= 1
+                cambios[(estado, tipo, responsable)] += 1
+            self._ajustar_contadores(cambios)
+            self._invalidar_series([fila[6] for fila in aplicables])
+            
+            self._encolar_notificaciones_cambio_masivo(aplicables, estado)
+            self._publicar_eventos([
+                {
+                    'evento': 'cambio_estado',
+                    'id': str(solicitud_id),
+                    'titulo': titulo,
+                    'solicitante': solicitante,
+                    'responsable': responsable,
+                    'tipo_solicitud': tipo,
+                    'estado': estado,
+                    'estado_anterior': estado_anterior,
+                    'usuario': usuario,
+                    'fecha': ahora.isoformat(),
+                }
+                for solicitud_id, estado_anterior, titulo, solicitante, responsable, tipo, _ in aplicables
+            ])
+        
+        return {
+            'actualizadas': [str(fila[0]) for fila in aplicables],
+            'rechazadas': rechazadas,
+        }
+    
+    def archivar_solicitudes(self, dias=ARCHIVO_DIAS, tamano_bloque=500, max_bloques=None):
+        """
+        Mover las solicitudes en estado final sin cambios hace más de `dias` días a
+        SolicitudArchivada, junto con su historial y comentarios.
+        
+        Cada bloque se procesa en su propia transacción corta (copiar y borrar) para no
+        mantener bloqueos largos. Los contadores de estadísticas no cambian: las
+        archivadas siguen contando. Retorna la cantidad de solicitudes archivadas.
+        """
+        limite = timezone.now() - timedelta(days=dias)
+        total = 0
+        bloques = 0
+        while max_bloques is None or bloques < max_bloques:
+            archivadas = self._archivar_bloque(limite, tamano_bloque)
+            if not archivadas:
+                break
+            total += archivadas
+            bloques += 1
+        
+        return total
+    
+    def reparar_actividad(self, tamano_bloque=1000):
+        """
+        Recalcular las columnas de actividad desnormalizadas desde el historial y los
+        comentarios. Se procesa por bloques de IDs para no mantener bloqueos largos.
+        Retorna la cantidad de solicitudes procesadas.
+        """
+        ids = SolicitudAprobacion.objects.order_by().values_list('id', flat=True)
+        bloque = []
+        total = 0
+        for solicitud_id in ids.iterator(chunk_size=tamano_bloque):
+            bloque.append(solicitud_id)
+            if len(bloque) >= tamano_bloque:
+                total += self._reparar_actividad_bloque(bloque)
+                bloque = []
+        if bloque:
+            total += self._reparar_actividad_bloque(bloque)
+        
+        return total
     
     def obtener_estadisticas(self):
-        """Obtener estadísticas de las solicitudes usando agregación de Django"""
-        estadisticas = SolicitudAprobacion.objects.aggregate(
-            total=Count('id'),
-            pendientes=Count('id', filter=Q(estado='pendiente')),
-            aprobadas=Count('id', filter=Q(estado='aprobado')),
-            rechazadas=Count('id', filter=Q(estado='rechazado')),
-            en_revision=Count('id', filter=Q(estado='en_revision'))
+        """
+        Obtener estadísticas de las solicitudes a partir de ContadorSolicitudes.
+        Solo se leen las filas de totales por estado, sin recorrer las solicitudes.
+        """
+        return self._estadisticas(dict(self._consulta_estadisticas()))
+    
+    def obtener_pendientes_por_responsable(self):
+        """
+        Solicitudes pendientes por responsable, desde ContadorSolicitudes
+        (sumando tipos y shards), sin recorrer las solicitudes
+        """
+        return dict(
+            ContadorSolicitudes.objects.filter(estado='pendiente').exclude(responsable='').values(
+                'responsable'
+            ).annotate(
+                cantidad_total=Sum('cantidad')
+            ).filter(cantidad_total__gt=0).order_by('responsable').values_list('responsable', 'cantidad_total')
         )
+    
+    def reconstruir_contadores(self):
+        """
+        Recalcular ContadorSolicitudes desde cero a partir de las solicitudes.
+        Corrige desviaciones por cambios hechos fuera del servicio (admin, SQL manual).
+        """
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Bloquear escrituras concurrentes mientras se recalcula
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'LOCK TABLE {SolicitudAprobacion._meta.db_table} IN SHARE MODE'
+                    )
+            
+            # Las solicitudes archivadas siguen contando en las estadísticas
+            agrupado = Counter()
+            for modelo in (SolicitudAprobacion, SolicitudArchivada):
+                for fila in modelo.objects.order_by().values(
+                    'estado', 'tipo_solicitud', 'responsable'
+                ).annotate(cantidad=Count('id')):
+                    agrupado[(fila['estado'], fila['tipo_solicitud'], fila['responsable'])] += fila['cantidad']
+            
+            totales = Counter()
+            contadores = []
+            for (estado, tipo, responsable), cantidad in agrupado.items():
+                contadores.append(ContadorSolicitudes(
+                    estado=estado, tipo_solicitud=tipo, responsable=responsable, cantidad=cantidad
+                ))
+                totales[estado] += cantidad
+            contadores.extend(
+                ContadorSolicitudes(estado=estado, cantidad=cantidad)
+                for estado, cantidad in totales.items()
+            )
+            
+            ContadorSolicitudes.objects.all().delete()
+            ContadorSolicitudes.objects.bulk_create(contadores, batch_size=1000)
+            
+            return len(contadores)
+    
+    def actualizar_resumen_diario(self, completo=False):
+        """
+        Recalcular ResumenDiario solo para los días con entradas de historial nuevas
+        desde la última ejecución (o todos los días si `completo`).
+        
+        Cada acción se cuenta el día en que ocurrió: las creadas el día de la
+        creación y las aprobadas/rechazadas/canceladas el día del cierre. Como el
+        historial siempre se registra con la hora actual, los días ya cerrados no
+        vuelven a cambiar. Archivar borra el historial, así que los días hasta el cierre
+        archivado más reciente que ya tienen filas se conservan (también con `completo`):
+        recalcularlos desde el historial restante bajaría sus conteos.
+        Retorna la cantidad de días recalculados.
+        """
+        inicio = timezone.now()
+        historial = HistorialSolicitud.objects.all()
+        
+        marca = MarcaProceso.objects.filter(nombre='resumen_diario').first()
+        if marca and not completo:
+            historial = historial.filter(fecha__gte=marca.fecha - RESUMEN_MARGEN)
         
-        return estadisticas
+        dias = sorted(set(
+            historial.annotate(dia=TruncDate('fecha')).order_by().values_list('dia', flat=True).distinct()
+        ))
+        
+        archivado_hasta = SolicitudArchivada.objects.aggregate(hasta=Max('fecha_cierre'))['hasta']
+        if archivado_hasta:
+            # Todo evento de una archivada ocurrió a más tardar en su fecha de cierre
+            ultimo_dia_archivado = timezone.localdate(archivado_hasta)
+            con_filas = set(
+                ResumenDiario.objects.filter(fecha__lte=ultimo_dia_archivado).order_by().values_list(
+                    'fecha', flat=True
+                ).distinct()
+            )
+            dias = [dia for dia in dias if dia > ultimo_dia_archivado or dia not in con_filas]
+        for dia in dias:
+            self._calcular_resumen_dia(dia)
+        
+        MarcaProceso.objects.update_or_create(nombre='resumen_diario', defaults={'fecha': inicio})
+        return len(dias)
+    
+    def obtener_resumen_diario(self, agrupar='tipo', desde=None, hasta=None):
+        """
+        Leer el resumen diario por tipo o por responsable entre dos fechas (inclusive).
+        Solo consulta ResumenDiario, nunca el historial.
+        """
+        if agrupar not in AGRUPACIONES_RESUMEN:
+            raise ValueError(f"Agrupación '{agrupar}' no válida")
+        
+        hasta = hasta or timezone.localdate()
+        desde = desde or hasta - timedelta(days=30)
+        
+        resumen = ResumenDiario.objects.filter(fecha__range=(desde, hasta))
+        if agrupar == 'tipo':
+            resumen = resumen.filter(responsable='')
+            campo = 'tipo_solicitud'
+        else:
+            resumen = resumen.filter(tipo_solicitud='')
+            campo = 'responsable'
+        
+        return [
+            {
+                'fecha': fila['fecha'].isoformat(),
+                agrupar: fila[campo],
+                'creadas': fila['creadas'],
+                'aprobadas': fila['aprobadas'],
+                'rechazadas': fila['rechazadas'],
+                'canceladas': fila['canceladas'],
+                'tiempo_cierre_p50': fila['tiempo_cierre_p50'],
+                'tiempo_cierre_p90': fila['tiempo_cierre_p90'],
+            }
+            for fila in resumen.order_by('fecha', campo).values(
+                'fecha', campo, 'creadas', 'aprobadas', 'rechazadas', 'canceladas',
+                'tiempo_cierre_p50', 'tiempo_cierre_p90'
+            )
+        ]
+    
+    def obtener_serie_temporal(self, intervalo='dia', desde=None, hasta=None):
+        """
+        Cantidad de solicitudes creadas por periodo (día, semana o mes), desglosada por
+        estado actual y por tipo. Incluye las solicitudes archivadas.
+        
+        Los periodos cerrados se leen de la caché (si es compartida, ver _cache_series);
+        solo los que faltan y el periodo en curso se cuentan en la base de datos,
+        agrupando con Trunc sobre el índice de fecha_creacion en una sola consulta por
+        tabla. Más de SERIE_MAX_PERIODOS periodos es un ValueError.
+        """
+        if intervalo not in INTERVALOS_SERIE:
+            raise ValueError(f"Intervalo '{intervalo}' no válido")
+        
+        hasta = hasta or timezone.localdate()
+        desde = desde or hasta - timedelta(days=365)
+        if desde > hasta:
+            raise ValueError("La fecha inicial es posterior a la final")
+        
+        periodos = []
+        inicio = inicio_periodo(desde, intervalo)
+        while inicio <= hasta:
+            if len(periodos) == SERIE_MAX_PERIODOS:
+                raise ValueError(f"El rango supera {SERIE_MAX_PERIODOS} periodos")
+            periodos.append(inicio)
+            try:
+                inicio = siguiente_periodo(inicio, intervalo)
+            except OverflowError:
+                raise ValueError("La fecha final está fuera del rango soportado")
+        
+        periodo_actual = inicio_periodo(timezone.localdate(), intervalo)
+        cerrados = [periodo for periodo in periodos if periodo < periodo_actual]
+        cache_series = _cache_series()
+        en_cache = {}
+        if cache_series is not None:
+            en_cache = cache_series.get_many([_clave_serie(intervalo, periodo) for periodo in cerrados])
+        conteos = {
+            periodo: en_cache[_clave_serie(intervalo, periodo)]
+            for periodo in cerrados if _clave_serie(intervalo, periodo) in en_cache
+        }
+        
+        faltantes = [periodo for periodo in periodos if periodo not in conteos]
+        if faltantes:
+            calculados = self._contar_periodos(
+                intervalo, faltantes[0], siguiente_periodo(faltantes[-1], intervalo)
+            )
+            for periodo in faltantes:
+                conteos[periodo] = calculados.get(periodo, [])
+            if cache_series is not None:
+                cache_series.set_many({
+                    _clave_serie(intervalo, periodo): conteos[periodo]
+                    for periodo in faltantes if periodo < periodo_actual
+                }, SERIE_CACHE_TIMEOUT)
+        
+        serie = []
+        for periodo in periodos:
+            por_estado = Counter()
+            por_tipo = Counter()
+            for estado, tipo, cantidad in conteos[periodo]:
+                por_estado[estado] += cantidad
+                por_tipo[tipo] += cantidad
+            serie.append({
+                'inicio': periodo.isoformat(),
+                'total': sum(por_estado.values()),
+                'por_estado': dict(por_estado),
+                'por_tipo': dict(por_tipo),
+            })
+        
+        return serie
     
     def obtener_solicitudes_por_usuario(self, usuario, tipo='solicitante'):
         """Obtener solicitudes de un usuario específico"""
         if tipo == 'solicitante':
-            solicitudes = SolicitudAprobacion.objects.filter(
-                solicitante=usuario
-            ).prefetch_related('historial', 'comentarios')
+            solicitudes = SolicitudAprobacion.objects.filter(solicitante=usuario)
         else:
-            solicitudes = SolicitudAprobacion.objects.filter(
-                responsable=usuario
-            ).prefetch_related('historial', 'comentarios')
+            solicitudes = SolicitudAprobacion.objects.filter(responsable=usuario)
         
-        return [self._solicitud_to_dict(solicitud) for solicitud in solicitudes]
+        return self._solicitudes_to_resumen(solicitudes)
     
     def filtrar_solicitudes(self, estado=None, tipo=None, solicitante=None, responsable=None):
         """Filtrar solicitudes con múltiples criterios"""
-        queryset = SolicitudAprobacion.objects.prefetch_related('historial', 'comentarios')
+        queryset = self._queryset_filtrado(estado, tipo, solicitante, responsable)
+        
+        return self._solicitudes_to_resumen(queryset)
+    
+    def exportar_solicitudes(self, formato='csv', estado=None, tipo=None, solicitante=None,
+                             responsable=None, tamano_bloque=2000):
+        """
+        Generar la exportación de solicitudes con historial y comentarios, línea a línea.
+        
+        Recorre la tabla con QuerySet.iterator(chunk_size) (cursores del lado del
+        servidor en PostgreSQL) y prefetch por bloque, así que la memoria usada no
+        depende de la cantidad de filas. Los filtros son los de filtrar_solicitudes.
+        formato: 'csv' o 'jsonl'
+        """
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValueError(f"Formato '{formato}' no soportado")
+        
+        queryset = self._queryset_filtrado(
+            estado, tipo, solicitante, responsable
+        ).prefetch_related(*prefetch_relaciones_ordenadas()).order_by('fecha_creacion', 'id')
+        solicitudes = (
+            self._solicitud_to_dict(solicitud)
+            for solicitud in queryset.iterator(chunk_size=tamano_bloque)
+        )
+        
+        if formato == 'jsonl':
+            for datos in solicitudes:
+                yield json.dumps(datos, ensure_ascii=False) + '\n'
+            return
+        
+        escritor = csv.writer(BufferLinea())
+        yield escritor.writerow(COLUMNAS_EXPORTACION_CSV)
+        for datos in solicitudes:
+            yield escritor.writerow([
+                json.dumps(datos[columna], ensure_ascii=False)
+                if columna in ('historial', 'comentarios') else datos[columna]
+                for columna in COLUMNAS_EXPORTACION_CSV
+            ])
+    
+    def buscar_solicitudes(self, texto, limite=20):
+        """
+        Búsqueda de texto completo sobre título, descripción y comentarios.
+        Retorna ResumenSolicitud ordenados por relevancia. Usa el índice tsvector/GIN
+        en PostgreSQL o FTS5 en SQLite; en otros motores recurre a icontains.
+        """
+        if not texto or not texto.strip():
+            return []
+        # Un LIMIT negativo falla en PostgreSQL y en SQLite significa sin límite
+        limite = max(1, limite)
+        
+        # Índice y resúmenes se leen de la misma base (réplica si hay router)
+        alias = router.db_for_read(SolicitudAprobacion)
+        if not busqueda.busqueda_disponible(using=alias):
+            queryset = SolicitudAprobacion.objects.using(alias).filter(
+                Q(titulo__icontains=texto) | Q(descripcion__icontains=texto)
+            )[:limite]
+            return self._solicitudes_to_resumen(queryset)
+        
+        resultados = busqueda.buscar(texto, limite, using=alias)
+        posiciones = {
+            str(SolicitudAprobacion._meta.pk.to_python(solicitud_id)): posicion
+            for posicion, (solicitud_id, _) in enumerate(resultados)
+        }
+        resumenes = self._solicitudes_to_resumen(
+            SolicitudAprobacion.objects.using(alias).filter(id__in=list(posiciones))
+        )
+        
+        return sorted(resumenes, key=lambda resumen: posiciones[resumen.id])
+    
+    def reconstruir_indice_busqueda(self, tamano_bloque=1000):
+        """Recalcular el índice de búsqueda de todas las solicitudes, por bloques"""
+        total = 0
+        ids = SolicitudAprobacion.objects.order_by().values_list('id', flat=True)
+        bloque = []
+        for solicitud_id in ids.iterator(chunk_size=tamano_bloque):
+            bloque.append(solicitud_id)
+            if len(bloque) >= tamano_bloque:
+                busqueda.actualizar_indice(bloque)
+                total += len(bloque)
+                bloque = []
+        if bloque:
+            busqueda.actualizar_indice(bloque)
+            total += len(bloque)
+        
+        return total
+    
+    def obtener_pagina_solicitudes(self, estado=None, tipo=None, cursor=None, tamano_pagina=10):
+        """
+        Obtener una página de solicitudes filtrada y ordenada en la base de datos.
+        
+        Usa paginación por cursor (keyset) sobre (fecha_creacion, id): cada página
+        lee a lo sumo tamano_pagina + 1 filas, sin importar el tamaño de la tabla.
+        Retorna los ResumenSolicitud y los tokens opacos de la página siguiente/anterior.
+        """
+        queryset, posicion, hacia_atras = self._consulta_pagina(estado, tipo, cursor, tamano_pagina)
+        return self._armar_pagina(self._solicitudes_to_resumen(queryset), tamano_pagina, posicion, hacia_atras)
+    
+    def _consulta_pagina(self, estado, tipo, cursor, tamano_pagina):
+        queryset = SolicitudAprobacion.objects.all()
+        
+        if estado:
+            queryset = queryset.filter(estado=estado)
+        if tipo:
+            queryset = queryset.filter(tipo_solicitud=tipo)
+        
+        posicion = decodificar_cursor(cursor)
+        hacia_atras = False
+        if posicion:
+            fecha, solicitud_id, hacia_atras = posicion
+            if hacia_atras:
+                queryset = queryset.filter(
+                    Q(fecha_creacion__gt=fecha) | Q(fecha_creacion=fecha, id__gt=solicitud_id)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=solicitud_id)
+                )
+        
+        orden = ('fecha_creacion', 'id') if hacia_atras else ('-fecha_creacion', '-id')
+        return queryset.order_by(*orden)[:tamano_pagina + 1], posicion, hacia_atras
+    
+    def _armar_pagina(self, solicitudes, tamano_pagina, posicion, hacia_atras):
+        # La fila extra solo indica si hay más resultados en esa dirección
+        hay_mas = len(solicitudes) > tamano_pagina
+        solicitudes = solicitudes[:tamano_pagina]
+        if hacia_atras:
+            solicitudes.reverse()
+            hay_siguiente, hay_anterior = True, hay_mas
+        else:
+            hay_siguiente, hay_anterior = hay_mas, posicion is not None
+        
+        siguiente_cursor = anterior_cursor = None
+        if solicitudes:
+            if hay_siguiente:
+                ultima = solicitudes[-1]
+                siguiente_cursor = codificar_cursor(ultima.fecha_creacion, ultima.id)
+            if hay_anterior:
+                primera = solicitudes[0]
+                anterior_cursor = codificar_cursor(primera.fecha_creacion, primera.id, hacia_atras=True)
+        
+        return {
+            'solicitudes': solicitudes,
+            'siguiente_cursor': siguiente_cursor,
+            'anterior_cursor': anterior_cursor,
+        }
+    
+    # Variantes async para vistas ASGI. Las lecturas usan el ORM async de Django;
+    # las escrituras necesitan transaction.atomic (solo síncrono) y corren en un hilo.
+    
+    async def acrear_solicitud(self, form_data):
+        return await sync_to_async(self.crear_solicitud)(form_data)
+    
+    async def aactualizar_solicitud(self, solicitud_id, nuevos_datos):
+        return await sync_to_async(self.actualizar_solicitud)(solicitud_id, nuevos_datos)
+    
+    async def aaprobar_solicitud(self, solicitud_id, aprobador, comentario=''):
+        return await sync_to_async(self.aprobar_solicitud)(solicitud_id, aprobador, comentario)
+    
+    async def arechazar_solicitud(self, solicitud_id, aprobador, comentario=''):
+        return await sync_to_async(self.rechazar_solicitud)(solicitud_id, aprobador, comentario)
+    
+    async def acambiar_estado_masivo(self, ids, estado, usuario, comentario=''):
+        return await sync_to_async(self.cambiar_estado_masivo)(ids, estado, usuario, comentario)
+    
+    async def aobtener_solicitud_por_id(self, solicitud_id):
+        """Versión async de obtener_solicitud_por_id"""
+        try:
+            solicitud = await SolicitudAprobacion.objects.prefetch_related(
+                *prefetch_relaciones_ordenadas()
+            ).aget(id=solicitud_id)
+            
+            return self._solicitud_to_dict(solicitud)
+        except SolicitudAprobacion.DoesNotExist:
+            pass
+        except ValidationError:
+            # La ruta acepta cualquier texto: un ID que no es UUID no existe
+            return None
+        
+        datos = await SolicitudArchivada.objects.filter(id=solicitud_id).values_list(
+            'datos', flat=True
+        ).afirst()
+        if datos is None:
+            return None
+        
+        datos['archivada'] = True
+        return datos
+    
+    async def aobtener_solicitudes_recientes(self, limite=10):
+        solicitudes = SolicitudAprobacion.objects.order_by('-fecha_creacion', '-id')[:limite]
+        return await self._asolicitudes_to_resumen(solicitudes)
+    
+    async def aobtener_pagina_solicitudes(self, estado=None, tipo=None, cursor=None, tamano_pagina=10):
+        """Versión async de obtener_pagina_solicitudes"""
+        queryset, posicion, hacia_atras = self._consulta_pagina(estado, tipo, cursor, tamano_pagina)
+        return self._armar_pagina(
+            await self._asolicitudes_to_resumen(queryset), tamano_pagina, posicion, hacia_atras
+        )
+    
+    async def aobtener_estadisticas(self):
+        return self._estadisticas({
+            estado: cantidad async for estado, cantidad in self._consulta_estadisticas()
+        })
+    
+    async def alistar_solicitudes_api(self, campos=None, incluir=(), cursor=None, tamano_pagina=50, **filtros):
+        """Versión async de listar_solicitudes_api"""
+        campos = self._validar_campos_api(campos or CAMPOS_API_LISTADO, incluir)
+        consulta = self._consulta_listado_api(campos, cursor, tamano_pagina, **filtros)
+        
+        filas, siguiente_cursor = self._pagina_api([fila async for fila in consulta], tamano_pagina)
+        return {
+            'resultados': await self._afilas_api(filas, campos, incluir),
+            'siguiente_cursor': siguiente_cursor,
+        }
+    
+    async def aobtener_solicitud_api(self, solicitud_id, campos=None, incluir=()):
+        """Versión async de obtener_solicitud_api"""
+        campos = self._validar_campos_api(campos or CAMPOS_API, incluir)
+        
+        try:
+            fila = await SolicitudAprobacion.objects.filter(id=solicitud_id).values(
+                *dict.fromkeys(('id', *campos))
+            ).afirst()
+        except ValidationError:
+            return None
+        
+        if fila:
+            return (await self._afilas_api([fila], campos, incluir))[0]
+        
+        datos = await SolicitudArchivada.objects.filter(id=solicitud_id).values_list(
+            'datos', flat=True
+        ).afirst()
+        return self._archivada_api(datos, campos, incluir)
+    
+    def _ajustar_contadores(self, cambios):
+        """
+        Aplicar deltas a ContadorSolicitudes dentro de la transacción actual.
+        cambios: Counter {(estado, tipo_solicitud, responsable): delta}
+        Cada delta se aplica al contador detallado y al total del estado.
+        """
+        deltas = Counter()
+        for (estado, tipo, responsable), delta in cambios.items():
+            deltas[(estado, '', '')] += delta
+            deltas[(estado, tipo, responsable)] += delta
+        
+        shard = random.randrange(CONTADOR_SHARDS)
+        for (estado, tipo, responsable), delta in deltas.items():
+            if not delta:
+                continue
+            
+            clave = {
+                'estado': estado,
+                'tipo_solicitud': tipo,
+                'responsable': responsable,
+                'shard': shard,
+            }
+            actualizadas = ContadorSolicitudes.objects.filter(**clave).update(
+                cantidad=F('cantidad') + delta
+            )
+            if not actualizadas:
+                contador, _ = ContadorSolicitudes.objects.get_or_create(**clave)
+                ContadorSolicitudes.objects.filter(pk=contador.pk).update(
+                    cantidad=F('cantidad') + delta
+                )
+    
+    def _leer_filas_importacion(self, lineas, formato):
+        """Generar un dict por fila de entrada; las filas ilegibles se generan como mensaje de error"""
+        if formato == 'csv':
+            yield from csv.DictReader(lineas)
+            return
+        
+        for linea in lineas:
+            if not linea.strip():
+                continue
+            try:
+                yield json.loads(linea)
+            except ValueError as e:
+                yield f'JSON inválido: {e}'
+    
+    def _insertar_bloque_importacion(self, bloque):
+        """Insertar un bloque de solicitudes validadas con su historial, contadores y notificaciones"""
+        with transaction.atomic():
+            ahora = timezone.now()
+            solicitudes = SolicitudAprobacion.objects.bulk_create([
+                SolicitudAprobacion(
+                    titulo=datos['titulo'],
+                    descripcion=datos['descripcion'],
+                    solicitante=datos['solicitante'],
+                    responsable=datos['responsable'],
+                    tipo_solicitud=datos['tipo_solicitud'],
+                    estado='pendiente',
+                    fecha_creacion=ahora,
+                    fecha_actualizacion=ahora,
+                    num_eventos=1,
+                    ultima_accion='creada',
+                    ultimo_usuario=datos['solicitante'],
+                    fecha_ultima_accion=ahora
+                )
+                for datos in bloque
+            ])
+            
+            HistorialSolicitud.objects.bulk_create([
+                HistorialSolicitud(
+                    solicitud=solicitud,
+                    accion='creada',
+                    usuario=solicitud.solicitante,
+                    # auto_now fija fecha_actualizacion por fila en bulk_create
+                    fecha=solicitud.fecha_actualizacion,
+                    comentario='Solicitud creada por importación'
+                )
+                for solicitud in solicitudes
+            ])
+            
+            self._ajustar_contadores(Counter(
+                ('pendiente', solicitud.tipo_solicitud, solicitud.responsable)
+                for solicitud in solicitudes
+            ))
+            busqueda.actualizar_indice([solicitud.id for solicitud in solicitudes])
+            self._publicar_eventos([
+                self._evento_solicitud('creada', solicitud, usuario=solicitud.solicitante)
+                for solicitud in solicitudes
+            ])
+            
+            por_responsable = {}
+            for solicitud in solicitudes:
+                por_responsable.setdefault(solicitud.responsable, []).append({
+                    'id': str(solicitud.id),
+                    'titulo': solicitud.titulo,
+                    'solicitante': solicitud.solicitante,
+                })
+            NotificacionEmail.objects.bulk_create([
+                NotificacionEmail(
+                    destinatario=responsable + '@gmail.com',
+                    asunto=f"{len(pendientes)} nuevas solicitudes de aprobación",
+                    mensaje=crear_mensaje_notificacion('nuevas_solicitudes', {
+                        'solicitudes': pendientes,
+                    })
+                )
+                for responsable, pendientes in por_responsable.items()
+            ])
+            
+            return len(solicitudes)
+    
+    def _archivar_bloque(self, limite, tamano_bloque):
+        """Archivar y borrar un bloque de solicitudes cerradas antes de `limite`"""
+        with transaction.atomic():
+            solicitudes = list(
+                SolicitudAprobacion.objects.select_for_update(skip_locked=True).filter(
+                    estado__in=ESTADOS_FINALES, fecha_actualizacion__lt=limite
+                ).order_by('fecha_actualizacion', 'id')[:tamano_bloque]
+            )
+            if not solicitudes:
+                return 0
+            
+            prefetch_related_objects(solicitudes, *prefetch_relaciones_ordenadas())
+            SolicitudArchivada.objects.bulk_create([
+                SolicitudArchivada(
+                    id=solicitud.id,
+                    titulo=solicitud.titulo,
+                    solicitante=solicitud.solicitante,
+                    responsable=solicitud.responsable,
+                    tipo_solicitud=solicitud.tipo_solicitud,
+                    estado=solicitud.estado,
+                    fecha_creacion=solicitud.fecha_creacion,
+                    fecha_cierre=solicitud.fecha_actualizacion,
+                    datos=self._solicitud_to_dict(solicitud)
+                )
+                for solicitud in solicitudes
+            ], ignore_conflicts=True)
+            
+            ids = [solicitud.id for solicitud in solicitudes]
+            busqueda.eliminar_del_indice(ids)
+            # Historial y comentarios se borran en cascada
+            SolicitudAprobacion.objects.filter(id__in=ids).delete()
+            
+            return len(ids)
+    
+    def _contar_periodos(self, intervalo, desde, hasta):
+        """Retorna {inicio_periodo: [(estado, tipo, cantidad)]} para las creadas en [desde, hasta)"""
+        truncar = INTERVALOS_SERIE[intervalo]
+        conteos = Counter()
+        for modelo in (SolicitudAprobacion, SolicitudArchivada):
+            filas = modelo.objects.filter(
+                fecha_creacion__gte=inicio_dia_local(desde),
+                fecha_creacion__lt=inicio_dia_local(hasta)
+            ).annotate(
+                periodo=truncar('fecha_creacion', output_field=DateField())
+            ).order_by().values_list('periodo', 'estado', 'tipo_solicitud').annotate(
+                cantidad=Count('id')
+            )
+            for periodo, estado, tipo, cantidad in filas:
+                conteos[(periodo, estado, tipo)] += cantidad
+        
+        por_periodo = {}
+        for (periodo, estado, tipo), cantidad in conteos.items():
+            por_periodo.setdefault(periodo, []).append((estado, tipo, cantidad))
+        return por_periodo
+    
+    def _invalidar_series(self, fechas_creacion):
+        """
+        Borrar de la caché los periodos de las series que contienen estas fechas de
+        creación (su desglose por estado o tipo cambió). Se hace al confirmar la
+        transacción para que nadie vuelva a guardar los datos anteriores.
+        """
+        cache_series = _cache_series()
+        if cache_series is None:
+            return
+        claves = {
+            _clave_serie(intervalo, inicio_periodo(timezone.localdate(fecha), intervalo))
+            for fecha in fechas_creacion
+            for intervalo in INTERVALOS_SERIE
+        }
+        transaction.on_commit(lambda: cache_series.delete_many(list(claves)))
+    
+    def _calcular_resumen_dia(self, dia):
+        """Recalcular las filas de ResumenDiario de un día (hora local) a partir del historial"""
+        inicio = inicio_dia_local(dia)
+        fin = inicio_dia_local(dia + timedelta(days=1))
+        
+        eventos = HistorialSolicitud.objects.filter(
+            fecha__gte=inicio, fecha__lt=fin, accion__in=['creada', *ESTADOS_FINALES]
+        ).values_list(
+            'accion', 'fecha', 'solicitud__tipo_solicitud', 'solicitud__responsable',
+            'solicitud__fecha_creacion'
+        )
+        
+        campos_accion = {
+            'creada': 'creadas', 'aprobado': 'aprobadas',
+            'rechazado': 'rechazadas', 'cancelado': 'canceladas',
+        }
+        conteos = {}
+        tiempos = {}
+        for accion, fecha, tipo, responsable, fecha_creacion in eventos:
+            for clave in ((tipo, ''), ('', responsable)):
+                conteos.setdefault(clave, Counter())[campos_accion[accion]] += 1
+                if accion != 'creada':
+                    tiempos.setdefault(clave, []).append((fecha - fecha_creacion).total_seconds())
+        
+        filas = []
+        for (tipo, responsable), conteo in conteos.items():
+            duraciones = sorted(tiempos.get((tipo, responsable), []))
+            filas.append(ResumenDiario(
+                fecha=dia,
+                tipo_solicitud=tipo,
+                responsable=responsable,
+                tiempo_cierre_p50=percentil(duraciones, 50),
+                tiempo_cierre_p90=percentil(duraciones, 90),
+                **conteo
+            ))
+        
+        with transaction.atomic():
+            ResumenDiario.objects.filter(fecha=dia).delete()
+            ResumenDiario.objects.bulk_create(filas)
+    
+    def _reparar_actividad_bloque(self, ids):
+        """Recalcular la actividad de un bloque de solicitudes con un solo UPDATE"""
+        def conteo(modelo):
+            return Coalesce(Subquery(
+                modelo.objects.filter(solicitud=OuterRef('pk')).order_by().values(
+                    'solicitud'
+                ).annotate(total=Count('id')).values('total')
+            ), 0)
+        
+        ultimo = HistorialSolicitud.objects.filter(
+            solicitud=OuterRef('pk')
+        ).order_by('-fecha', '-id')
+        
+        with transaction.atomic():
+            return SolicitudAprobacion.objects.filter(id__in=ids).update(
+                num_comentarios=conteo(ComentarioSolicitud),
+                num_eventos=conteo(HistorialSolicitud),
+                ultima_accion=Coalesce(Subquery(ultimo.values('accion')[:1]), Value('')),
+                ultimo_usuario=Coalesce(Subquery(ultimo.values('usuario')[:1]), Value('')),
+                fecha_ultima_accion=Subquery(ultimo.values('fecha')[:1])
+            )
+    
+    def _validar_campos_api(self, campos, incluir):
+        """Lanza ValueError si se pide un campo o relación desconocidos"""
+        desconocidos = [campo for campo in campos if campo not in CAMPOS_API]
+        desconocidos += [relacion for relacion in incluir if relacion not in RELACIONES_API]
+        if desconocidos:
+            raise ValueError(f"Campos no válidos: {', '.join(desconocidos)}")
+        return list(dict.fromkeys(campos))
+    
+    def _consulta_listado_api(self, campos, cursor, tamano_pagina, **filtros):
+        """Consulta de una página de la API; lee una fila extra para saber si hay más"""
+        queryset = self._queryset_filtrado(**filtros)
+        
+        posicion = decodificar_cursor(cursor)
+        if posicion:
+            fecha, solicitud_id, _ = posicion
+            queryset = queryset.filter(
+                Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=solicitud_id)
+            )
+        
+        # id y fecha_creacion siempre se leen: hacen falta para el cursor y las relaciones
+        return queryset.order_by('-fecha_creacion', '-id').values(
+            *dict.fromkeys(('id', 'fecha_creacion', *campos))
+        )[:tamano_pagina + 1]
+    
+    def _pagina_api(self, filas, tamano_pagina):
+        """Recortar la fila extra y calcular el cursor de la página siguiente"""
+        if len(filas) <= tamano_pagina:
+            return filas, None
+        filas = filas[:tamano_pagina]
+        if not filas:
+            return filas, None
+        return filas, codificar_cursor(filas[-1]['fecha_creacion'], filas[-1]['id'])
+    
+    def _consulta_relacion_api(self, filas, relacion):
+        modelo, columnas = RELACIONES_API[relacion]
+        return modelo.objects.filter(solicitud_id__in=[fila['id'] for fila in filas]).order_by(
+            'solicitud_id', 'fecha'
+        ).values('solicitud_id', *columnas)
+    
+    def _agregar_relacion_api(self, filas, relacion, entradas):
+        por_solicitud = {}
+        for entrada in entradas:
+            por_solicitud.setdefault(entrada.pop('solicitud_id'), []).append(entrada)
+        for fila in filas:
+            fila[relacion] = por_solicitud.get(fila['id'], [])
+    
+    def _proyectar_api(self, filas, campos, incluir):
+        """Quitar las columnas leídas que el cliente no pidió"""
+        visibles = set(campos) | set(incluir)
+        return [
+            {clave: valor for clave, valor in fila.items() if clave in visibles}
+            for fila in filas
+        ]
+    
+    def _filas_api(self, filas, campos, incluir):
+        """Agregar las relaciones incluidas (una consulta por relación) y quitar columnas no pedidas"""
+        for relacion in incluir:
+            self._agregar_relacion_api(filas, relacion, self._consulta_relacion_api(filas, relacion))
+        return self._proyectar_api(filas, campos, incluir)
+    
+    async def _afilas_api(self, filas, campos, incluir):
+        for relacion in incluir:
+            entradas = [entrada async for entrada in self._consulta_relacion_api(filas, relacion)]
+            self._agregar_relacion_api(filas, relacion, entradas)
+        return self._proyectar_api(filas, campos, incluir)
+    
+    def _archivada_api(self, datos, campos, incluir):
+        """Respuesta de la API para una solicitud archivada (datos del documento JSON)"""
+        if datos is None:
+            return None
+        
+        resultado = {campo: datos[campo] for campo in campos if campo in datos}
+        for relacion in incluir:
+            resultado[relacion] = datos[relacion]
+        resultado['archivada'] = True
+        return resultado
+    
+    def _queryset_filtrado(self, estado=None, tipo=None, solicitante=None, responsable=None):
+        """Queryset de solicitudes con los filtros comunes de listados y exportación"""
+        queryset = SolicitudAprobacion.objects.all()
         
         if estado:
             queryset = queryset.filter(estado=estado)
@@ -163,7 +1553,43 @@ class SolicitudStorageService:
         if responsable:
             queryset = queryset.filter(responsable=responsable)
         
-        return [self._solicitud_to_dict(solicitud) for solicitud in queryset]
+        return queryset
+    
+    def _consulta_estadisticas(self):
+        return ContadorSolicitudes.objects.filter(
+            tipo_solicitud='', responsable=''
+        ).values('estado').annotate(
+            cantidad_total=Sum('cantidad')
+        ).values_list('estado', 'cantidad_total')
+    
+    def _estadisticas(self, por_estado):
+        return {
+            'total': sum(por_estado.values()),
+            'pendientes': por_estado.get('pendiente', 0),
+            'aprobadas': por_estado.get('aprobado', 0),
+            'rechazadas': por_estado.get('rechazado', 0),
+            'en_revision': por_estado.get('en_revision', 0),
+        }
+    
+    def _consulta_resumen(self, queryset):
+        """Solo las columnas del listado, en el orden de ResumenSolicitud"""
+        return queryset.annotate(
+            descripcion_corta=Left('descripcion', LONGITUD_DESCRIPCION_CORTA)
+        ).values_list(
+            'id', 'titulo', 'descripcion_corta', 'solicitante', 'responsable',
+            'tipo_solicitud', 'estado', 'fecha_creacion',
+            'num_comentarios', 'ultima_accion', 'ultimo_usuario', 'fecha_ultima_accion'
+        )
+    
+    def _solicitudes_to_resumen(self, queryset):
+        """Convertir un queryset en ResumenSolicitud leyendo solo las columnas del listado"""
+        return [ResumenSolicitud(str(fila[0]), *fila[1:]) for fila in self._consulta_resumen(queryset)]
+    
+    async def _asolicitudes_to_resumen(self, queryset):
+        return [
+            ResumenSolicitud(str(fila[0]), *fila[1:])
+            async for fila in self._consulta_resumen(queryset)
+        ]
     
     def _solicitud_to_dict(self, solicitud):
         """Convertir modelo SolicitudAprobacion a diccionario para compatibilidad"""
@@ -198,32 +1624,168 @@ class SolicitudStorageService:
             ]
         }
     
-    def _enviar_notificacion_nueva_solicitud(self, solicitud):
-        """Enviar notificación de nueva solicitud al responsable"""
-        solicitud_dict = self._solicitud_to_dict(solicitud)
+    def _evento_solicitud(self, evento, solicitud, usuario, estado_anterior=''):
+        """Datos del evento que reciben los suscriptores SSE"""
+        return {
+            'evento': evento,
+            'id': str(solicitud.id),
+            'titulo': solicitud.titulo,
+            'solicitante': solicitud.solicitante,
+            'responsable': solicitud.responsable,
+            'tipo_solicitud': solicitud.tipo_solicitud,
+            'estado': solicitud.estado,
+            'estado_anterior': estado_anterior,
+            'usuario': usuario,
+            'fecha': (solicitud.fecha_actualizacion or timezone.now()).isoformat(),
+        }
+    
+    def _publicar_eventos(self, lista_eventos):
+        """
+        Publicar en el broker y contar las transiciones en las métricas cuando la
+        transacción se confirme (nunca eventos revertidos)
+        """
+        def publicar():
+            for evento in lista_eventos:
+                eventos.broker.publicar(evento)
+                if evento['evento'] == 'cambio_estado':
+                    metricas.incrementar(
+                        'aprobaciones_transiciones_total',
+                        tipo_solicitud=evento['tipo_solicitud'], estado=evento['estado']
+                    )
+        transaction.on_commit(publicar)
+    
+    def _datos_notificacion(self, solicitud):
+        """Datos mínimos que usan las plantillas de crear_mensaje_notificacion"""
+        return {
+            'id': str(solicitud.id),
+            'titulo': solicitud.titulo,
+            'solicitante': solicitud.solicitante,
+            'tipo_solicitud': solicitud.tipo_solicitud,
+        }
+    
+    def _encolar_notificacion_nueva_solicitud(self, solicitud):
+        """Encolar notificación de nueva solicitud al responsable"""
         asunto = f"Nueva solicitud de aprobación - {solicitud.titulo}"
-        mensaje = crear_mensaje_notificacion('nueva_solicitud', solicitud_dict)
+        mensaje = crear_mensaje_notificacion('nueva_solicitud', self._datos_notificacion(solicitud))
         
-        return enviar_notificacion_email(
-            solicitud.responsable + '@gmail.com',
-            asunto,
-            mensaje,
-            solicitud_dict
+        return NotificacionEmail.objects.create(
+            solicitud=solicitud,
+            destinatario=solicitud.responsable + '@gmail.com',
+            asunto=asunto,
+            mensaje=mensaje
         )
     
-    def _enviar_notificacion_cambio_estado(self, solicitud, nuevo_estado):
-        """Enviar notificación de cambio de estado al solicitante"""
-        solicitud_dict = self._solicitud_to_dict(solicitud)
+    def _encolar_notificacion_cambio_estado(self, solicitud, nuevo_estado):
+        """Encolar notificación de cambio de estado al solicitante"""
         asunto = f"Actualización de solicitud - {solicitud.titulo}"
+        datos = self._datos_notificacion(solicitud)
         
         if nuevo_estado == 'aprobado':
-            mensaje = crear_mensaje_notificacion('solicitud_aprobada', solicitud_dict)
+            mensaje = crear_mensaje_notificacion('solicitud_aprobada', datos)
         else:
-            mensaje = crear_mensaje_notificacion('solicitud_rechazada', solicitud_dict)
-        
-        return enviar_notificacion_email(
-            solicitud.solicitante + '@empresa.com',
-            asunto,
-            mensaje,
-            solicitud_dict
-        )
\ No newline at end of file
+            mensaje = crear_mensaje_notificacion('solicitud_rechazada', datos)
+        
+        return NotificacionEmail.objects.create(
+            solicitud=solicitud,
+            destinatario=solicitud.solicitante + '@empresa.com',
+            asunto=asunto,
+            mensaje=mensaje
+        )
+    
+    def _encolar_notificaciones_cambio_masivo(self, filas, nuevo_estado):
+        """Encolar una sola notificación por solicitante con todas sus solicitudes afectadas"""
+        por_solicitante = {}
+        for solicitud_id, _, titulo, solicitante, _, _, _ in filas:
+            por_solicitante.setdefault(solicitante, []).append(
+                {'id': str(solicitud_id), 'titulo': titulo}
+            )
+        
+        NotificacionEmail.objects.bulk_create([
+            NotificacionEmail(
+                destinatario=solicitante + '@empresa.com',
+                asunto=f"Actualización de {len(solicitudes)} solicitudes",
+                mensaje=crear_mensaje_notificacion('cambio_masivo', {
+                    'estado': nuevo_estado,
+                    'solicitudes': solicitudes,
+                })
+            )
+            for solicitante, solicitudes in por_solicitante.items()
+        ])
+
+
+class NotificacionService:
+    """
+    Despacho de la bandeja de salida de notificaciones (NotificacionEmail)
+    """
+    
+    def despachar_lote(self, tamano_lote=100, max_intentos=NOTIFICACION_MAX_INTENTOS):
+        """
+        Enviar un lote de notificaciones pendientes reutilizando una sola conexión SMTP.
+        Las filas se bloquean con skip_locked para que varios workers no se pisen.
+        Retorna (enviadas, fallidas).
+        """
+        with transaction.atomic():
+            lote = list(
+                NotificacionEmail.objects.select_for_update(skip_locked=True).filter(
+                    estado='pendiente', proximo_intento__lte=timezone.now()
+                ).order_by('proximo_intento')[:tamano_lote]
+            )
+            if not lote:
+                return 0, 0
+            
+            enviadas = fallidas = 0
+            conexion = get_connection()
+            try:
+                conexion.open()
+            except Exception as e:
+                logger.warning("No se pudo abrir la conexión de email: %s", e)
+                for notificacion in lote:
+                    self._registrar_fallo(notificacion, e, max_intentos)
+                self._guardar_lote(lote)
+                metricas.incrementar('aprobaciones_notificaciones_total', len(lote), resultado='fallida')
+                return 0, len(lote)
+            
+            try:
+                for notificacion in lote:
+                    email = EmailMessage(
+                        notificacion.asunto,
+                        notificacion.mensaje,
+                        settings.DEFAULT_FROM_EMAIL,
+                        [notificacion.destinatario],
+                        connection=conexion
+                    )
+                    try:
+                        email.send()
+                    except Exception as e:
+                        logger.warning("Error enviando notificación %s: %s", notificacion.pk, e)
+                        self._registrar_fallo(notificacion, e, max_intentos)
+                        fallidas += 1
+                    else:
+                        notificacion.estado = 'enviada'
+                        notificacion.intentos += 1
+                        notificacion.fecha_envio = timezone.now()
+                        notificacion.ultimo_error = ''
+                        enviadas += 1
+            finally:
+                conexion.close()
+            
+            self._guardar_lote(lote)
+            metricas.incrementar('aprobaciones_notificaciones_total', enviadas, resultado='enviada')
+            metricas.incrementar('aprobaciones_notificaciones_total', fallidas, resultado='fallida')
+            return enviadas, fallidas
+    
+    def _registrar_fallo(self, notificacion, error, max_intentos):
+        """Programar el reintento con backoff exponencial o marcar como fallida"""
+        notificacion.intentos += 1
+        notificacion.ultimo_error = str(error)
+        if notificacion.intentos >= max_intentos:
+            notificacion.estado = 'fallida'
+        else:
+            retraso = NOTIFICACION_RETRASO_BASE * 2 ** (notificacion.intentos - 1)
+            notificacion.proximo_intento = timezone.now() + timedelta(seconds=retraso)
+    
+    def _guardar_lote(self, lote):
+        NotificacionEmail.objects.bulk_update(
+            lote,
+            ['estado', 'intentos', 'proximo_intento', 'ultimo_error', 'fecha_envio']
+        )
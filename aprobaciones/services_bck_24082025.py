@@ -2,7 +2,7 @@ import json
 import os
 from datetime import datetime
 from django.conf import settings
-from .utils import generar_id_solicitud, enviar_notificacion_email, crear_mensaje_notificacion
+from .utils_bck_24082025 import generar_id_solicitud, enviar_notificacion_email, crear_mensaje_notificacion
 
 #services.py
 
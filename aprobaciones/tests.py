@@ -1,3 +1,1577 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import re
+import tempfile
+import threading
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, router, DatabaseError
+from django.db.models import Sum
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import checks
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    SolicitudAprobacion, HistorialSolicitud, ComentarioSolicitud, ContadorSolicitudes,
+    NotificacionEmail, SolicitudArchivada, ResumenDiario
+)
+from .eventos import broker
+from .metricas import RegistroMetricas
+from .middleware import COOKIE_PIN_PRIMARIA
+from .routers import leer_de_primaria
+from .services import (
+    SolicitudStorageService, NotificacionService, prefetch_relaciones_ordenadas
+)
+from .utils import obtener_estados_origen
 
-# Create your tests here.
+# Réplicas configuradas como espejo de 'default' (ver APROBACIONES_REPLICA_HOSTS en settings)
+REPLICAS_PRUEBA = [
+    alias for alias in connections
+    if connections.settings[alias]['TEST'].get('MIRROR') == 'default'
+]
+BASES_PRUEBA = {'default', *REPLICAS_PRUEBA}
+# Sin réplicas configuradas, RouterReplicaTest usa un espejo local de 'default'
+REPLICA_LOCAL = 'replica_local'
+REPLICAS_ROUTER = REPLICAS_PRUEBA or [REPLICA_LOCAL]
+
+
+def crear_solicitudes(cantidad, **campos):
+    """Crea solicitudes de prueba con fechas de creación decrecientes"""
+    ahora = timezone.now()
+    datos = {
+        'descripcion': 'Descripción de prueba',
+        'solicitante': 'ana.perez',
+        'responsable': 'carlos.gomez',
+        'tipo_solicitud': 'acceso',
+    }
+    datos.update(campos)
+    return SolicitudAprobacion.objects.bulk_create([
+        SolicitudAprobacion(
+            titulo=f'Solicitud {i}',
+            fecha_creacion=ahora - timedelta(minutes=i),
+            **datos
+        )
+        for i in range(cantidad)
+    ])
+
+
+def crear_solicitud_grafana(storage, **campos):
+    """Crea por el servicio (con historial y contadores) la solicitud de acceso base de las pruebas"""
+    datos = {
+        'titulo': 'Acceso a Grafana',
+        'descripcion': 'Tableros de monitoreo del equipo',
+        'solicitante': 'ana.perez',
+        'responsable': 'carlos.gomez',
+        'tipo_solicitud': 'acceso',
+    }
+    datos.update(campos)
+    return storage.crear_solicitud(datos)
+
+
+class PaginacionSolicitudesTest(TestCase):
+    """Pruebas de la paginación por cursor del servicio"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        crear_solicitudes(25)
+        crear_solicitudes(5, estado='aprobado')
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        vistos = []
+        cursor = None
+        while True:
+            pagina = self.storage.obtener_pagina_solicitudes(
+                estado='pendiente', cursor=cursor, tamano_pagina=10
+            )
+            vistos.extend(s.id for s in pagina['solicitudes'])
+            cursor = pagina['siguiente_cursor']
+            if not cursor:
+                break
+
+        esperados = [
+            str(pk) for pk in SolicitudAprobacion.objects.filter(
+                estado='pendiente'
+            ).order_by('-fecha_creacion', '-id').values_list('id', flat=True)
+        ]
+        self.assertEqual(vistos, esperados)
+
+    def test_cursor_anterior_regresa_a_la_pagina_previa(self):
+        primera = self.storage.obtener_pagina_solicitudes(tamano_pagina=10)
+        self.assertIsNone(primera['anterior_cursor'])
+
+        segunda = self.storage.obtener_pagina_solicitudes(
+            cursor=primera['siguiente_cursor'], tamano_pagina=10
+        )
+        regreso = self.storage.obtener_pagina_solicitudes(
+            cursor=segunda['anterior_cursor'], tamano_pagina=10
+        )
+        self.assertEqual(
+            [s.id for s in regreso['solicitudes']],
+            [s.id for s in primera['solicitudes']]
+        )
+
+    def test_cursor_invalido_retorna_primera_pagina(self):
+        pagina = self.storage.obtener_pagina_solicitudes(cursor='no-es-un-cursor')
+        self.assertEqual(len(pagina['solicitudes']), 10)
+        self.assertIsNone(pagina['anterior_cursor'])
+
+
+class ResumenSolicitudesTest(TestCase):
+    """Pruebas de la proyección liviana usada en listados"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        crear_solicitudes(3, descripcion='x' * 500)
+
+    def test_resumen_no_carga_relaciones_ni_descripcion_completa(self):
+        with self.assertNumQueries(1):
+            resumenes = self.storage.filtrar_solicitudes(estado='pendiente')
+
+        self.assertEqual(len(resumenes), 3)
+        resumen = resumenes[0]
+        self.assertIsInstance(resumen.id, str)
+        self.assertLessEqual(len(resumen.descripcion_corta), 60)
+        self.assertEqual(resumen.color_estado, 'warning')
+        self.assertEqual(resumen.tipo_formateado, 'Solicitud de Acceso')
+
+
+class PresupuestoConsultasTest(TestCase):
+    """El número de consultas no debe crecer con la cantidad de filas"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+
+    def _crear_con_relaciones(self, cantidad):
+        solicitudes = crear_solicitudes(cantidad)
+        ahora = timezone.now()
+        HistorialSolicitud.objects.bulk_create([
+            HistorialSolicitud(
+                solicitud=solicitud, accion=accion, usuario='ana.perez',
+                fecha=ahora + timedelta(seconds=orden)
+            )
+            for solicitud in solicitudes
+            for orden, accion in enumerate(['creada', 'actualizada', 'en_revision'])
+        ])
+        ComentarioSolicitud.objects.bulk_create([
+            ComentarioSolicitud(
+                solicitud=solicitud, usuario='carlos.gomez',
+                comentario=f'Comentario {orden}', fecha=ahora + timedelta(seconds=orden)
+            )
+            for solicitud in solicitudes
+            for orden in range(2)
+        ])
+        return solicitudes
+
+    def _serializar_todas(self):
+        queryset = SolicitudAprobacion.objects.prefetch_related(*prefetch_relaciones_ordenadas())
+        return [self.storage._solicitud_to_dict(solicitud) for solicitud in queryset]
+
+    def test_serializacion_con_prefetch_usa_consultas_constantes(self):
+        self._crear_con_relaciones(5)
+        with self.assertNumQueries(3):
+            self._serializar_todas()
+
+        self._crear_con_relaciones(50)
+        with self.assertNumQueries(3):
+            datos = self._serializar_todas()
+
+        self.assertEqual(len(datos), 55)
+        acciones = [h['accion'] for h in datos[0]['historial']]
+        self.assertEqual(acciones, ['creada', 'actualizada', 'en_revision'])
+
+    def test_detalle_usa_consultas_constantes(self):
+        solicitud = self._crear_con_relaciones(1)[0]
+        with self.assertNumQueries(3):
+            datos = self.storage.obtener_solicitud_por_id(solicitud.id)
+        self.assertEqual(len(datos['historial']), 3)
+        self.assertEqual(
+            [c['comentario'] for c in datos['comentarios']],
+            ['Comentario 0', 'Comentario 1']
+        )
+
+    def test_listados_usan_una_consulta(self):
+        self._crear_con_relaciones(50)
+        with self.assertNumQueries(1):
+            self.storage.obtener_todas_solicitudes()
+        with self.assertNumQueries(1):
+            self.storage.obtener_solicitudes_por_usuario('carlos.gomez', tipo='responsable')
+        with self.assertNumQueries(1):
+            self.storage.obtener_pagina_solicitudes(tamano_pagina=20)
+
+    def test_dashboard_usa_consultas_constantes(self):
+        # Sello de versión (GET condicional), estadísticas y recientes
+        crear_solicitudes(5)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('dashboard'))
+
+        crear_solicitudes(40)
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(len(respuesta.context['solicitudes_recientes']), 10)
+
+    def test_recientes_ordenadas_por_fecha_descendente(self):
+        crear_solicitudes(15)
+        recientes = self.storage.obtener_solicitudes_recientes(limite=5)
+        self.assertEqual(
+            [s.titulo for s in recientes],
+            ['Solicitud 0', 'Solicitud 1', 'Solicitud 2', 'Solicitud 3', 'Solicitud 4']
+        )
+
+
+class ContadoresEstadisticasTest(TestCase):
+    """Los contadores incrementales deben coincidir con un conteo completo"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        datos = {
+            'titulo': 'Acceso a Jenkins',
+            'descripcion': 'Necesito acceso al servidor de CI',
+            'solicitante': 'ana.perez',
+            'responsable': 'carlos.gomez',
+            'tipo_solicitud': 'acceso',
+        }
+        self.ids = [self.storage.crear_solicitud(datos)['id'] for _ in range(4)]
+        self.storage.aprobar_solicitud(self.ids[0], 'carlos.gomez')
+        self.storage.rechazar_solicitud(self.ids[1], 'carlos.gomez', 'No aplica')
+        self.storage.actualizar_solicitud(self.ids[2], {'tipo_solicitud': 'pipeline'})
+
+    def _conteo_real(self):
+        return {
+            'total': SolicitudAprobacion.objects.count(),
+            'pendientes': SolicitudAprobacion.objects.filter(estado='pendiente').count(),
+            'aprobadas': SolicitudAprobacion.objects.filter(estado='aprobado').count(),
+            'rechazadas': SolicitudAprobacion.objects.filter(estado='rechazado').count(),
+            'en_revision': SolicitudAprobacion.objects.filter(estado='en_revision').count(),
+        }
+
+    def test_estadisticas_coinciden_con_conteo_real(self):
+        self.assertEqual(self.storage.obtener_estadisticas(), self._conteo_real())
+
+    def test_contadores_detallados_por_tipo(self):
+        pendientes_acceso = ContadorSolicitudes.objects.filter(
+            estado='pendiente', tipo_solicitud='acceso', responsable='carlos.gomez'
+        ).aggregate(total=Sum('cantidad'))['total']
+        self.assertEqual(pendientes_acceso, 1)
+
+    def test_reconstruir_contadores_corrige_desviaciones(self):
+        SolicitudAprobacion.objects.filter(id=self.ids[3]).update(estado='cancelado')
+        ContadorSolicitudes.objects.update(cantidad=0)
+
+        call_command('reconstruir_contadores', stdout=StringIO())
+
+        self.assertEqual(self.storage.obtener_estadisticas(), self._conteo_real())
+
+
+class BandejaNotificacionesTest(TestCase):
+    """Las notificaciones se encolan en la transacción y se despachan aparte"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.solicitud = self.storage.crear_solicitud({
+            'titulo': 'Despliegue del API',
+            'descripcion': 'Desplegar la versión 2.3 en producción',
+            'solicitante': 'ana.perez',
+            'responsable': 'carlos.gomez',
+            'tipo_solicitud': 'despliegue',
+        })
+
+    def test_crear_solicitud_encola_sin_enviar(self):
+        self.assertEqual(len(mail.outbox), 0)
+        notificacion = NotificacionEmail.objects.get()
+        self.assertEqual(notificacion.estado, 'pendiente')
+        self.assertEqual(notificacion.destinatario, 'carlos.gomez@gmail.com')
+
+    def test_despachar_envia_lote_y_registra_estado(self):
+        self.storage.aprobar_solicitud(self.solicitud['id'], 'carlos.gomez')
+
+        call_command('despachar_notificaciones', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(NotificacionEmail.objects.exclude(estado='enviada').exists())
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            ['ana.perez@empresa.com', 'carlos.gomez@gmail.com']
+        )
+
+    def test_fallo_reprograma_con_backoff_y_luego_marca_fallida(self):
+        servicio = NotificacionService()
+        with patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP caído')):
+            self.assertEqual(servicio.despachar_lote(max_intentos=2), (0, 1))
+
+            notificacion = NotificacionEmail.objects.get()
+            self.assertEqual(notificacion.estado, 'pendiente')
+            self.assertEqual(notificacion.intentos, 1)
+            self.assertGreater(notificacion.proximo_intento, timezone.now())
+
+            # Todavía no vence el backoff: no se reintenta
+            self.assertEqual(servicio.despachar_lote(max_intentos=2), (0, 0))
+
+            NotificacionEmail.objects.update(proximo_intento=timezone.now())
+            servicio.despachar_lote(max_intentos=2)
+
+        notificacion.refresh_from_db()
+        self.assertEqual(notificacion.estado, 'fallida')
+        self.assertIn('SMTP caído', notificacion.ultimo_error)
+
+
+class CambioEstadoMasivoTest(TestCase):
+    """Aprobación masiva con validación de transiciones y consultas acotadas"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+
+    def _ids(self, solicitudes):
+        return [str(s.id) for s in solicitudes]
+
+    def test_aprueba_validas_y_reporta_rechazadas(self):
+        pendientes = self._ids(crear_solicitudes(5))
+        aprobada = self._ids(crear_solicitudes(1, estado='aprobado'))[0]
+        inexistente = '00000000-0000-0000-0000-000000000000'
+
+        resultado = self.storage.cambiar_estado_masivo(
+            pendientes + [aprobada, inexistente, 'xyz'], 'aprobado', 'carlos.gomez', 'OK'
+        )
+
+        self.assertCountEqual(resultado['actualizadas'], pendientes)
+        self.assertEqual(set(resultado['rechazadas']), {aprobada, inexistente, 'xyz'})
+        self.assertEqual(SolicitudAprobacion.objects.filter(estado='aprobado').count(), 6)
+        self.assertEqual(HistorialSolicitud.objects.filter(accion='aprobado').count(), 5)
+        self.assertEqual(ComentarioSolicitud.objects.filter(tipo='aprobado').count(), 5)
+        # Una sola notificación para el único solicitante afectado
+        self.assertEqual(NotificacionEmail.objects.count(), 1)
+
+    @patch('aprobaciones.services.random.randrange', return_value=0)
+    def test_consultas_no_crecen_con_la_cantidad(self, _randrange):
+        inicial = self._ids(crear_solicitudes(1))
+        pocas = self._ids(crear_solicitudes(5))
+        muchas = self._ids(crear_solicitudes(200))
+        self.storage.reconstruir_contadores()
+        # El primer cambio crea las filas de contadores que aún no existen
+        self.storage.cambiar_estado_masivo(inicial, 'rechazado', 'carlos.gomez', 'No')
+
+        with CaptureQueriesContext(connection) as pocas_consultas:
+            self.storage.cambiar_estado_masivo(pocas, 'rechazado', 'carlos.gomez', 'No')
+        with CaptureQueriesContext(connection) as muchas_consultas:
+            self.storage.cambiar_estado_masivo(muchas, 'rechazado', 'carlos.gomez', 'No')
+
+        # Solo crecen los lotes de bulk_create que el backend necesite partir
+        self.assertLessEqual(len(pocas_consultas), 15)
+        self.assertLessEqual(len(muchas_consultas), 15)
+        self.assertEqual(
+            SolicitudAprobacion.objects.filter(estado='rechazado').count(), 206
+        )
+        self.assertEqual(self.storage.obtener_estadisticas()['rechazadas'], 206)
+        self.assertEqual(self.storage.obtener_estadisticas()['pendientes'], 0)
+
+    def test_endpoint_masivo(self):
+        ids = self._ids(crear_solicitudes(3))
+        respuesta = self.client.post(
+            reverse('cambiar_estado_masivo'),
+            data=json.dumps({'ids': ids, 'estado': 'en_revision'}),
+            content_type='application/json'
+        )
+
+        datos = respuesta.json()
+        self.assertTrue(datos['success'])
+        self.assertCountEqual(datos['actualizadas'], ids)
+
+
+class TransicionEstadoConcurrenteTest(TransactionTestCase):
+    """Aprobaciones/rechazos concurrentes no deben perder actualizaciones"""
+    databases = BASES_PRUEBA
+
+    HILOS = 8
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.solicitud = crear_solicitudes(1)[0]
+
+    def _competir(self, accion):
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def trabajador(indice):
+            barrera.wait()
+            try:
+                accion(indice)
+                resultados.append('ok')
+            except ValueError:
+                resultados.append('rechazado')
+            except DatabaseError:
+                # SQLite no espera al escritor que tiene la base: la transacción se
+                # revierte entera (PostgreSQL esperaría y luego vería el estado nuevo)
+                resultados.append('bloqueado')
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados
+
+    def test_solo_una_transicion_gana(self):
+        def accion(indice):
+            if indice % 2:
+                self.storage.aprobar_solicitud(self.solicitud.id, f'aprobador{indice}')
+            else:
+                self.storage.rechazar_solicitud(self.solicitud.id, f'aprobador{indice}')
+
+        resultados = self._competir(accion)
+
+        self.assertEqual(resultados.count('ok'), 1)
+        self.solicitud.refresh_from_db()
+        historial = HistorialSolicitud.objects.filter(solicitud=self.solicitud)
+        # Exactamente un cambio registrado y coherente con el estado final
+        self.assertEqual(historial.count(), 1)
+        self.assertEqual(historial.get().accion, self.solicitud.estado)
+        self.assertEqual(historial.get().estado_anterior, 'pendiente')
+
+    def _sentencias_sobre_solicitudes(self, funcion):
+        with CaptureQueriesContext(connection) as consultas:
+            funcion()
+        tabla = SolicitudAprobacion._meta.db_table
+        return [
+            ' '.join(q['sql'].split()) for q in consultas.captured_queries
+            if re.search(rf'(FROM|UPDATE) "{tabla}"', q['sql'])
+        ]
+
+    def test_update_escribe_solo_estado(self):
+        sobre_solicitudes = self._sentencias_sobre_solicitudes(
+            lambda: self.storage.aprobar_solicitud(self.solicitud.id, 'carlos.gomez')
+        )
+
+        # Ni lectura previa ni bloqueo aparte: un único UPDATE que devuelve la fila
+        self.assertEqual(len(sobre_solicitudes), 1)
+        asignaciones, devueltas = sobre_solicitudes[0].split(' RETURNING ')
+        tabla = SolicitudAprobacion._meta.db_table
+        if connection.vendor == 'postgresql':
+            self.assertTrue(asignaciones.startswith(f'UPDATE "{tabla}" s SET estado = '))
+            self.assertIn('FOR UPDATE', asignaciones)
+            self.assertIn('anterior.estado AS estado_anterior', devueltas)
+        else:
+            self.assertTrue(asignaciones.startswith(f'UPDATE "{tabla}" SET estado = '))
+        self.assertNotIn('titulo', asignaciones)
+        self.assertNotIn('descripcion', asignaciones)
+        self.assertIn('"titulo"', devueltas)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Sentencia específica de PostgreSQL')
+    def test_postgresql_devuelve_el_estado_anterior_bloqueado(self):
+        self.storage._cambiar_estado_solicitud(self.solicitud.id, 'en_revision', 'luis.diaz', 'Reviso')
+
+        sobre_solicitudes = self._sentencias_sobre_solicitudes(
+            lambda: self.storage.aprobar_solicitud(self.solicitud.id, 'carlos.gomez')
+        )
+
+        # Una sola sentencia aunque el estado de origen no sea el primero posible
+        self.assertEqual(len(sobre_solicitudes), 1)
+        entrada = HistorialSolicitud.objects.filter(solicitud_id=self.solicitud.id, accion='aprobado').get()
+        self.assertEqual(entrada.estado_anterior, 'en_revision')
+
+    @skipUnless(connection.vendor != 'postgresql', 'Sentencias del camino sin FROM en el UPDATE')
+    def test_otros_motores_prueban_cada_estado_de_origen(self):
+        self.storage._cambiar_estado_solicitud(self.solicitud.id, 'en_revision', 'luis.diaz', 'Reviso')
+        origenes = obtener_estados_origen('aprobado')
+
+        sobre_solicitudes = self._sentencias_sobre_solicitudes(
+            lambda: self.storage.aprobar_solicitud(self.solicitud.id, 'carlos.gomez')
+        )
+
+        self.assertEqual(len(sobre_solicitudes), origenes.index('en_revision') + 1)
+        entrada = HistorialSolicitud.objects.filter(solicitud_id=self.solicitud.id, accion='aprobado').get()
+        self.assertEqual(entrada.estado_anterior, 'en_revision')
+
+    def test_una_consulta_menos_que_leer_y_bloquear(self):
+        # Contadores ya existentes en un solo shard, como en régimen estable
+        with patch('aprobaciones.services.CONTADOR_SHARDS', 1):
+            self.storage.reconstruir_contadores()
+            ContadorSolicitudes.objects.bulk_create([
+                ContadorSolicitudes(estado='aprobado'),
+                ContadorSolicitudes(estado='aprobado', tipo_solicitud='acceso', responsable='carlos.gomez'),
+            ])
+
+            # BEGIN, UPDATE ... RETURNING, 4 contadores, historial, notificación,
+            # historial y comentarios del resultado, COMMIT
+            with self.assertNumQueries(11):
+                resultado = self.storage.aprobar_solicitud(self.solicitud.id, 'carlos.gomez')
+        self.assertEqual(resultado['estado'], 'aprobado')
+        self.assertEqual(
+            HistorialSolicitud.objects.get(solicitud_id=self.solicitud.id).estado_anterior, 'pendiente'
+        )
+
+    def test_transicion_no_permitida_explica_el_motivo(self):
+        self.storage.aprobar_solicitud(self.solicitud.id, 'carlos.gomez')
+
+        with self.assertRaisesMessage(ValueError, "No se puede cambiar el estado desde 'aprobado'"):
+            self.storage.rechazar_solicitud(self.solicitud.id, 'carlos.gomez')
+        self.assertIsNone(self.storage.aprobar_solicitud(uuid.uuid4(), 'carlos.gomez'))
+
+
+class ExportacionSolicitudesTest(TestCase):
+    """Exportación en streaming de solicitudes con su historial"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.aprobada = crear_solicitud_grafana(self.storage, descripcion='Acceso de lectura,\ncon salto de línea')
+        self.storage.aprobar_solicitud(self.aprobada['id'], 'carlos.gomez', 'Listo')
+        crear_solicitudes(5)
+
+    def test_endpoint_csv_en_streaming(self):
+        respuesta = self.client.get(reverse('exportar_solicitudes'), {'formato': 'csv'})
+
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8')
+        filas = list(csv.DictReader(StringIO(contenido)))
+        self.assertEqual(len(filas), 6)
+        fila = next(f for f in filas if f['id'] == self.aprobada['id'])
+        self.assertEqual(fila['descripcion'], 'Acceso de lectura,\ncon salto de línea')
+        self.assertEqual(
+            [h['accion'] for h in json.loads(fila['historial'])], ['creada', 'aprobado']
+        )
+
+    def test_comando_jsonl_con_filtros(self):
+        salida = StringIO()
+        call_command('exportar_solicitudes', formato='jsonl', estado='aprobado', stdout=salida)
+
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual(len(lineas), 1)
+        self.assertEqual(json.loads(lineas[0])['comentarios'][0]['comentario'], 'Listo')
+
+    def test_lee_por_bloques(self):
+        # 1 consulta de solicitudes + 2 de prefetch por cada bloque de 2 filas
+        with self.assertNumQueries(7):
+            list(self.storage.exportar_solicitudes(formato='jsonl', tamano_bloque=2))
+
+
+class ImportacionSolicitudesTest(TestCase):
+    """Importación en bloque con errores por fila"""
+
+    CSV = (
+        'titulo,descripcion,solicitante,responsable,tipo_solicitud\n'
+        'Acceso a Kibana,Necesito acceso de lectura,ana.perez,carlos.gomez,acceso\n'
+        'Mal,Necesito acceso de lectura,ana.perez,carlos.gomez,acceso\n'
+        'Despliegue API,Desplegar versión 2.0 del API,luis.diaz,carlos.gomez,despliegue\n'
+        'Pipeline nuevo,Configurar pipeline del front,luis.diaz,x!,pipeline\n'
+        'Cambio de DNS,Actualizar registros del dominio,luis.diaz,maria.ruiz,cambio_tecnico\n'
+    )
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+
+    def test_importa_validas_y_reporta_errores(self):
+        resultado = self.storage.importar_solicitudes(
+            StringIO(self.CSV), formato='csv', tamano_bloque=2
+        )
+
+        self.assertEqual(resultado['creadas'], 3)
+        self.assertEqual([e['fila'] for e in resultado['errores']], [2, 4])
+        self.assertIn('titulo', resultado['errores'][0]['errores'])
+        self.assertIn('responsable', resultado['errores'][1]['errores'])
+        self.assertEqual(HistorialSolicitud.objects.filter(accion='creada').count(), 3)
+        self.assertEqual(self.storage.obtener_estadisticas()['pendientes'], 3)
+        # Bloques de 2: una notificación por responsable en cada bloque
+        self.assertEqual(
+            sorted(NotificacionEmail.objects.values_list('destinatario', flat=True)),
+            ['carlos.gomez@gmail.com', 'maria.ruiz@gmail.com']
+        )
+
+    def test_jsonl_con_linea_invalida(self):
+        lineas = [
+            json.dumps({
+                'titulo': 'Acceso a Kibana', 'descripcion': 'Necesito acceso de lectura',
+                'solicitante': 'ana.perez', 'responsable': 'carlos.gomez',
+                'tipo_solicitud': 'acceso',
+            }) + '\n',
+            '{no es json\n',
+        ]
+        resultado = self.storage.importar_solicitudes(lineas, formato='jsonl')
+
+        self.assertEqual(resultado['creadas'], 1)
+        self.assertEqual(resultado['errores'][0]['fila'], 2)
+
+    def test_endpoint_importar(self):
+        archivo = SimpleUploadedFile('solicitudes.csv', self.CSV.encode('utf-8'))
+        respuesta = self.client.post(reverse('importar_solicitudes'), {'archivo': archivo})
+
+        datos = respuesta.json()
+        self.assertTrue(datos['success'])
+        self.assertEqual(datos['creadas'], 3)
+        self.assertEqual(len(datos['errores']), 2)
+
+
+class BusquedaTextoCompletoTest(TestCase):
+    """Búsqueda ordenada por relevancia sobre título, descripción y comentarios"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        base = {'solicitante': 'ana.perez', 'responsable': 'carlos.gomez'}
+        self.grafana = self.storage.crear_solicitud(dict(
+            base, titulo='Acceso a Grafana', tipo_solicitud='acceso',
+            descripcion='Tableros de monitoreo para el equipo'
+        ))
+        self.kibana = self.storage.crear_solicitud(dict(
+            base, titulo='Acceso a Kibana', tipo_solicitud='acceso',
+            descripcion='Revisar logs; también usaremos grafana más adelante'
+        ))
+        self.dns = self.storage.crear_solicitud(dict(
+            base, titulo='Cambio de DNS', tipo_solicitud='cambio_tecnico',
+            descripcion='Actualizar registros del dominio principal'
+        ))
+
+    def test_titulo_pesa_mas_que_descripcion(self):
+        resultados = self.storage.buscar_solicitudes('grafana')
+        self.assertEqual(
+            [r.id for r in resultados], [self.grafana['id'], self.kibana['id']]
+        )
+
+    def test_encuentra_por_comentario_y_actualizacion(self):
+        self.storage.rechazar_solicitud(self.dns['id'], 'carlos.gomez', 'Falta ticket de cambio')
+        self.storage.actualizar_solicitud(self.grafana['id'], {'titulo': 'Acceso a Prometheus'})
+
+        self.assertEqual(
+            [r.id for r in self.storage.buscar_solicitudes('ticket')], [self.dns['id']]
+        )
+        self.assertEqual(
+            [r.id for r in self.storage.buscar_solicitudes('prometheus')], [self.grafana['id']]
+        )
+
+    def test_endpoint_y_sintaxis_especial(self):
+        respuesta = self.client.get(reverse('buscar_solicitudes'), {'q': 'kibana "OR'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['resultados'], [])
+
+        respuesta = self.client.get(reverse('buscar_solicitudes'), {'q': 'dominio'})
+        self.assertEqual(respuesta.json()['resultados'][0]['id'], self.dns['id'])
+
+    def test_limite_fuera_de_rango(self):
+        for limite, cantidad in (('0', 1), ('-3', 1), ('abc', 2), ('1000', 2)):
+            respuesta = self.client.get(reverse('buscar_solicitudes'), {'q': 'acceso', 'limite': limite})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(len(respuesta.json()['resultados']), cantidad)
+        self.assertEqual(len(self.storage.buscar_solicitudes('acceso', limite=-1)), 1)
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'Planes solo para SQLite y PostgreSQL')
+class PlanesConsultaTest(TestCase):
+    """
+    Captura el SQL que ejecuta cada consulta clave del servicio y revisa su plan:
+    falla si recorre una tabla completa o si necesita ordenar explícitamente.
+    """
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        crear_solicitudes(30)
+        crear_solicitudes(30, responsable='maria.ruiz', tipo_solicitud='despliegue')
+        crear_solicitudes(30, estado='aprobado', solicitante='luis.diaz')
+        self.solicitud = crear_solicitud_grafana(self.storage)
+        self.storage.aprobar_solicitud(self.solicitud['id'], 'carlos.gomez', 'Aprobado')
+
+    def _explicar(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Con tablas pequeñas el planificador prefiere Seq Scan aunque exista índice
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+                return '\n'.join(fila[0] for fila in cursor.fetchall())
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(fila[-1] for fila in cursor.fetchall())
+
+    def assertPlanSinScanNiSort(self, consulta):
+        with CaptureQueriesContext(connection) as capturadas:
+            consulta()
+
+        selects = [q['sql'] for q in capturadas.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        if connection.vendor == 'postgresql':
+            problema = re.compile(r'Seq Scan on aprobaciones_|(^|->  )Sort\b', re.M)
+        else:
+            problema = re.compile(r'^SCAN aprobaciones_\w+$|USE TEMP B-TREE', re.M)
+        for sql in selects:
+            plan = self._explicar(sql)
+            self.assertIsNone(problema.search(plan), f'\n{sql}\n{plan}')
+
+    def test_solicitudes_recientes(self):
+        self.assertPlanSinScanNiSort(lambda: self.storage.obtener_solicitudes_recientes(10))
+
+    def test_paginas_por_cursor(self):
+        for filtros in ({}, {'estado': 'pendiente'}, {'tipo': 'despliegue'}):
+            primera = self.storage.obtener_pagina_solicitudes(**filtros)
+            self.assertPlanSinScanNiSort(lambda: self.storage.obtener_pagina_solicitudes(**filtros))
+            self.assertPlanSinScanNiSort(lambda: self.storage.obtener_pagina_solicitudes(
+                cursor=primera['siguiente_cursor'], **filtros
+            ))
+
+    def test_solicitudes_por_usuario(self):
+        self.assertPlanSinScanNiSort(
+            lambda: self.storage.obtener_solicitudes_por_usuario('carlos.gomez', tipo='responsable')
+        )
+        self.assertPlanSinScanNiSort(
+            lambda: self.storage.obtener_solicitudes_por_usuario('luis.diaz')
+        )
+
+    def test_pendientes_por_responsable(self):
+        self.assertPlanSinScanNiSort(
+            lambda: self.storage.filtrar_solicitudes(estado='pendiente', responsable='maria.ruiz')
+        )
+
+    def test_detalle_con_historial_y_comentarios(self):
+        self.assertPlanSinScanNiSort(
+            lambda: self.storage.obtener_solicitud_por_id(self.solicitud['id'])
+        )
+
+    def test_lote_de_notificaciones(self):
+        self.assertPlanSinScanNiSort(lambda: NotificacionService().despachar_lote())
+
+    @patch('aprobaciones.services.FEED_MARGEN', timedelta(0))
+    def test_feed_de_cambios(self):
+        primera = self.storage.obtener_cambios(limite=20)
+        self.assertPlanSinScanNiSort(lambda: self.storage.obtener_cambios(
+            cursor=primera['siguiente_cursor'], limite=20
+        ))
+
+
+class ActividadDesnormalizadaTest(TestCase):
+    """Las columnas de actividad deben coincidir con historial y comentarios"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.solicitud = crear_solicitud_grafana(self.storage)
+
+    def _actividad(self):
+        return SolicitudAprobacion.objects.values(
+            'num_comentarios', 'num_eventos', 'ultima_accion', 'ultimo_usuario'
+        ).get(id=self.solicitud['id'])
+
+    def test_se_mantiene_en_cada_escritura(self):
+        self.assertEqual(self._actividad(), {
+            'num_comentarios': 0, 'num_eventos': 1,
+            'ultima_accion': 'creada', 'ultimo_usuario': 'ana.perez',
+        })
+
+        self.storage.actualizar_solicitud(
+            self.solicitud['id'], {'titulo': 'Acceso a Grafana (lectura)', 'usuario_actualizacion': 'ana.perez'}
+        )
+        self.storage._cambiar_estado_solicitud(self.solicitud['id'], 'en_revision', 'luis.diaz', 'Reviso')
+        self.storage.cambiar_estado_masivo([self.solicitud['id']], 'aprobado', 'carlos.gomez', 'OK')
+
+        self.assertEqual(self._actividad(), {
+            'num_comentarios': 2, 'num_eventos': 4,
+            'ultima_accion': 'aprobado', 'ultimo_usuario': 'carlos.gomez',
+        })
+        resumen = self.storage.obtener_solicitudes_recientes(1)[0]
+        self.assertEqual(resumen.num_comentarios, 2)
+        self.assertEqual(resumen.ultima_accion, 'aprobado')
+
+    def test_reparar_actividad(self):
+        self.storage.rechazar_solicitud(self.solicitud['id'], 'carlos.gomez', 'No aplica')
+        esperado = self._actividad()
+        SolicitudAprobacion.objects.update(
+            num_comentarios=0, num_eventos=0, ultima_accion='', ultimo_usuario=''
+        )
+
+        call_command('reparar_actividad', stdout=StringIO())
+
+        self.assertEqual(self._actividad(), esperado)
+
+
+class ArchivoSolicitudesTest(TestCase):
+    """Las solicitudes cerradas antiguas salen de las tablas activas sin perderse"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.ids = []
+        for titulo in ('Acceso a Grafana', 'Compra de monitor', 'Vacaciones'):
+            self.ids.append(self.storage.crear_solicitud({
+                'titulo': titulo,
+                'descripcion': 'Descripción de prueba',
+                'solicitante': 'ana.perez',
+                'responsable': 'carlos.gomez',
+                'tipo_solicitud': 'acceso',
+            })['id'])
+        self.storage.aprobar_solicitud(self.ids[0], 'carlos.gomez', 'OK')
+        self.storage.rechazar_solicitud(self.ids[1], 'carlos.gomez', 'No aplica')
+        # Solo se archivan las finales con antigüedad suficiente
+        SolicitudAprobacion.objects.filter(id__in=self.ids[:2]).update(
+            fecha_actualizacion=timezone.now() - timedelta(days=400)
+        )
+
+    def test_archiva_por_bloques_y_se_sigue_consultando(self):
+        detalle = self.storage.obtener_solicitud_por_id(self.ids[0])
+
+        archivadas = self.storage.archivar_solicitudes(dias=365, tamano_bloque=1)
+
+        self.assertEqual(archivadas, 2)
+        self.assertEqual(list(SolicitudAprobacion.objects.values_list('titulo', flat=True)), ['Vacaciones'])
+        self.assertFalse(HistorialSolicitud.objects.filter(solicitud_id__in=self.ids[:2]).exists())
+        archivada = self.storage.obtener_solicitud_por_id(self.ids[0])
+        self.assertTrue(archivada.pop('archivada'))
+        self.assertEqual(archivada, {**detalle, 'fecha_actualizacion': archivada['fecha_actualizacion']})
+        self.assertEqual(self.storage.buscar_solicitudes('monitor'), [])
+
+    def test_estadisticas_incluyen_archivadas(self):
+        antes = self.storage.obtener_estadisticas()
+        call_command('archivar_solicitudes', dias=365, stdout=StringIO())
+
+        self.assertEqual(SolicitudArchivada.objects.count(), 2)
+        self.assertEqual(self.storage.obtener_estadisticas(), antes)
+        self.storage.reconstruir_contadores()
+        self.assertEqual(self.storage.obtener_estadisticas(), antes)
+
+
+class ResumenDiarioTest(TestCase):
+    """El resumen diario se calcula por días modificados y el reporte solo lo lee a él"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.dia = timezone.localdate() - timedelta(days=3)
+        inicio = timezone.make_aware(datetime.combine(self.dia, datetime.min.time()))
+        horas_cierre = {'aprobado': [2, 4, 10], 'rechazado': [6]}
+        for estado, horas in horas_cierre.items():
+            for h in horas:
+                solicitud = self.storage.crear_solicitud({
+                    'titulo': f'Solicitud {estado} {h}',
+                    'descripcion': 'Descripción de prueba',
+                    'solicitante': 'ana.perez',
+                    'responsable': 'carlos.gomez',
+                    'tipo_solicitud': 'acceso',
+                })
+                self.storage._cambiar_estado_solicitud(solicitud['id'], estado, 'carlos.gomez', 'OK')
+                creada = inicio + timedelta(hours=1)
+                SolicitudAprobacion.objects.filter(id=solicitud['id']).update(fecha_creacion=creada)
+                HistorialSolicitud.objects.filter(solicitud_id=solicitud['id'], accion='creada').update(fecha=creada)
+                HistorialSolicitud.objects.filter(solicitud_id=solicitud['id'], accion=estado).update(
+                    fecha=creada + timedelta(hours=h)
+                )
+
+    def test_metricas_por_tipo_y_responsable(self):
+        self.assertEqual(self.storage.actualizar_resumen_diario(), 1)
+
+        por_tipo = ResumenDiario.objects.get(fecha=self.dia, tipo_solicitud='acceso')
+        self.assertEqual(
+            (por_tipo.creadas, por_tipo.aprobadas, por_tipo.rechazadas, por_tipo.canceladas),
+            (4, 3, 1, 0)
+        )
+        self.assertEqual(por_tipo.tiempo_cierre_p50, 5 * 3600)
+        self.assertAlmostEqual(por_tipo.tiempo_cierre_p90, 8.8 * 3600)
+        por_responsable = ResumenDiario.objects.get(fecha=self.dia, responsable='carlos.gomez')
+        self.assertEqual(por_responsable.creadas, 4)
+
+    def test_solo_recalcula_dias_modificados(self):
+        call_command('actualizar_resumen_diario', stdout=StringIO())
+        ResumenDiario.objects.filter(fecha=self.dia).update(creadas=99)
+
+        self.storage.crear_solicitud({
+            'titulo': 'Solicitud de hoy',
+            'descripcion': 'Descripción de prueba',
+            'solicitante': 'ana.perez',
+            'responsable': 'luis.diaz',
+            'tipo_solicitud': 'otro',
+        })
+
+        self.assertEqual(self.storage.actualizar_resumen_diario(), 1)
+        self.assertEqual(ResumenDiario.objects.get(fecha=self.dia, tipo_solicitud='acceso').creadas, 99)
+        self.assertTrue(ResumenDiario.objects.filter(fecha=timezone.localdate(), responsable='luis.diaz').exists())
+
+    def test_completo_conserva_los_dias_archivados(self):
+        # Una pendiente del mismo día mantiene historial después de archivar las cerradas
+        pendiente = self.storage.crear_solicitud({
+            'titulo': 'Solicitud pendiente',
+            'descripcion': 'Descripción de prueba',
+            'solicitante': 'ana.perez',
+            'responsable': 'carlos.gomez',
+            'tipo_solicitud': 'acceso',
+        })
+        creada = timezone.make_aware(datetime.combine(self.dia, datetime.min.time())) + timedelta(hours=1)
+        HistorialSolicitud.objects.filter(solicitud_id=pendiente['id']).update(fecha=creada)
+        self.storage.actualizar_resumen_diario()
+        self.assertEqual(self.storage.archivar_solicitudes(dias=0), 4)
+        self.storage.crear_solicitud({
+            'titulo': 'Solicitud de hoy',
+            'descripcion': 'Descripción de prueba',
+            'solicitante': 'ana.perez',
+            'responsable': 'luis.diaz',
+            'tipo_solicitud': 'otro',
+        })
+
+        # Solo hoy, que no tenía filas; el día con archivadas no se recalcula
+        self.assertEqual(self.storage.actualizar_resumen_diario(completo=True), 1)
+        por_tipo = ResumenDiario.objects.get(fecha=self.dia, tipo_solicitud='acceso')
+        self.assertEqual((por_tipo.creadas, por_tipo.aprobadas, por_tipo.rechazadas), (5, 3, 1))
+
+    def test_reporte_lee_solo_el_resumen(self):
+        self.storage.actualizar_resumen_diario()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('reporte_resumen_diario'), {'agrupar': 'responsable'})
+
+        dias = response.json()['dias']
+        self.assertEqual([(d['fecha'], d['responsable'], d['aprobadas']) for d in dias],
+                         [(self.dia.isoformat(), 'carlos.gomez', 3)])
+        self.assertEqual(self.client.get(reverse('reporte_resumen_diario'), {'agrupar': 'x'}).status_code, 400)
+
+
+@override_settings(APROBACIONES_SERIE_CACHE_LOCAL=True)
+class SerieTemporalTest(TestCase):
+    """Los periodos cerrados salen de la caché; el periodo en curso siempre se recalcula"""
+
+    def setUp(self):
+        cache.clear()
+        self.storage = SolicitudStorageService()
+        self.hoy = timezone.localdate()
+        self.ayer = self.hoy - timedelta(days=1)
+        ahora = timezone.now()
+        crear_solicitudes(2)
+        crear_solicitudes(3, estado='aprobado', tipo_solicitud='despliegue')
+        SolicitudAprobacion.objects.filter(estado='aprobado').update(fecha_creacion=ahora - timedelta(days=1))
+
+    def _serie(self, **params):
+        params = {'desde': self.ayer.isoformat(), 'hasta': self.hoy.isoformat(), **params}
+        response = self.client.get(reverse('serie_temporal'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['serie']
+
+    def test_conteos_por_periodo(self):
+        serie = self._serie()
+
+        self.assertEqual([p['inicio'] for p in serie], [self.ayer.isoformat(), self.hoy.isoformat()])
+        self.assertEqual(serie[0]['por_estado'], {'aprobado': 3})
+        self.assertEqual(serie[0]['por_tipo'], {'despliegue': 3})
+        self.assertEqual(serie[1]['total'], 2)
+        mes = self._serie(intervalo='mes', desde=self.ayer.replace(day=1).isoformat())
+        self.assertEqual(sum(p['total'] for p in mes), 5)
+
+    def test_periodos_cerrados_en_cache(self):
+        self._serie()
+
+        with CaptureQueriesContext(connection) as consultas:
+            serie = self._serie()
+        # Solo el día en curso: una consulta por tabla (activas y archivadas)
+        self.assertEqual(len(consultas), 2)
+        self.assertEqual(serie[0]['total'], 3)
+
+    def test_cambio_de_estado_invalida_su_periodo(self):
+        antigua = SolicitudAprobacion.objects.filter(estado='pendiente').first()
+        SolicitudAprobacion.objects.filter(id=antigua.id).update(fecha_creacion=timezone.now() - timedelta(days=1))
+        self._serie()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.rechazar_solicitud(str(antigua.id), 'carlos.gomez', 'No aplica')
+
+        self.assertEqual(self._serie()[0]['por_estado'], {'aprobado': 3, 'rechazado': 1})
+
+    @override_settings(APROBACIONES_SERIE_CACHE_LOCAL=False)
+    def test_sin_cache_compartida_no_se_cachea(self):
+        self._serie()
+
+        with CaptureQueriesContext(connection) as consultas:
+            serie = self._serie()
+        # LocMemCache no es compartida entre workers: todo se cuenta en la base
+        self.assertEqual(len(consultas), 2)
+        self.assertEqual(cache.get_many([f'aprobaciones:serie:dia:{self.ayer.isoformat()}']), {})
+        self.assertEqual(serie[0]['total'], 3)
+
+    def test_rangos_no_soportados(self):
+        url = reverse('serie_temporal')
+        for params in (
+            {'desde': '0001-01-01', 'hasta': self.hoy.isoformat()},
+            {'intervalo': 'mes', 'desde': '9999-11-01', 'hasta': '9999-12-31'},
+        ):
+            with self.assertNumQueries(0):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400)
+
+
+class RespuestasCondicionalesTest(TestCase):
+    """Un GET condicional sin cambios se responde con 304 desde una sola consulta"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.solicitud = crear_solicitud_grafana(self.storage)
+        self.url_detalle = reverse('detalle_solicitud', args=[self.solicitud['id']])
+
+    def test_detalle_sin_cambios_responde_304(self):
+        response = self.client.get(self.url_detalle)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url_detalle, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_detalle_cambia_con_un_comentario(self):
+        etag = self.client.get(self.url_detalle)['ETag']
+
+        self.storage._cambiar_estado_solicitud(self.solicitud['id'], 'en_revision', 'luis.diaz', 'Reviso')
+
+        response = self.client.get(self.url_detalle, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_listado_y_dashboard_usan_sello_de_version(self):
+        for nombre in ('dashboard', 'listar_solicitudes'):
+            etag = self.client.get(reverse(nombre))['ETag']
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(reverse(nombre), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        etag = self.client.get(reverse('listar_solicitudes'))['ETag']
+        self.storage.aprobar_solicitud(self.solicitud['id'], 'carlos.gomez', 'OK')
+        self.assertEqual(
+            self.client.get(reverse('listar_solicitudes'), HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_borrar_o_archivar_cambia_el_sello(self):
+        otra = crear_solicitudes(1)[0]
+        self.storage.aprobar_solicitud(self.solicitud['id'], 'carlos.gomez', 'OK')
+        # Ninguno de los dos toca fecha_actualizacion de las solicitudes que quedan
+        for cambio in (
+            lambda: SolicitudAprobacion.objects.filter(id=otra.id).delete(),
+            lambda: self.assertEqual(self.storage.archivar_solicitudes(dias=0), 1),
+        ):
+            etag = self.client.get(reverse('listar_solicitudes'))['ETag']
+            cambio()
+            self.assertEqual(
+                self.client.get(reverse('listar_solicitudes'), HTTP_IF_NONE_MATCH=etag).status_code, 200
+            )
+
+
+class ApiLecturaTest(TestCase):
+    """La API lee solo las columnas pedidas y las relaciones solo cuando se incluyen"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.solicitud = crear_solicitud_grafana(self.storage)
+        self.storage._cambiar_estado_solicitud(self.solicitud['id'], 'en_revision', 'luis.diaz', 'Reviso')
+        crear_solicitudes(4)
+
+    def test_campos_pedidos_y_paginacion(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('api_solicitudes'), {'fields': 'titulo,estado', 'limite': 3})
+
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('"descripcion"', consultas[0]['sql'])
+        datos = response.json()
+        self.assertEqual(list(datos['resultados'][0]), ['titulo', 'estado'])
+
+        siguiente = self.client.get(
+            reverse('api_solicitudes'), {'fields': 'id', 'limite': 3, 'cursor': datos['siguiente_cursor']}
+        ).json()
+        self.assertEqual(len(siguiente['resultados']), 2)
+        self.assertIsNone(siguiente['siguiente_cursor'])
+
+    def test_relaciones_incluidas_con_una_consulta_cada_una(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse('api_solicitudes'), {'fields': 'id', 'include': 'historial,comentarios'}
+            )
+
+        por_id = {fila['id']: fila for fila in response.json()['resultados']}
+        fila = por_id[self.solicitud['id']]
+        self.assertEqual([h['accion'] for h in fila['historial']], ['creada', 'en_revision'])
+        self.assertEqual([c['comentario'] for c in fila['comentarios']], ['Reviso'])
+
+    def test_detalle_y_errores(self):
+        url = reverse('api_detalle_solicitud', args=[self.solicitud['id']])
+        detalle = self.client.get(url, {'fields': 'titulo,num_comentarios'}).json()
+        self.assertEqual(detalle, {'titulo': 'Acceso a Grafana', 'num_comentarios': 1})
+
+        self.assertEqual(self.client.get(url, {'fields': 'clave'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'include': 'notificaciones'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('api_detalle_solicitud', args=['no-existe'])).status_code, 404
+        )
+
+    def test_limite_fuera_de_rango(self):
+        crear_solicitudes(2)
+        for limite in ('0', '-3'):
+            respuesta = self.client.get(reverse('api_solicitudes'), {'limite': limite, 'fields': 'titulo'})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(len(respuesta.json()['resultados']), 1)
+            self.assertIsNotNone(respuesta.json()['siguiente_cursor'])
+
+        self.assertEqual(SolicitudStorageService()._pagina_api([{'id': 1}], 0), ([], None))
+
+    def test_codificador_sin_orjson(self):
+        url = reverse('api_detalle_solicitud', args=[self.solicitud['id']])
+        esperado = self.client.get(url, {'include': 'historial'}).json()
+
+        with patch('aprobaciones.utils.orjson', None):
+            self.assertEqual(self.client.get(url, {'include': 'historial'}).json(), esperado)
+
+
+class EventosSolicitudesTest(TestCase):
+    """Los cambios confirmados llegan por SSE solo a los suscriptores que filtran por ellos"""
+
+    def test_servicio_publica_al_confirmar(self):
+        storage = SolicitudStorageService()
+        with patch.object(broker, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                solicitud = crear_solicitud_grafana(storage)
+            with self.captureOnCommitCallbacks(execute=True):
+                storage.cambiar_estado_masivo([solicitud['id']], 'aprobado', 'carlos.gomez')
+
+        eventos = [llamada.args[0] for llamada in publicar.call_args_list]
+        self.assertEqual([e['evento'] for e in eventos], ['creada', 'cambio_estado'])
+        self.assertEqual(eventos[1]['estado_anterior'], 'pendiente')
+        self.assertEqual(eventos[1]['responsable'], 'carlos.gomez')
+
+    async def test_flujo_sse_filtrado(self):
+        response = await self.async_client.get(
+            reverse('eventos_solicitudes'), {'responsable': 'carlos.gomez'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        contenido = response.streaming_content
+        self.assertEqual(await anext(contenido), b'retry: 5000\n\n')
+        self.assertEqual(broker.conexiones, 1)
+
+        broker.publicar({'evento': 'creada', 'id': '1', 'responsable': 'luis.diaz'})
+        broker.publicar({'evento': 'creada', 'id': '2', 'responsable': 'carlos.gomez'})
+
+        mensaje = (await asyncio.wait_for(anext(contenido), 1)).decode()
+        self.assertTrue(mensaje.startswith('event: creada\n'))
+        self.assertEqual(json.loads(mensaje.split('data: ')[1])['id'], '2')
+
+        # Al desconectarse el cliente el servidor cancela la tarea y se libera la suscripción
+        lectura = asyncio.ensure_future(anext(contenido))
+        await asyncio.sleep(0)
+        lectura.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await lectura
+        self.assertEqual(broker.conexiones, 0)
+
+
+@patch('aprobaciones.services.FEED_MARGEN', timedelta(0))
+class FeedCambiosTest(TestCase):
+    """El feed entrega solo lo modificado después del cursor y el cursor nunca retrocede"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.ids = [
+            self.storage.crear_solicitud({
+                'titulo': titulo,
+                'descripcion': 'Descripción de prueba',
+                'solicitante': 'ana.perez',
+                'responsable': 'carlos.gomez',
+                'tipo_solicitud': 'acceso',
+            })['id']
+            for titulo in ('Acceso a Grafana', 'Compra de monitor', 'Vacaciones')
+        ]
+
+    def _leer(self, cursor=None, limite=100):
+        params = {'limite': limite}
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(reverse('api_cambios'), params).json()
+
+    def test_solo_deltas(self):
+        primera = self._leer(limite=2)
+        self.assertTrue(primera['hay_mas'])
+        segunda = self._leer(primera['siguiente_cursor'])
+        self.assertEqual(
+            [c['id'] for c in primera['cambios'] + segunda['cambios']], self.ids
+        )
+        self.assertFalse(segunda['hay_mas'])
+
+        vacia = self._leer(segunda['siguiente_cursor'])
+        self.assertEqual(vacia['cambios'], [])
+        self.assertEqual(vacia['siguiente_cursor'], segunda['siguiente_cursor'])
+
+        self.storage.aprobar_solicitud(self.ids[0], 'carlos.gomez', 'OK')
+
+        cambios = self._leer(vacia['siguiente_cursor'])['cambios']
+        self.assertEqual([(c['id'], c['estado']) for c in cambios], [(self.ids[0], 'aprobado')])
+        # Solo la entrada de historial nueva, no la de creación ya entregada
+        self.assertEqual([h['accion'] for h in cambios[0]['historial']], ['aprobado'])
+
+    def _recorrer(self, cursor, limite):
+        cambios = []
+        while True:
+            pagina = self._leer(cursor, limite=limite)
+            cambios.extend(pagina['cambios'])
+            cursor = pagina['siguiente_cursor']
+            if not pagina['hay_mas']:
+                return cambios, cursor
+
+    def test_pagina_en_medio_de_un_cambio_masivo(self):
+        self.ids += [
+            crear_solicitud_grafana(self.storage, titulo=f'Acceso {i}')['id'] for i in range(3)
+        ]
+        _, cursor = self._recorrer(None, limite=100)
+
+        # Todas las filas quedan con la misma fecha_actualizacion
+        self.storage.cambiar_estado_masivo(self.ids, 'aprobado', 'carlos.gomez')
+        cambios, _ = self._recorrer(cursor, limite=2)
+
+        self.assertEqual(sorted(c['id'] for c in cambios), sorted(self.ids))
+        self.assertEqual([[h['accion'] for h in c['historial']] for c in cambios], [['aprobado']] * 6)
+
+    def test_pagina_en_medio_de_una_importacion(self):
+        _, cursor = self._recorrer(None, limite=100)
+        lineas = [
+            json.dumps({
+                'titulo': f'Acceso a Kibana {i}', 'descripcion': 'Necesito acceso de lectura',
+                'solicitante': 'ana.perez', 'responsable': 'carlos.gomez',
+                'tipo_solicitud': 'acceso',
+            }) + '\n'
+            for i in range(5)
+        ]
+        self.storage.importar_solicitudes(lineas, formato='jsonl')
+
+        cambios, _ = self._recorrer(cursor, limite=2)
+
+        self.assertEqual(len(cambios), 5)
+        self.assertEqual([[h['accion'] for h in c['historial']] for c in cambios], [['creada']] * 5)
+
+    def test_limite_no_positivo_avanza(self):
+        for limite in (0, -1):
+            pagina = self._leer(limite=limite)
+            self.assertEqual([c['id'] for c in pagina['cambios']], self.ids[:1])
+            self.assertTrue(pagina['hay_mas'])
+            self.assertIsNotNone(pagina['siguiente_cursor'])
+
+        pagina = self.storage.obtener_cambios(limite=-1)
+        self.assertEqual(len(pagina['cambios']), 1)
+        self.assertIsNotNone(pagina['siguiente_cursor'])
+
+    def test_margen_para_transacciones_lentas(self):
+        with patch('aprobaciones.services.FEED_MARGEN', timedelta(hours=1)):
+            self.assertEqual(self._leer()['cambios'], [])
+
+
+class ServicioAsyncTest(TestCase):
+    """Las variantes async del servicio devuelven lo mismo que las síncronas"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        crear_solicitudes(3, responsable='maria.ruiz')
+        self.solicitud = crear_solicitud_grafana(self.storage)
+
+    async def test_lecturas_async(self):
+        storage = self.storage
+        self.assertEqual(
+            await storage.aobtener_solicitud_por_id(self.solicitud['id']),
+            await sync_to_async(storage.obtener_solicitud_por_id)(self.solicitud['id'])
+        )
+        self.assertIsNone(await storage.aobtener_solicitud_por_id('00000000-0000-0000-0000-000000000000'))
+        self.assertEqual(
+            await storage.aobtener_pagina_solicitudes(tamano_pagina=2),
+            await sync_to_async(storage.obtener_pagina_solicitudes)(tamano_pagina=2)
+        )
+        self.assertEqual(
+            await storage.aobtener_version_solicitudes(),
+            await sync_to_async(storage.obtener_version_solicitudes)()
+        )
+        self.assertEqual((await storage.aobtener_estadisticas())['pendientes'], 1)
+        pagina = await storage.alistar_solicitudes_api(campos=['titulo'], incluir=['historial'], tamano_pagina=1)
+        self.assertEqual(pagina['resultados'][0]['historial'][0]['accion'], 'creada')
+
+    async def test_escrituras_async(self):
+        resultado = await self.storage.aaprobar_solicitud(self.solicitud['id'], 'carlos.gomez', 'OK')
+        self.assertEqual(resultado['estado'], 'aprobado')
+
+    async def test_vistas_html_async(self):
+        for url in (
+            reverse('dashboard'),
+            reverse('listar_solicitudes'),
+            reverse('detalle_solicitud', args=[self.solicitud['id']]),
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_detalle_async_con_id_mal_formado(self):
+        self.assertIsNone(await self.storage.aobtener_solicitud_por_id('no-es-un-uuid'))
+
+        response = await self.async_client.get(reverse('detalle_solicitud', args=['no-es-un-uuid']))
+        # Igual que un ID inexistente: vuelve al dashboard con el mensaje de error
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+
+class ComparacionWsgiAsgiTest(TransactionTestCase):
+    """Las peticiones concurrentes usan sus propias conexiones: los datos deben estar confirmados"""
+    databases = BASES_PRUEBA
+
+    def test_comparacion_wsgi_asgi(self):
+        crear_solicitudes(3)
+        salida = StringIO()
+        call_command('comparar_wsgi_asgi', peticiones=4, concurrencia=2, stdout=salida)
+
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual([linea.split(':')[0] for linea in lineas], ['WSGI', 'ASGI'])
+        self.assertTrue(all('0 errores' in linea for linea in lineas))
+
+
+@override_settings(APROBACIONES_REPLICAS=REPLICAS_ROUTER)
+class RouterReplicaTest(TransactionTestCase):
+    """
+    Las réplicas son espejos de la base de pruebas, así que se ve a qué conexión va
+    cada consulta. Sin réplicas configuradas se registra REPLICA_LOCAL, un segundo
+    alias sobre la misma base de pruebas (lo mismo que hace TEST MIRROR).
+    TransactionTestCase porque dentro de una transacción abierta el router siempre
+    lee de la principal.
+    """
+    databases = BASES_PRUEBA
+
+    @classmethod
+    def setUpClass(cls):
+        # Antes de super(), que valida `databases` contra las conexiones existentes.
+        # El runner arma la base de pruebas antes, por eso el alias no va en la clase
+        if not REPLICAS_PRUEBA:
+            connections.settings[REPLICA_LOCAL] = dict(
+                connections['default'].settings_dict, TEST={'MIRROR': 'default'}
+            )
+            cls.addClassCleanup(cls._quitar_replica_local)
+            cls.databases = {'default', REPLICA_LOCAL}
+        super().setUpClass()
+
+    @staticmethod
+    def _quitar_replica_local():
+        connections[REPLICA_LOCAL].close()
+        del connections[REPLICA_LOCAL]
+        del connections.settings[REPLICA_LOCAL]
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.solicitud = crear_solicitud_grafana(self.storage)
+
+    def _consultas_por_base(self, funcion):
+        """Ejecutar funcion y contar las consultas hechas en cada alias"""
+        with ExitStack() as pila:
+            capturas = {
+                alias: pila.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in self.databases
+            }
+            resultado = funcion()
+        principal = len(capturas.pop('default'))
+        return resultado, principal, sum(len(captura) for captura in capturas.values())
+
+    def test_lecturas_a_replica_y_escrituras_a_principal(self):
+        solicitud, principal, replicas = self._consultas_por_base(
+            lambda: self.storage.obtener_solicitud_por_id(self.solicitud['id'])
+        )
+        self.assertEqual(solicitud['estado'], 'pendiente')
+        self.assertEqual(principal, 0)
+        self.assertGreater(replicas, 0)
+
+        # Las transiciones leen y escriben en la principal
+        _, principal, replicas = self._consultas_por_base(
+            lambda: self.storage.aprobar_solicitud(self.solicitud['id'], 'carlos.gomez', 'OK')
+        )
+        self.assertGreater(principal, 0)
+        self.assertEqual(replicas, 0)
+
+        with leer_de_primaria():
+            _, principal, replicas = self._consultas_por_base(
+                lambda: self.storage.obtener_solicitud_por_id(self.solicitud['id'])
+            )
+        self.assertEqual(replicas, 0)
+
+    def test_leer_lo_escrito_tras_un_post(self):
+        url = reverse('detalle_solicitud', args=[self.solicitud['id']])
+        _, principal, replicas = self._consultas_por_base(lambda: self.client.get(url))
+        self.assertGreater(replicas, 0)
+
+        response = self.client.post(
+            reverse('rechazar_solicitud', args=[self.solicitud['id']]),
+            {'comentario': 'No aplica'}, content_type='application/json'
+        )
+        self.assertIn(COOKIE_PIN_PRIMARIA, response.cookies)
+
+        response, principal, replicas = self._consultas_por_base(lambda: self.client.get(url))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['solicitud']['estado'], 'rechazado')
+        self.assertEqual(replicas, 0)
+
+    def test_las_replicas_no_se_migran(self):
+        for alias in REPLICAS_ROUTER:
+            self.assertFalse(router.allow_migrate(alias, 'aprobaciones', model_name='solicitudaprobacion'))
+        self.assertTrue(router.allow_migrate('default', 'aprobaciones', model_name='solicitudaprobacion'))
+
+
+class DiagnosticoConexionesTest(TestCase):
+    """El diagnóstico informa conexiones persistentes o las estadísticas del pool"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('operador', is_staff=True))
+
+    def test_solo_staff_o_debug(self):
+        self.client.logout()
+        url = reverse('diagnostico_conexiones')
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertFalse(respuesta.json()['success'])
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_conexiones_persistentes(self):
+        conexiones = self.client.get(reverse('diagnostico_conexiones')).json()['conexiones']
+
+        principal = next(c for c in conexiones if c['alias'] == 'default')
+        self.assertGreaterEqual(principal['en_uso'], 1)
+        self.assertGreaterEqual(principal['creadas'], principal['en_uso'])
+        self.assertEqual(principal['esperando'], 0)
+
+    def test_estadisticas_del_pool(self):
+        class PoolFalso:
+            def get_stats(self):
+                return {'pool_size': 5, 'pool_available': 2, 'requests_waiting': 3, 'connections_num': 9}
+
+        with patch.object(type(connections['default']), 'pool', PoolFalso(), create=True):
+            conexiones = self.client.get(reverse('diagnostico_conexiones')).json()['conexiones']
+
+        principal = next(c for c in conexiones if c['alias'] == 'default')
+        claves = ('modo', 'en_uso', 'esperando', 'creadas', 'recicladas')
+        self.assertEqual([principal[clave] for clave in claves], ['pool', 3, 3, 9, 4])
+
+
+class MedicionPeticionTest(TestCase):
+    """Las peticiones muestreadas informan consultas y tiempos y marcan las que exceden el presupuesto"""
+
+    def test_cabecera_y_log_de_la_peticion(self):
+        with patch('aprobaciones.middleware.MUESTREO_MEDICION', 1.0), \
+                self.assertLogs('aprobaciones.middleware', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('dashboard'))
+
+        self.assertRegex(
+            respuesta['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ consultas", tpl;dur=[\d.]+, total;dur='
+        )
+        datos = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(datos['vista'], 'dashboard')
+        self.assertEqual(datos['consultas'], len(consultas))
+        self.assertGreater(datos['plantillas_ms'], 0)
+        self.assertEqual(datos['excede'], [])
+
+    def test_vista_async_y_presupuesto_excedido(self):
+        SolicitudStorageService().crear_solicitud({
+            'titulo': 'Licencias de diseño',
+            'descripcion': 'Renovar licencias del equipo',
+            'solicitante': 'ana.perez',
+            'responsable': 'carlos.gomez',
+            'tipo_solicitud': 'compra',
+        })
+        with patch('aprobaciones.middleware.MUESTREO_MEDICION', 1.0), \
+                patch('aprobaciones.middleware.PRESUPUESTO_CONSULTAS', 0), \
+                self.assertLogs('aprobaciones.middleware', 'INFO') as logs:
+            self.client.get(reverse('api_solicitudes'))
+
+        datos = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertGreater(datos['consultas'], 0)
+        self.assertEqual(datos['excede'], ['consultas'])
+
+    def test_fuera_de_la_muestra_no_se_mide(self):
+        with patch('aprobaciones.middleware.MUESTREO_MEDICION', 0.0):
+            respuesta = self.client.get(reverse('dashboard'))
+
+        self.assertNotIn('Server-Timing', respuesta)
+
+
+class MetricasPrometheusTest(TestCase):
+    """El endpoint expone peticiones, latencias, transiciones, notificaciones y pendientes"""
+
+    def setUp(self):
+        self.storage = SolicitudStorageService()
+        self.solicitud = self.storage.crear_solicitud({
+            'titulo': 'Despliegue del API',
+            'descripcion': 'Desplegar la versión 2.3 en producción',
+            'solicitante': 'ana.perez',
+            'responsable': 'carlos.gomez',
+            'tipo_solicitud': 'despliegue',
+        })
+        self.storage.crear_solicitud({
+            'titulo': 'Acceso a la VPN',
+            'descripcion': 'Acceso para trabajo remoto',
+            'solicitante': 'ana.perez',
+            'responsable': 'carlos.gomez',
+            'tipo_solicitud': 'acceso',
+        })
+        self.client.force_login(User.objects.create_user('operador', is_staff=True))
+
+    def test_exposicion_de_metricas(self):
+        with patch('aprobaciones.metricas.registro', RegistroMetricas()):
+            self.client.get(reverse('dashboard'))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.storage.aprobar_solicitud(self.solicitud['id'], 'carlos.gomez')
+            NotificacionService().despachar_lote()
+
+            respuesta = self.client.get(reverse('metricas_prometheus'))
+
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = respuesta.content.decode()
+        self.assertIn('# TYPE aprobaciones_peticion_duracion_segundos histogram', texto)
+        self.assertIn('aprobaciones_peticiones_total{estado="200",metodo="GET",vista="dashboard"} 1', texto)
+        self.assertIn('aprobaciones_peticion_duracion_segundos_bucket{vista="dashboard",le="+Inf"} 1', texto)
+        self.assertIn('aprobaciones_peticion_duracion_segundos_count{vista="dashboard"} 1', texto)
+        self.assertIn('aprobaciones_transiciones_total{estado="aprobado",tipo_solicitud="despliegue"} 1', texto)
+        self.assertIn('aprobaciones_notificaciones_total{resultado="enviada"} 3', texto)
+        self.assertIn('aprobaciones_solicitudes_pendientes{responsable="carlos.gomez"} 1', texto)
+
+    def test_metodos_desconocidos_van_a_otro(self):
+        with patch('aprobaciones.metricas.registro', RegistroMetricas()):
+            for metodo in ('PROPFIND', 'XYZ1', 'XYZ2'):
+                self.client.generic(metodo, reverse('dashboard'))
+            texto = self.client.get(reverse('metricas_prometheus')).content.decode()
+
+        self.assertIn('aprobaciones_peticiones_total{estado="200",metodo="otro",vista="dashboard"} 3', texto)
+        self.assertNotIn('PROPFIND', texto)
+
+    @override_settings(APROBACIONES_OPERACION_TOKEN='secreto')
+    def test_requiere_staff_o_token(self):
+        self.client.logout()
+        url = reverse('metricas_prometheus')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+        self.client.force_login(User.objects.create_user('ana.perez'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_check_de_despliegue_sin_directorio(self):
+        with override_settings(APROBACIONES_METRICAS_DIR=None):
+            avisos = checks.run_checks(include_deployment_checks=True)
+        self.assertIn('aprobaciones.W001', [aviso.id for aviso in avisos])
+        with override_settings(APROBACIONES_METRICAS_DIR='/tmp/metricas'):
+            avisos = checks.run_checks(include_deployment_checks=True)
+        self.assertNotIn('aprobaciones.W001', [aviso.id for aviso in avisos])
+
+    def test_registro_suma_los_archivos_de_varios_procesos(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            # Dos registros con el mismo directorio equivalen a dos workers
+            primero = RegistroMetricas(directorio, intervalo=0)
+            segundo = RegistroMetricas(directorio, intervalo=3600)
+            primero.incrementar('aprobaciones_notificaciones_total', 2, resultado='enviada')
+            segundo.incrementar('aprobaciones_notificaciones_total', resultado='enviada')
+            segundo.observar('aprobaciones_peticion_duracion_segundos', 0.2, vista='dashboard')
+            # El segundo aún no cumple su intervalo: lo suyo no se ve hasta que vuelca
+            self.assertEqual(len(primero.valores()), 1)
+            segundo.volcar()
+
+            valores = primero.valores()
+
+        self.assertEqual(len(valores), 15)
+        clave = (
+            'aprobaciones_notificaciones_total', 'aprobaciones_notificaciones_total', (('resultado', 'enviada'),)
+        )
+        self.assertEqual(valores[clave], 3)
+        bucket = (
+            'aprobaciones_peticion_duracion_segundos', 'aprobaciones_peticion_duracion_segundos_bucket',
+            (('vista', 'dashboard'), ('le', '0.25'))
+        )
+        self.assertEqual(valores[bucket], 1)
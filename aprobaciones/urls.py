@@ -11,10 +11,24 @@ urlpatterns = [
     # Gestión de solicitudes
     path('crear/', views.crear_solicitud, name='crear_solicitud'),
     path('listar/', views.listar_solicitudes, name='listar_solicitudes'),
+    path('buscar/', views.buscar_solicitudes, name='buscar_solicitudes'),
+    path('exportar/', views.exportar_solicitudes, name='exportar_solicitudes'),
+    path('importar/', views.importar_solicitudes, name='importar_solicitudes'),
+    path('reportes/resumen-diario/', views.reporte_resumen_diario, name='reporte_resumen_diario'),
+    path('reportes/serie/', views.serie_temporal, name='serie_temporal'),
+    path('eventos/', views.eventos_solicitudes, name='eventos_solicitudes'),
+    path('diagnostico/conexiones/', views.diagnostico_conexiones, name='diagnostico_conexiones'),
+    path('metricas/', views.metricas_prometheus, name='metricas_prometheus'),
     path('solicitud/<str:solicitud_id>/', views.detalle_solicitud, name='detalle_solicitud'),
     
     # Acciones de aprobación/rechazo
     path('solicitud/<str:solicitud_id>/aprobar/', views.aprobar_solicitud, name='aprobar_solicitud'),
     path('solicitud/<str:solicitud_id>/rechazar/', views.rechazar_solicitud, name='rechazar_solicitud'),
     path('solicitud/<str:solicitud_id>/cambiar-estado/', views.cambiar_estado_solicitud, name='cambiar_estado_solicitud'),
+    path('solicitudes/cambiar-estado-masivo/', views.cambiar_estado_masivo, name='cambiar_estado_masivo'),
+    
+    # API de lectura
+    path('api/solicitudes/', views.api_solicitudes, name='api_solicitudes'),
+    path('api/solicitudes/<str:solicitud_id>/', views.api_detalle_solicitud, name='api_detalle_solicitud'),
+    path('api/cambios/', views.api_cambios, name='api_cambios'),
 ]
\ No newline at end of file
@@ -1,4 +1,6 @@
 import uuid
+import json
+import base64
 from datetime import datetime
 from django.core.mail import send_mail
 from django.conf import settings
@@ -7,6 +9,12 @@ from .constants import (
     ICONOS_ESTADO, ESTADOS_SOLICITUD
 )
 
+# orjson es opcional: si no está instalado se usa json de la librería estándar
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 #utils.py
 
 def generar_id_solicitud():
@@ -17,35 +25,6 @@ def obtener_timestamp():
     """Obtiene timestamp actual formateado"""
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def enviar_notificacion_email(destinatario, asunto, mensaje, solicitud_data=None):
-    """
-    Envía notificación por email (simulado por ahora)
-    En producción, aquí implementaríamos el envío real
-    """
-    try:
-        # Por ahora solo logeamos la notificación
-        print(f"[NOTIFICACIÓN EMAIL]")
-        print(f"Para: {destinatario}")
-        print(f"Asunto: {asunto}")
-        print(f"Mensaje: {mensaje}")
-        if solicitud_data:
-            print(f"Datos de solicitud: {solicitud_data}")
-        print("-" * 50)
-        
-        # En producción, descomenta esto:
-        # send_mail(
-        #     asunto,
-        #     mensaje,
-        #     settings.DEFAULT_FROM_EMAIL,
-        #     [destinatario],
-        #     fail_silently=False,
-        # )
-        
-        return True
-    except Exception as e:
-        print(f"Error enviando notificación: {e}")
-        return False
-
 def validar_usuario_red(usuario):
     """
     Valida formato de usuario de red
@@ -99,6 +78,22 @@ Título: {solicitud_data.get('titulo', 'N/A')}
 Puedes proceder con la implementación.
         """,
         
+        'nuevas_solicitudes': f"""
+Recibiste {len(solicitud_data.get('solicitudes', []))} nuevas solicitudes de aprobación:
+
+{chr(10).join(f"- {s['titulo']} ({s['id']}) de {s.get('solicitante', 'N/A')}" for s in solicitud_data.get('solicitudes', []))}
+
+Por favor, revisa y procesa estas solicitudes.
+        """,
+        
+        'cambio_masivo': f"""
+Se actualizaron {len(solicitud_data.get('solicitudes', []))} de tus solicitudes al estado '{solicitud_data.get('estado', 'N/A')}':
+
+{chr(10).join(f"- {s['titulo']} ({s['id']})" for s in solicitud_data.get('solicitudes', []))}
+
+Puedes revisar el detalle de cada una en el portal de aprobaciones.
+        """,
+        
         'solicitud_rechazada': f"""
 Tu solicitud ha sido rechazada:
 
@@ -136,6 +131,22 @@ def validar_cambio_estado(estado_actual, estado_nuevo):
     
     return True, "Cambio de estado válido"
 
+def obtener_estados_origen(estado_nuevo):
+    """Retorna los estados desde los que validar_cambio_estado permite pasar a estado_nuevo"""
+    return [
+        estado for estado, _ in ESTADOS_SOLICITUD
+        if validar_cambio_estado(estado, estado_nuevo)[0]
+    ]
+
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolación lineal sobre una lista ordenada"""
+    if not valores:
+        return None
+    posicion = (len(valores) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicion - inferior)
+
 def formatear_fecha_local(fecha_iso):
     """Convierte fecha ISO a formato local"""
     try:
@@ -174,6 +185,48 @@ def limpiar_descripcion(descripcion):
     
     return descripcion
 
+class BufferLinea:
+    """Objeto tipo archivo que devuelve lo escrito en lugar de guardarlo (para csv.writer)"""
+    
+    def write(self, valor):
+        return valor
+
+def codificar_cursor(fecha, solicitud_id, hacia_atras=False):
+    """Codifica una posición de paginación (fecha_creacion, id) como token opaco"""
+    datos = json.dumps([fecha.isoformat(), str(solicitud_id), hacia_atras])
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+def _valor_json(valor):
+    """Fechas y UUID igual que los serializa orjson"""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def json_rapido(datos):
+    """Serializa a JSON compacto en bytes, con orjson si está disponible"""
+    if orjson is not None:
+        return orjson.dumps(datos)
+    return json.dumps(datos, default=_valor_json, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def decodificar_cursor(cursor):
+    """
+    Decodifica un token de paginación generado por codificar_cursor
+    Retorna (fecha, id, hacia_atras) o None si el token no es válido
+    """
+    if not cursor:
+        return None
+    
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha_iso, solicitud_id, hacia_atras = json.loads(
+            base64.urlsafe_b64decode(cursor + relleno)
+        )
+        return datetime.fromisoformat(fecha_iso), uuid.UUID(solicitud_id), bool(hacia_atras)
+    except (ValueError, TypeError):
+        return None
+
 def obtener_mensaje_sistema(clave, **kwargs):
     """Obtiene un mensaje del sistema con formato"""
     mensaje = MENSAJES.get(clave, f"Mensaje no encontrado: {clave}")
@@ -1,17 +1,102 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse
-from django.core.paginator import Paginator
-from django.views.decorators.http import require_http_methods
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_http_methods, condition
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
+import hmac
+import io
 import json
+import os
+from datetime import date
+from dataclasses import asdict
+from functools import wraps
+from django.conf import settings
+from . import metricas
+from .diagnostico import estadisticas_conexiones
+from .eventos import broker, FILTROS_EVENTOS
 from .forms import SolicitudAprobacionForm
-from .services import SolicitudStorageService
-from .utils import obtener_color_estado, formatear_tipo_solicitud
+from .services import SolicitudStorageService, FORMATOS_EXPORTACION
+from .utils import obtener_color_estado, formatear_tipo_solicitud, json_rapido
 
 #views.py
 
+def _mensajes_pendientes(request):
+    return len(messages.get_messages(request))
+
+def solo_operacion(vista):
+    """
+    Vistas de operación (métricas, diagnóstico): solo usuarios staff o con DEBUG.
+    Un scraper sin sesión se autentica con 'Authorization: Bearer <token>' usando
+    APROBACIONES_OPERACION_TOKEN.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        token = getattr(settings, 'APROBACIONES_OPERACION_TOKEN', None)
+        autorizacion = request.headers.get('Authorization', '')
+        permitido = (
+            settings.DEBUG
+            or request.user.is_staff
+            or (token and hmac.compare_digest(autorizacion.encode(), f'Bearer {token}'.encode()))
+        )
+        if not permitido:
+            return JsonResponse({'success': False, 'message': 'No autorizado'}, status=403)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+def _precalcular_validador(validador):
+    """
+    Para vistas async con condition(), que llama a sus funciones de forma síncrona:
+    el validador se obtiene antes con el ORM async (una sola consulta para el ETag y
+    la fecha de modificación) y queda en la petición; ver _validador.
+    Si hay mensajes pendientes se omite la validación para que se muestren.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        async def envoltura(request, *args, **kwargs):
+            pendientes = await sync_to_async(_mensajes_pendientes)(request)
+            request._validador = None if pendientes else await validador(request, *args, **kwargs)
+            return await vista(request, *args, **kwargs)
+        return envoltura
+    return decorador
+
+def _validador(request, *args, **kwargs):
+    return request._validador
+
+async def _version_solicitud(request, solicitud_id):
+    return await SolicitudStorageService().aobtener_version_solicitud(solicitud_id)
+
+async def _version_solicitudes(request):
+    return await SolicitudStorageService().aobtener_version_solicitudes()
+
+def _etag_solicitud(request, *args, **kwargs):
+    """ETag a partir de la fecha de modificación (con microsegundos)"""
+    version = _validador(request)
+    return f"{version.timestamp():.6f}" if version else None
+
+def _etag_solicitudes(request):
+    """
+    ETag del conjunto: última modificación y cantidad, que cambia al borrar o archivar.
+    Estas vistas no envían Last-Modified porque la fecha sola no refleja esos cambios.
+    """
+    version = _validador(request)
+    if version is None:
+        return None
+    ultima, cantidad = version
+    return f"{ultima.timestamp() if ultima else 0:.6f}-{cantidad}"
+
+# El navegador puede guardar la página pero debe revalidarla en cada uso
+sin_cache_privada = cache_control(private=True, no_cache=True)
+
+async def _render(request, plantilla, contexto):
+    """
+    render() para vistas async: los context processors leen la sesión y el usuario
+    (consultas síncronas), así que el render corre en el hilo de sync_to_async
+    """
+    return await sync_to_async(render)(request, plantilla, contexto)
+
 def crear_solicitud(request):
     """Vista para crear una nueva solicitud de aprobación"""
     storage = SolicitudStorageService()
@@ -56,49 +141,32 @@ def crear_solicitud(request):
         'titulo_pagina': 'Crear Solicitud de Aprobación'
     })
 
-def dashboard(request):
+@sin_cache_privada
+@_precalcular_validador(_version_solicitudes)
+@condition(etag_func=_etag_solicitudes)
+async def dashboard(request):
     """Vista principal del dashboard"""
     storage = SolicitudStorageService()
     
     # Obtener estadísticas
-    estadisticas = storage.obtener_estadisticas()
+    estadisticas = await storage.aobtener_estadisticas()
     
     # Obtener solicitudes recientes (últimas 10)
-    todas_solicitudes = storage.obtener_todas_solicitudes()
-    
-    # Ordenar por fecha de creación (más recientes primero)
-    solicitudes_ordenadas = sorted(
-        todas_solicitudes, 
-        key=lambda x: x['fecha_creacion'], 
-        reverse=True
-    )
-    
-    # Tomar las 10 más recientes para el dashboard
-    solicitudes_recientes = solicitudes_ordenadas[:10]
+    solicitudes_recientes = await storage.aobtener_solicitudes_recientes(limite=10)
     
-    # Agregar información adicional a cada solicitud
-    for solicitud in solicitudes_recientes:
-        solicitud['color_estado'] = obtener_color_estado(solicitud['estado'])
-        solicitud['tipo_formateado'] = formatear_tipo_solicitud(solicitud['tipo_solicitud'])
-        
-        # Formatear fecha
-        from datetime import datetime
-        try:
-            fecha = datetime.fromisoformat(solicitud['fecha_creacion'].replace('Z', '+00:00'))
-            solicitud['fecha_formateada'] = fecha.strftime('%d/%m/%Y %H:%M')
-        except:
-            solicitud['fecha_formateada'] = 'Fecha no disponible'
-    
-    return render(request, 'aprobaciones/dashboard.html', {
+    return await _render(request, 'aprobaciones/dashboard.html', {
         'titulo_pagina': 'Dashboard - Sistema de Aprobaciones',
         'estadisticas': estadisticas,
         'solicitudes_recientes': solicitudes_recientes
     })
 
-def detalle_solicitud(request, solicitud_id):
+@sin_cache_privada
+@_precalcular_validador(_version_solicitud)
+@condition(etag_func=_etag_solicitud, last_modified_func=_validador)
+async def detalle_solicitud(request, solicitud_id):
     """Vista para ver el detalle de una solicitud"""
     storage = SolicitudStorageService()
-    solicitud = storage.obtener_solicitud_por_id(solicitud_id)
+    solicitud = await storage.aobtener_solicitud_por_id(solicitud_id)
     
     if not solicitud:
         messages.error(request, 'La solicitud solicitada no fue encontrada')
@@ -117,61 +185,174 @@ def detalle_solicitud(request, solicitud_id):
         except:
             entrada['fecha_formateada'] = 'Fecha no disponible'
     
-    return render(request, 'aprobaciones/detalle_solicitud.html', {
+    return await _render(request, 'aprobaciones/detalle_solicitud.html', {
         'titulo_pagina': f'Solicitud - {solicitud["titulo"]}',
         'solicitud': solicitud
     })
 
-def listar_solicitudes(request):
+@sin_cache_privada
+@_precalcular_validador(_version_solicitudes)
+@condition(etag_func=_etag_solicitudes)
+async def listar_solicitudes(request):
     """Vista para listar todas las solicitudes con filtros"""
     storage = SolicitudStorageService()
     
-    # Obtener todas las solicitudes
-    todas_solicitudes = storage.obtener_todas_solicitudes()
-    
     # Filtros
     estado_filtro = request.GET.get('estado', '')
     tipo_filtro = request.GET.get('tipo', '')
     
-    solicitudes_filtradas = todas_solicitudes
+    # Paginación por cursor: filtrado y orden se resuelven en la base de datos
+    pagina = await storage.aobtener_pagina_solicitudes(
+        estado=estado_filtro,
+        tipo=tipo_filtro,
+        cursor=request.GET.get('cursor'),
+        tamano_pagina=10
+    )
+    
+    return await _render(request, 'aprobaciones/listar_solicitudes.html', {
+        'titulo_pagina': 'Todas las Solicitudes',
+        'solicitudes': pagina['solicitudes'],
+        'siguiente_cursor': pagina['siguiente_cursor'],
+        'anterior_cursor': pagina['anterior_cursor'],
+        'estado_filtro': estado_filtro,
+        'tipo_filtro': tipo_filtro
+    })
+
+@require_http_methods(["GET"])
+def buscar_solicitudes(request):
+    """Vista de búsqueda de texto completo; retorna resultados ordenados por relevancia"""
+    storage = SolicitudStorageService()
+    
+    texto = request.GET.get('q', '').strip()
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 20)), 100))
+    except ValueError:
+        limite = 20
     
-    if estado_filtro:
-        solicitudes_filtradas = [s for s in solicitudes_filtradas if s['estado'] == estado_filtro]
+    resultados = storage.buscar_solicitudes(texto, limite=limite)
     
-    if tipo_filtro:
-        solicitudes_filtradas = [s for s in solicitudes_filtradas if s['tipo_solicitud'] == tipo_filtro]
+    return JsonResponse({
+        'success': True,
+        'query': texto,
+        'resultados': [
+            dict(asdict(resultado), color_estado=resultado.color_estado,
+                 tipo_formateado=resultado.tipo_formateado)
+            for resultado in resultados
+        ]
+    })
+
+@require_http_methods(["GET"])
+def exportar_solicitudes(request):
+    """Vista para descargar las solicitudes en CSV o JSON Lines (respuesta en streaming)"""
+    storage = SolicitudStorageService()
     
-    # Ordenar por fecha de creación (más recientes primero)
-    solicitudes_filtradas = sorted(
-        solicitudes_filtradas, 
-        key=lambda x: x['fecha_creacion'], 
-        reverse=True
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return JsonResponse({
+            'success': False,
+            'message': f"Formato '{formato}' no soportado"
+        }, status=400)
+    
+    lineas = storage.exportar_solicitudes(
+        formato=formato,
+        estado=request.GET.get('estado'),
+        tipo=request.GET.get('tipo'),
+        solicitante=request.GET.get('solicitante'),
+        responsable=request.GET.get('responsable')
     )
     
-    # Paginación
-    paginator = Paginator(solicitudes_filtradas, 10)  # 10 por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    content_type = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(lineas, content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="solicitudes.{formato}"'
+    return response
+
+@require_http_methods(["POST"])
+def importar_solicitudes(request):
+    """Vista para crear solicitudes en bloque desde un archivo CSV o JSON Lines"""
+    storage = SolicitudStorageService()
     
-    # Agregar información adicional a cada solicitud
-    for solicitud in page_obj:
-        solicitud['color_estado'] = obtener_color_estado(solicitud['estado'])
-        solicitud['tipo_formateado'] = formatear_tipo_solicitud(solicitud['tipo_solicitud'])
+    try:
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            raise ValueError("Se requiere un archivo")
         
-        # Formatear fecha
-        from datetime import datetime
-        try:
-            fecha = datetime.fromisoformat(solicitud['fecha_creacion'].replace('Z', '+00:00'))
-            solicitud['fecha_formateada'] = fecha.strftime('%d/%m/%Y %H:%M')
-        except:
-            solicitud['fecha_formateada'] = 'Fecha no disponible'
+        extension = os.path.splitext(archivo.name)[1].lstrip('.').lower()
+        formato = request.POST.get('formato') or extension
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValueError(f"Formato '{formato}' no soportado")
+        
+        # Se lee el archivo subido línea a línea sin cargarlo completo en memoria
+        lineas = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+        resultado = storage.importar_solicitudes(lineas, formato=formato)
+        
+        return JsonResponse({
+            'success': True,
+            'message': f'{resultado["creadas"]} solicitudes importadas',
+            'creadas': resultado['creadas'],
+            'errores': resultado['errores']
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Error al importar solicitudes: {str(e)}'
+        }, status=400)
+
+@require_http_methods(["GET"])
+def reporte_resumen_diario(request):
+    """Reporte diario de volumen y tiempo de cierre por tipo o por responsable"""
+    storage = SolicitudStorageService()
     
-    return render(request, 'aprobaciones/listar_solicitudes.html', {
-        'titulo_pagina': 'Todas las Solicitudes',
-        'page_obj': page_obj,
-        'estado_filtro': estado_filtro,
-        'tipo_filtro': tipo_filtro
-    })
+    try:
+        desde = request.GET.get('desde')
+        hasta = request.GET.get('hasta')
+        agrupar = request.GET.get('agrupar', 'tipo')
+        
+        dias = storage.obtener_resumen_diario(
+            agrupar=agrupar,
+            desde=date.fromisoformat(desde) if desde else None,
+            hasta=date.fromisoformat(hasta) if hasta else None
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'agrupar': agrupar,
+            'dias': dias
+        })
+        
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Parámetros inválidos: {str(e)}'
+        }, status=400)
+
+@require_http_methods(["GET"])
+def serie_temporal(request):
+    """Serie de solicitudes creadas por día, semana o mes, por estado y por tipo"""
+    storage = SolicitudStorageService()
+    
+    try:
+        desde = request.GET.get('desde')
+        hasta = request.GET.get('hasta')
+        intervalo = request.GET.get('intervalo', 'dia')
+        
+        serie = storage.obtener_serie_temporal(
+            intervalo=intervalo,
+            desde=date.fromisoformat(desde) if desde else None,
+            hasta=date.fromisoformat(hasta) if hasta else None
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'intervalo': intervalo,
+            'serie': serie
+        })
+        
+    except (ValueError, OverflowError) as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Parámetros inválidos: {str(e)}'
+        }, status=400)
 
 @require_http_methods(["POST"])
 def aprobar_solicitud(request, solicitud_id):
@@ -331,4 +512,157 @@ def cambiar_estado_solicitud(request, solicitud_id):
                 'message': f'Error al cambiar estado: {str(e)}'
             })
         
-        return redirect('detalle_solicitud', solicitud_id=solicitud_id)
\ No newline at end of file
+        return redirect('detalle_solicitud', solicitud_id=solicitud_id)
+
+@require_http_methods(["POST"])
+def cambiar_estado_masivo(request):
+    """Vista para aprobar/rechazar/cambiar el estado de varias solicitudes a la vez"""
+    storage = SolicitudStorageService()
+    
+    try:
+        data = json.loads(request.body) if request.body else {}
+        ids = data.get('ids') or []
+        nuevo_estado = data.get('estado')
+        comentario = data.get('comentario', '')
+        usuario = 'usuario_actual'  # TODO: cambiar por request.user.username
+        
+        if not nuevo_estado:
+            raise ValueError("Estado requerido")
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("Se requiere una lista de IDs")
+        
+        resultado = storage.cambiar_estado_masivo(ids, nuevo_estado, usuario, comentario)
+        
+        return JsonResponse({
+            'success': True,
+            'message': f'{len(resultado["actualizadas"])} solicitudes cambiadas a {nuevo_estado}',
+            'nuevo_estado': nuevo_estado,
+            'actualizadas': resultado['actualizadas'],
+            'rechazadas': resultado['rechazadas']
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Error al cambiar estado: {str(e)}'
+        }, status=400)
+
+
+# Segundos entre comentarios keep-alive en conexiones SSE inactivas
+SSE_HEARTBEAT = getattr(settings, 'APROBACIONES_SSE_HEARTBEAT', 15)
+
+@require_http_methods(["GET"])
+async def eventos_solicitudes(request):
+    """
+    Server-Sent Events con las solicitudes creadas y los cambios de estado.
+    Acepta ?responsable= y ?solicitante= para recibir solo los eventos que interesan.
+    Pensado para ASGI: cada conexión abierta solo espera en su cola.
+    """
+    filtros = {campo: request.GET.get(campo, '') for campo in FILTROS_EVENTOS}
+    
+    async def flujo():
+        suscripcion = broker.suscribir(**filtros)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                evento = await suscripcion.siguiente(timeout=SSE_HEARTBEAT)
+                if evento is None:
+                    yield ': ping\n\n'
+                    continue
+                yield f"event: {evento['evento']}\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            broker.cancelar(suscripcion)
+    
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _lista_parametro(request, nombre):
+    """Lista separada por comas de un parámetro GET (vacía si no viene)"""
+    return [valor.strip() for valor in request.GET.get(nombre, '').split(',') if valor.strip()]
+
+def _respuesta_api(datos, status=200):
+    return HttpResponse(json_rapido(datos), content_type='application/json', status=status)
+
+@require_http_methods(["GET"])
+async def api_solicitudes(request):
+    """API de lectura: página de solicitudes con ?fields=, ?include= y cursor"""
+    storage = SolicitudStorageService()
+    
+    try:
+        try:
+            limite = max(1, min(int(request.GET.get('limite', 50)), 200))
+        except ValueError:
+            limite = 50
+        
+        pagina = await storage.alistar_solicitudes_api(
+            campos=_lista_parametro(request, 'fields'),
+            incluir=_lista_parametro(request, 'include'),
+            cursor=request.GET.get('cursor'),
+            tamano_pagina=limite,
+            estado=request.GET.get('estado'),
+            tipo=request.GET.get('tipo'),
+            solicitante=request.GET.get('solicitante'),
+            responsable=request.GET.get('responsable')
+        )
+        
+        return _respuesta_api(pagina)
+        
+    except ValueError as e:
+        return _respuesta_api({'success': False, 'message': str(e)}, status=400)
+
+@require_http_methods(["GET"])
+async def api_detalle_solicitud(request, solicitud_id):
+    """API de lectura: una solicitud con ?fields= e ?include="""
+    storage = SolicitudStorageService()
+    
+    try:
+        solicitud = await storage.aobtener_solicitud_api(
+            solicitud_id,
+            campos=_lista_parametro(request, 'fields'),
+            incluir=_lista_parametro(request, 'include')
+        )
+    except ValueError as e:
+        return _respuesta_api({'success': False, 'message': str(e)}, status=400)
+    
+    if solicitud is None:
+        return _respuesta_api({'success': False, 'message': 'Solicitud no encontrada'}, status=404)
+    
+    return _respuesta_api(solicitud)
+
+@require_http_methods(["GET"])
+def api_cambios(request):
+    """Feed de cambios para sincronización: entregar ?cursor= con el último siguiente_cursor"""
+    storage = SolicitudStorageService()
+    
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 100)), 500))
+    except ValueError:
+        limite = 100
+    
+    return _respuesta_api(storage.obtener_cambios(cursor=request.GET.get('cursor'), limite=limite))
+
+@require_http_methods(["GET"])
+@solo_operacion
+def diagnostico_conexiones(request):
+    """Estado de las conexiones/pool a la base de datos de este proceso"""
+    return JsonResponse({
+        'success': True,
+        'conexiones': estadisticas_conexiones()
+    })
+
+@require_http_methods(["GET"])
+@solo_operacion
+def metricas_prometheus(request):
+    """Métricas en formato de texto de Prometheus (sumadas entre procesos)"""
+    storage = SolicitudStorageService()
+    pendientes = [
+        ('aprobaciones_solicitudes_pendientes', (('responsable', responsable),), cantidad)
+        for responsable, cantidad in storage.obtener_pendientes_por_responsable().items()
+    ]
+    texto = metricas.registro.exportar(adicionales=[(
+        'aprobaciones_solicitudes_pendientes', 'gauge',
+        'Solicitudes pendientes por responsable', pendientes
+    )])
+    return HttpResponse(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_app.settings')
+# settings.py ajusta las conexiones persistentes cuando se sirve por ASGI
+os.environ.setdefault('APROBACIONES_ASGI', '1')
 
 application = get_asgi_application()
@@ -42,12 +42,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'aprobaciones.middleware.MetricasPeticionMiddleware',
+    'aprobaciones.middleware.MedicionPeticionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'aprobaciones.middleware.LecturaPrimariaMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -55,7 +58,8 @@ ROOT_URLCONF = 'project_app.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates con medición del tiempo de render (Server-Timing)
+        'BACKEND': 'aprobaciones.diagnostico.PlantillasMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,6 +83,58 @@ DATABASES = {
     }
 }
 
+# Conexiones: APROBACIONES_DB_POOL=1 usa el pool de psycopg (requiere psycopg[pool]);
+# si no, conexiones persistentes por hilo que se verifican antes de reutilizarse.
+# Bajo ASGI (asgi.py define APROBACIONES_ASGI) el ORM corre en hilos que no se
+# reutilizan entre peticiones y una conexión persistente por hilo agota el servidor:
+# ahí el valor por defecto es 0 (cerrar al terminar) y conviene usar el pool
+ES_ASGI = os.environ.get('APROBACIONES_ASGI', '').lower() in ('1', 'true', 'si')
+if os.environ.get('APROBACIONES_DB_POOL', '').lower() in ('1', 'true', 'si'):
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('APROBACIONES_DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('APROBACIONES_DB_POOL_MAX', 10)),
+            'timeout': float(os.environ.get('APROBACIONES_DB_POOL_TIMEOUT', 10)),
+            'max_lifetime': float(os.environ.get('APROBACIONES_DB_POOL_MAX_LIFETIME', 1800)),
+            'max_idle': float(os.environ.get('APROBACIONES_DB_POOL_MAX_IDLE', 300)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.environ.get('APROBACIONES_DB_CONN_MAX_AGE', 0 if ES_ASGI else 60)
+    )
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Métricas de Prometheus: con varios procesos (mod_wsgi) cada uno vuelca sus
+# contadores a este directorio y /metricas/ los suma. Vaciarlo al reiniciar el servidor.
+# Sin directorio cada scrape ve solo el proceso que lo atiende: sirve únicamente con
+# un worker (runserver); 'manage.py check --deploy' avisa si falta (aprobaciones.W001)
+APROBACIONES_METRICAS_DIR = os.environ.get('APROBACIONES_METRICAS_DIR') or None
+# /metricas/ y /diagnostico/ piden staff (o DEBUG); Prometheus usa este token como Bearer
+APROBACIONES_OPERACION_TOKEN = os.environ.get('APROBACIONES_OPERACION_TOKEN') or None
+
+# Caché compartida entre procesos (necesaria para cachear las series de tiempo con
+# varios workers): APROBACIONES_REDIS_URL="redis://host:6379/1". Sin ella cada
+# proceso usa su LocMemCache y las series se calculan siempre en la base
+if os.environ.get('APROBACIONES_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['APROBACIONES_REDIS_URL'],
+        }
+    }
+
+# Réplicas de solo lectura: APROBACIONES_REPLICA_HOSTS="replica1,replica2"
+# Mismo nombre de base y usuario que 'default'; ver aprobaciones/routers.py.
+# En las pruebas cada réplica es un espejo de la base de pruebas de 'default'
+APROBACIONES_REPLICAS = []
+for indice, host in enumerate(filter(None, os.environ.get('APROBACIONES_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica{indice + 1}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    APROBACIONES_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['aprobaciones.routers.ReplicaRouter']
+
 
 WSGI_APPLICATION = 'project_app.wsgi.application'
 